@@ -4,21 +4,37 @@ Application initialization module
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueListener, RotatingFileHandler
 import os
+import queue
 import sys
 
 db = SQLAlchemy()
 ma = Marshmallow()
 
+# Writes queued log records; replaced if create_app runs again
+_log_listener = None
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object('app.config.Config')
+    
+    # Take the client's scheme and host from the proxy, so request.url is the
+    # public URL (webhook signatures cover it)
+    hops = app.config.get('PROXY_FIX_HOPS', 0)
+    if hops:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops, x_port=hops, x_prefix=hops)
     db.init_app(app)
     ma.init_app(app)
     configure_logging(app)
 
+    # Keep session data server-side; the cookie only carries a session ID
+    from app.sessions import DatabaseSessionInterface
+    app.session_interface = DatabaseSessionInterface()
+
     # Import and register blueprints
     from .routes import main_bp
     app.register_blueprint(main_bp)
@@ -61,22 +77,87 @@ def create_app():
     except Exception as e:
         app.logger.warning(f"Could not register integration routes: {str(e)}")
 
-    # Create database tables within the application context
+    # Import and register SAP routes
+    try:
+        from app.sap_routes import sap_bp
+        app.register_blueprint(sap_bp)
+        app.logger.info("SAP routes registered successfully")
+    except Exception as e:
+        app.logger.warning(f"Could not register SAP routes: {str(e)}")
+
+    # Import and register HubSpot webhook routes
+    try:
+        from app.hubspot_webhook_routes import hubspot_webhook_bp
+        app.register_blueprint(hubspot_webhook_bp)
+        app.logger.info("HubSpot webhook routes registered successfully")
+    except Exception as e:
+        app.logger.warning(f"Could not register HubSpot webhook routes: {str(e)}")
+
+    # Import and register metrics routes and request hooks
+    try:
+        from app.metrics_routes import metrics_bp
+        from services import metrics
+        metrics.configure(app.config.get('METRICS_MULTIPROC_DIR'))
+        app.register_blueprint(metrics_bp)
+        app.logger.info("Metrics routes registered successfully")
+    except Exception as e:
+        app.logger.warning(f"Could not register metrics routes: {str(e)}")
+
+    # Import and register request timing hooks (Server-Timing, debug_timing)
+    try:
+        from app.timing import timing_bp
+        app.register_blueprint(timing_bp)
+        app.logger.info("Request timing hooks registered successfully")
+    except Exception as e:
+        app.logger.warning(f"Could not register request timing hooks: {str(e)}")
+
+    # Tune SQLite connections and time queries, create database tables within
+    # the application context, then add any columns that older databases are missing
     with app.app_context():
+        from app.database import configure_sqlite
+        configure_sqlite(db.engine, app.config.get('SQLITE_BUSY_TIMEOUT_MS', 30000))
+        from services.tracing import instrument_engine
+        instrument_engine(db.engine)
         db.create_all()
+        from app.migrations import upgrade_schema, count_unmigrated_integrations
+        try:
+            added = upgrade_schema(db.engine)
+            if added:
+                app.logger.info(f"Added database columns: {', '.join(added)}")
+        except Exception as e:
+            # Every worker starts at once; another one may be adding the same columns
+            app.logger.warning(f"Could not upgrade database schema: {str(e)}")
+        # Rows are backfilled by a one-time release step, not by every worker
+        # at startup, where concurrent runs would race on the same rows
+        try:
+            unmigrated = count_unmigrated_integrations()
+            if unmigrated:
+                app.logger.warning(f"{unmigrated} integrations need migrating, run: flask migrate-integrations")
+        except Exception as e:
+            app.logger.warning(f"Could not check for unmigrated integrations: {str(e)}")
 
     return app
 
 def configure_logging(app):
-    """Set up application logging"""
+    """
+    Set up application logging
+    
+    Loggers only enqueue records; a QueueListener thread formats them and
+    writes the log file and console, so file I/O and rotation stay off the
+    request path.
+    """
+    global _log_listener
+    from flask.logging import default_handler
+    from app.logging_utils import NonFormattingQueueHandler
+    
     if not os.path.exists('logs'):
         os.mkdir('logs')
 
     # Configure file handler for application logs
     file_handler = RotatingFileHandler(
         'logs/integration_platform.log', 
-        maxBytes=10240, 
-        backupCount=10
+        maxBytes=app.config.get('LOG_MAX_BYTES', 10 * 1024 * 1024), 
+        backupCount=app.config.get('LOG_BACKUP_COUNT', 10)
     )
 
     # Set formatter to include timestamp, level, and location
@@ -88,8 +169,23 @@ def configure_logging(app):
     log_level = app.config.get('LOG_LEVEL', 'DEBUG')
     file_handler.setLevel(log_level)
     
+    # Replace the handlers of a previous create_app in this process
+    if _log_listener is not None:
+        _log_listener.stop()
+    service_logger = logging.getLogger('services.alchemy_service')
+    for target in (app.logger, service_logger):
+        for handler in list(target.handlers):
+            if isinstance(handler, NonFormattingQueueHandler) or handler is default_handler:
+                target.removeHandler(handler)
+    
+    log_queue = queue.SimpleQueue()
+    queue_handler = NonFormattingQueueHandler(log_queue)
+    _log_listener = QueueListener(log_queue, file_handler, default_handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    
     # Add handler to app logger
-    app.logger.addHandler(file_handler)
+    app.logger.addHandler(queue_handler)
     app.logger.setLevel(log_level)
     
     # Configure other loggers for debugging
@@ -97,10 +193,10 @@ def configure_logging(app):
     logging.getLogger('werkzeug').setLevel(logging.INFO)
     logging.getLogger('sqlalchemy').setLevel(logging.WARNING)
     
-    # Make sure our service logger has DEBUG level
-    service_logger = logging.getLogger('services.alchemy_service')
-    service_logger.setLevel(logging.DEBUG)
-    service_logger.addHandler(file_handler)
+    # The service logger follows LOG_LEVEL, so records the handlers would
+    # drop are never created
+    service_logger.setLevel(log_level)
+    service_logger.addHandler(queue_handler)
     
     # Log startup
     app.logger.info('Integration Platform startup')
@@ -0,0 +1,18 @@
+"""
+Bearer-token check for operator-only responses
+"""
+from flask import current_app, request
+import hmac
+
+def is_admin_request():
+    """
+    Check whether the request carries the operator token (Authorization: Bearer <ADMIN_API_TOKEN>)
+
+    Returns:
+        bool: True if ADMIN_API_TOKEN is set and the request presents it
+    """
+    token = current_app.config.get('ADMIN_API_TOKEN')
+    if not token:
+        return False
+    presented = request.headers.get('Authorization', '')
+    return hmac.compare_digest(presented.encode('utf-8'), f"Bearer {token}".encode('utf-8'))
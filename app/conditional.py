@@ -0,0 +1,55 @@
+"""
+ETag helpers for conditional JSON responses
+"""
+from flask import current_app, jsonify, request
+import hashlib
+import json
+
+def etag_for(*parts):
+    """
+    Build an ETag from values that identify a representation, e.g. an ID and updated_at
+
+    Returns:
+        str: Opaque validator (without quotes)
+    """
+    return hashlib.sha1(json.dumps(parts, default=str, sort_keys=True).encode('utf-8')).hexdigest()
+
+def is_not_modified(etag):
+    """Check whether the client's If-None-Match already names this ETag"""
+    return request.if_none_match.contains_weak(etag)
+
+def not_modified(etag):
+    """
+    Build an empty 304 response carrying the ETag
+
+    The metadata endpoints answer 304 to POSTs too: they take credentials
+    in the body, so a POST is how clients revalidate them.
+    """
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    return response
+
+def conditional_json(payload, etag=None):
+    """
+    jsonify a payload with an ETag, or answer 304 when the client already has it
+
+    Args:
+        payload (dict): Response body
+        etag (str, optional): Validator from etag_for. Defaults to a hash of the JSON body.
+
+    Returns:
+        Response: 200 with the body and ETag, or an empty 304
+    """
+    if etag is not None and is_not_modified(etag):
+        return not_modified(etag)
+
+    response = jsonify(payload)
+    if etag is None:
+        etag = hashlib.sha1(response.get_data()).hexdigest()
+        if is_not_modified(etag):
+            return not_modified(etag)
+
+    response.set_etag(etag)
+    # Let clients store the body but revalidate it on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,5 +1,8 @@
 import os
+import json
+from datetime import timedelta
 from dotenv import load_dotenv
+from app.database import engine_options
 
 # Load environment variables
 load_dotenv()
@@ -11,6 +14,25 @@ class Config:
     # Flask settings
     SECRET_KEY = os.getenv('SECRET_KEY', 'development_secret_key')
     
+    # Reverse proxies in front of the app (Render adds one) whose
+    # X-Forwarded-* headers are trusted; 0 when serving directly
+    PROXY_FIX_HOPS = int(os.getenv('PROXY_FIX_HOPS', '1'))
+    
+    # Public URL of the app, e.g. https://integrations.example.com; when set,
+    # webhook signatures are checked against it instead of the request URL
+    PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL', '')
+    
+    # Fernet key for credentials stored in integration configurations;
+    # derived from SECRET_KEY when empty
+    CREDENTIALS_KEY = os.getenv('CREDENTIALS_KEY', '')
+    
+    # Bearer token for operator-only responses (exports with credentials,
+    # detailed request timing); those are refused while it is empty
+    ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN', '')
+    
+    # Server-side sessions (Alchemy tokens per tenant) expire after this long without use
+    PERMANENT_SESSION_LIFETIME = timedelta(hours=int(os.getenv('SESSION_LIFETIME_HOURS', '72')))
+    
     # Database configuration
     SQLALCHEMY_DATABASE_URI = os.getenv(
         'DATABASE_URL', 
@@ -21,6 +43,37 @@ class Config:
     # Alchemy LIMS Configuration
     ALCHEMY_BASE_URL = os.getenv('ALCHEMY_BASE_URL', '')
     ALCHEMY_API_KEY = os.getenv('ALCHEMY_API_KEY', '')
+    ALCHEMY_WRITE_CONCURRENCY = int(os.getenv('ALCHEMY_WRITE_CONCURRENCY', '4'))
+    
+    # Time budget for wizard requests that chain several upstream calls
+    # (e.g. token refresh, record-templates, filter-records)
+    REQUEST_DEADLINE_SECONDS = float(os.getenv('REQUEST_DEADLINE_SECONDS', '10'))
+    
+    # Adaptive batch sizing - starting size and bounds per upstream channel
+    # (take for Alchemy filter-records, inputs per HubSpot batch call)
+    BATCH_SIZE_LIMITS = {
+        'alchemy_fetch': {'initial': 100, 'minimum': 10, 'maximum': 1000},
+        'hubspot_write': {'initial': 100, 'minimum': 5, 'maximum': 100}
+    }
+    BATCH_TARGET_LATENCY = float(os.getenv('BATCH_TARGET_LATENCY', '2.0'))
+    
+    # Sync job runner - worker threads and concurrent jobs per Alchemy tenant
+    # ("alchemy:<tenant_id>") or HubSpot portal ("hubspot:portal-<portal ID>").
+    # Each integration ("integration:<id>") always runs one job at a time.
+    SYNC_WORKERS = int(os.getenv('SYNC_WORKERS', '4'))
+    DEFAULT_TENANT_CONCURRENCY = int(os.getenv('DEFAULT_TENANT_CONCURRENCY', '2'))
+    TENANT_CONCURRENCY_LIMITS = json.loads(os.getenv('TENANT_CONCURRENCY_LIMITS', '{}'))
+    
+    # Database engine - SQLite lock wait, and pool sizing for server databases.
+    # Each sync worker thread holds a connection while it checkpoints, so the
+    # pool covers the workers plus a couple of request threads.
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '30000'))
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        SQLALCHEMY_DATABASE_URI,
+        pool_size=int(os.getenv('DB_POOL_SIZE', str(SYNC_WORKERS + 2))),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    )
     
     # Salesforce Configuration
     SALESFORCE_USERNAME = os.getenv('SALESFORCE_USERNAME', '')
@@ -35,5 +88,18 @@ class Config:
     HUBSPOT_ACCESS_TOKEN = os.getenv('HUBSPOT_ACCESS_TOKEN', '')
     HUBSPOT_CLIENT_SECRET = os.getenv('HUBSPOT_CLIENT_SECRET', '')
     
-    # Logging
+    # Metrics - directory shared by all gunicorn workers and CLI sync runs so
+    # /metrics reports totals across processes; empty for per-process metrics
+    METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+    
+    # Server-Timing header on every response: aggregate upstream/db/app/total
+    # times, plus per-endpoint entries and debug_timing for ADMIN_API_TOKEN
+    # holders and in debug mode
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+    
+    # Logging - level, file rotation, and one in LOG_PAYLOAD_SAMPLE_RATE
+    # payload logs per endpoint (0 turns them off)
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '10'))
+    LOG_PAYLOAD_SAMPLE_RATE = int(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '100'))
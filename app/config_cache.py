@@ -0,0 +1,62 @@
+"""
+In-process cache of parsed integration configurations
+"""
+import threading
+from collections import OrderedDict
+from services import metrics
+
+CACHE_LOOKUPS = metrics.counter('cache_lookups_total', 'Cache lookups by result (hit, stale, miss)', ('cache', 'result'))
+
+class IntegrationConfigCache:
+    """
+    Parsed configuration and mappings per integration, keyed by ID and updated_at
+
+    Every save bumps updated_at, so an entry is only served to a caller
+    holding the row's current updated_at. That is the cross-worker version
+    check: a worker that reads the row after another worker saved it gets
+    the new updated_at, misses, and parses the new configuration.
+    """
+    def __init__(self, max_entries=1000):
+        """
+        Args:
+            max_entries (int, optional): Least recently used entries are dropped beyond this. Defaults to 1000.
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, integration_id, updated_at):
+        """
+        Get the parsed configuration for a version of an integration
+
+        Args:
+            integration_id (int): Integration ID
+            updated_at (datetime): The row's current updated_at
+
+        Returns:
+            tuple: (config, mappings), or None if that version is not cached
+        """
+        with self._lock:
+            entry = self._entries.get(integration_id)
+            if entry is None or entry[0] != updated_at:
+                CACHE_LOOKUPS.inc(cache='integration_config', result='miss')
+                return None
+            self._entries.move_to_end(integration_id)
+        CACHE_LOOKUPS.inc(cache='integration_config', result='hit')
+        return entry[1], entry[2]
+
+    def store(self, integration_id, updated_at, config, mappings):
+        """Cache the parsed configuration for a version of an integration"""
+        with self._lock:
+            self._entries[integration_id] = (updated_at, config, mappings)
+            self._entries.move_to_end(integration_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, integration_id):
+        """Drop the cached configuration of an integration"""
+        with self._lock:
+            self._entries.pop(integration_id, None)
+
+# Shared by every request and sync thread in this process
+integration_config_cache = IntegrationConfigCache()
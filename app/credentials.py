@@ -0,0 +1,80 @@
+"""
+Encryption of credentials kept in stored integration configurations
+
+Refresh tokens are stored as "enc:<Fernet token>". The key comes from
+CREDENTIALS_KEY (a Fernet key, see Fernet.generate_key()), or is derived
+from SECRET_KEY when that is not set. Values saved before encryption was
+introduced are plaintext and are still accepted when read.
+"""
+from cryptography.fernet import Fernet, InvalidToken
+from flask import current_app
+import base64
+import hashlib
+import logging
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+ENCRYPTED_PREFIX = 'enc:'
+
+def _fernet():
+    key = current_app.config.get('CREDENTIALS_KEY')
+    if not key:
+        secret = current_app.config['SECRET_KEY'].encode('utf-8')
+        key = base64.urlsafe_b64encode(hashlib.sha256(secret).digest())
+    return Fernet(key)
+
+def is_encrypted(value):
+    """Check whether a stored value is already encrypted"""
+    return isinstance(value, str) and value.startswith(ENCRYPTED_PREFIX)
+
+def encrypt_secret(value):
+    """
+    Encrypt a credential for storage; empty and already encrypted values are returned as they are
+
+    Args:
+        value (str): Plaintext credential
+
+    Returns:
+        str: "enc:<token>"
+    """
+    if not value or is_encrypted(value):
+        return value
+    return ENCRYPTED_PREFIX + _fernet().encrypt(value.encode('utf-8')).decode('ascii')
+
+def decrypt_secret(value):
+    """
+    Decrypt a stored credential
+
+    Args:
+        value (str): Stored value, encrypted or legacy plaintext
+
+    Returns:
+        str: Plaintext credential, or None if it cannot be decrypted with the current key
+    """
+    if not is_encrypted(value):
+        return value
+    try:
+        return _fernet().decrypt(value[len(ENCRYPTED_PREFIX):].encode('ascii')).decode('utf-8')
+    except InvalidToken:
+        logger.error("Stored credential cannot be decrypted; was CREDENTIALS_KEY or SECRET_KEY changed?")
+        return None
+
+def protect_config(config):
+    """
+    Encrypt the stored credentials of a configuration, in place
+
+    Args:
+        config (dict): Integration configuration
+
+    Returns:
+        dict: The same configuration
+    """
+    alchemy_config = config.get('alchemy')
+    if isinstance(alchemy_config, dict) and alchemy_config.get('refresh_token'):
+        alchemy_config['refresh_token'] = encrypt_secret(alchemy_config['refresh_token'])
+    return config
+
+def stored_refresh_token(config):
+    """Get the plaintext Alchemy refresh token of a stored configuration"""
+    return decrypt_secret(config.get('alchemy', {}).get('refresh_token'))
@@ -0,0 +1,65 @@
+"""
+Database engine setup for SQLite and server databases
+"""
+from sqlalchemy import event
+
+def engine_options(database_uri, pool_size=5, max_overflow=10, pool_recycle=1800, pool_timeout=30):
+    """
+    Build SQLALCHEMY_ENGINE_OPTIONS for a database URI
+
+    SQLite keeps SQLAlchemy's default pool; its tuning is done per
+    connection by configure_sqlite. Server databases get a bounded pool
+    with pre-ping, so connections dropped by the server or a proxy while
+    idle are replaced instead of failing the next request.
+
+    Args:
+        database_uri (str): SQLALCHEMY_DATABASE_URI
+        pool_size (int, optional): Connections kept open per process. Defaults to 5.
+        max_overflow (int, optional): Extra connections allowed under load. Defaults to 10.
+        pool_recycle (int, optional): Seconds before a connection is replaced. Defaults to 1800.
+        pool_timeout (int, optional): Seconds to wait for a free connection. Defaults to 30.
+
+    Returns:
+        dict: Engine options
+    """
+    if database_uri.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_recycle': pool_recycle,
+        'pool_timeout': pool_timeout,
+        'pool_pre_ping': True
+    }
+
+def configure_sqlite(engine, busy_timeout_ms=30000):
+    """
+    Tune every new SQLite connection for several writing processes
+
+    - journal_mode=WAL: readers no longer block the writer or each other,
+      and a commit appends to the log instead of rewriting pages
+    - busy_timeout: a writer waits for the lock instead of failing at once
+      with "database is locked"
+    - synchronous=NORMAL: safe with WAL; fsync at checkpoints, not every commit
+    - foreign_keys=ON: ON DELETE CASCADE works as it does on Postgres
+
+    Does nothing for other databases.
+
+    Args:
+        engine (Engine): Database engine
+        busy_timeout_ms (int, optional): Milliseconds to wait for a lock. Defaults to 30000.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            # In-memory databases have no WAL and keep their own journal mode
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute('PRAGMA foreign_keys=ON')
+        finally:
+            cursor.close()
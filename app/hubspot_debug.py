@@ -14,6 +14,7 @@ from flask import Blueprint, render_template_string, request, jsonify
 import requests
 import logging
 import json
+from services.hubspot_service import get_hubspot_service
 
 # Create a blueprint for debugging routes
 hubspot_debug_bp = Blueprint('hubspot_debug', __name__)
@@ -190,7 +191,9 @@ def test_connection():
         }
         
         # Make a simple request to get a contact
-        response = requests.get("https://api.hubapi.com/crm/v3/objects/contacts?limit=1", headers=headers)
+        response = get_hubspot_service(access_token=token).request(
+            'GET', "https://api.hubapi.com/crm/v3/objects/contacts?limit=1", headers=headers
+        )
         
         if response.status_code != 200:
             return jsonify({
@@ -236,7 +239,9 @@ def get_fields():
         }
         
         # Get properties for the object type
-        response = requests.get(f"https://api.hubapi.com/crm/v3/properties/{object_type}", headers=headers)
+        response = get_hubspot_service(access_token=token).request(
+            'GET', f"https://api.hubapi.com/crm/v3/properties/{object_type}", headers=headers
+        )
         
         if response.status_code != 200:
             return jsonify({
@@ -1,6 +1,8 @@
 # app/hubspot_routes.py (updated)
 from flask import Blueprint, request, jsonify, current_app
 from services.hubspot_service import get_hubspot_service
+from services.upstream import Deadline
+from app.conditional import conditional_json, etag_for
 import logging
 import traceback
 
@@ -58,7 +60,9 @@ def validate_hubspot():
             # Validate credentials - remove any whitespace
             hubspot_service = get_hubspot_service(access_token=api_key.strip() if api_key else None)
         
-        is_valid, message = hubspot_service.validate_credentials()
+        is_valid, message = hubspot_service.validate_credentials(
+            deadline=Deadline(current_app.config['REQUEST_DEADLINE_SECONDS'])
+        )
         
         if is_valid:
             return jsonify({
@@ -128,7 +132,7 @@ def get_object_types():
         object_types = hubspot_service.get_object_types()
         
         if object_types:
-            return jsonify({
+            return conditional_json({
                 "status": "success",
                 "message": f"Successfully retrieved {len(object_types)} object types",
                 "object_types": object_types
@@ -204,14 +208,17 @@ def get_fields():
         logger.info(f"Fetching HubSpot fields for object type: {object_type}")
         
         # Get fields
-        fields = hubspot_service.get_fields_for_object(object_type)
+        fields, cache_age = hubspot_service.get_fields_with_age(
+            object_type, deadline=Deadline(current_app.config['REQUEST_DEADLINE_SECONDS'])
+        )
         
         if fields:
-            return jsonify({
+            return conditional_json({
                 "status": "success",
                 "message": f"Successfully retrieved {len(fields)} fields for {object_type}",
-                "fields": fields
-            })
+                "fields": fields,
+                "cache_age": round(cache_age) if cache_age is not None else None
+            }, etag_for('hubspot_fields', object_type, fields))
         else:
             # Return fallback fields based on object type
             fallback_fields = [
@@ -0,0 +1,136 @@
+"""
+Routes for receiving HubSpot webhook change events
+"""
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy.orm import defer
+from app import db
+from app.models import SalesforceIntegration, WebhookEvent
+from services.hubspot_service import get_hubspot_service
+import json
+import logging
+import traceback
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Create a blueprint for HubSpot webhooks
+hubspot_webhook_bp = Blueprint('hubspot_webhook', __name__, url_prefix='/hubspot/webhook')
+
+
+def _signed_url():
+    """
+    The URL HubSpot called, which the signature covers
+
+    Built from PUBLIC_BASE_URL when set; otherwise request.url, which
+    reflects the public scheme and host through ProxyFix (PROXY_FIX_HOPS).
+    """
+    base_url = current_app.config.get('PUBLIC_BASE_URL')
+    if base_url:
+        return base_url.rstrip('/') + request.full_path.rstrip('?')
+    return request.url
+
+
+def _parse_events(body):
+    """
+    Validate a webhook payload: a list of event objects (or a single one)
+
+    Returns:
+        list: Events, or None if the payload is malformed
+    """
+    try:
+        events = json.loads(body)
+    except ValueError:
+        return None
+    if isinstance(events, dict):
+        events = [events]
+    if not isinstance(events, list):
+        return None
+    for event in events:
+        if not isinstance(event, dict):
+            return None
+        object_id = event.get('objectId')
+        occurred_at = event.get('occurredAt')
+        if object_id is not None and (isinstance(object_id, bool) or not isinstance(object_id, (int, str))):
+            return None
+        if occurred_at is not None and (isinstance(occurred_at, bool) or not isinstance(occurred_at, int)):
+            return None
+        if not isinstance(event.get('subscriptionType') or '', str):
+            return None
+    return events
+
+
+@hubspot_webhook_bp.route('/<int:integration_id>', methods=['POST'])
+def receive_webhook(integration_id):
+    """
+    Queue HubSpot change events for an integration
+
+    Only verifies the signature and stores the events; the webhook worker
+    (flask drain-webhooks) applies them, so HubSpot gets its 200 quickly.
+    """
+    try:
+        # The parsed config comes from the config cache, so skip the JSON column
+        integration = SalesforceIntegration.query.options(
+            defer(SalesforceIntegration.field_mappings)
+        ).get(integration_id)
+        if not integration:
+            return jsonify({
+                "status": "error",
+                "message": f"Integration with ID {integration_id} not found"
+            }), 404
+
+        hs_config = integration.get_config().get('hubspot', {})
+        hubspot_service = get_hubspot_service(
+            access_token=hs_config.get('access_token'),
+            client_secret=hs_config.get('client_secret'),
+            oauth_mode=True
+        )
+
+        body = request.get_data()
+        if not hubspot_service.verify_webhook_signature(request.method, _signed_url(), body, request.headers):
+            logger.warning(f"Rejected webhook with invalid signature for integration {integration_id}")
+            return jsonify({
+                "status": "error",
+                "message": "Invalid signature"
+            }), 401
+
+        events = _parse_events(body)
+        if events is None:
+            # A 4xx stops HubSpot from retrying a delivery that can never succeed
+            logger.warning(f"Rejected malformed webhook payload for integration {integration_id}")
+            return jsonify({
+                "status": "error",
+                "message": "Payload must be a list of event objects"
+            }), 400
+
+        rows = [
+            {
+                'integration_id': integration_id,
+                'object_id': str(event.get('objectId')),
+                'event_type': event.get('subscriptionType'),
+                'occurred_at': event.get('occurredAt'),
+                'payload': event
+            }
+            for event in events
+            if event.get('objectId') is not None
+        ]
+
+        if rows:
+            db.session.bulk_insert_mappings(WebhookEvent, rows)
+            db.session.commit()
+
+        logger.info(f"Queued {len(rows)} HubSpot events for integration {integration_id}")
+
+        return jsonify({
+            "status": "success",
+            "queued": len(rows)
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error receiving HubSpot webhook: {str(e)}")
+        logger.error(traceback.format_exc())
+        # Non-2xx makes HubSpot retry the delivery
+        return jsonify({
+            "status": "error",
+            "message": f"Error: {str(e)}"
+        }), 500
@@ -1,9 +1,20 @@
 """
 Routes for saving and managing integrations
 """
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, session, stream_with_context
 from app import db
-from app.models import SalesforceIntegration
+from app.admin_auth import is_admin_request
+from app.models import (
+    SalesforceIntegration, IntegrationFieldMapping, SyncState, BatchSize, RecordLink, WebhookEvent
+)
+from app.config_cache import integration_config_cache
+from app.conditional import conditional_json, etag_for, is_not_modified, not_modified
+from app.logging_utils import log_payload
+from app.transfer import DEFAULT_CHUNK_SIZE, iter_export_lines, import_integrations
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import defer
+import base64
+import binascii
 import logging
 import json
 from datetime import datetime
@@ -15,6 +26,32 @@ logger = logging.getLogger(__name__)
 # Create integration blueprint
 integration_bp = Blueprint('integration', __name__)
 
+# Page sizes for GET /integrations
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Sortable columns; id breaks ties so every keyset cursor is unique
+SORT_COLUMNS = {
+    'id': SalesforceIntegration.id,
+    'updated_at': SalesforceIntegration.updated_at
+}
+
+# Fields of a listed integration that fields= can select
+LIST_FIELDS = ('id', 'platform', 'created_at', 'updated_at', 'is_active', 'sync_frequency', 'details')
+
+# Bulk operations - actions, filterable summary columns, and ids per IN clause
+BULK_ACTIONS = ('activate', 'deactivate', 'delete')
+BULK_FILTERS = {
+    'platform': SalesforceIntegration.platform,
+    'tenant_id': SalesforceIntegration.tenant_id,
+    'record_type': SalesforceIntegration.record_type,
+    'active': SalesforceIntegration.is_active
+}
+BULK_ID_CHUNK = 500
+
+# Tables holding per-integration rows, removed along with their integrations
+DEPENDENT_MODELS = (IntegrationFieldMapping, SyncState, BatchSize, RecordLink, WebhookEvent)
+
 @integration_bp.route('/save-integration', methods=['POST'])
 def save_integration():
     """
@@ -22,7 +59,7 @@ def save_integration():
     """
     try:
         data = request.get_json()
-        logger.info(f"Received integration save request: {json.dumps(data)[:500]}...")
+        log_payload(logger, 'save_integration', "Received integration save request", data, limit=500)
         
         if not data:
             return jsonify({
@@ -67,8 +104,7 @@ def save_integration():
         
         integration = SalesforceIntegration(
             alchemy_base_url=current_app.config.get('ALCHEMY_BASE_URL'),
-            alchemy_api_key=current_app.config.get('ALCHEMY_API_KEY'),
-            salesforce_username=f"{platform}_integration"  # Using this field to store the platform
+            alchemy_api_key=current_app.config.get('ALCHEMY_API_KEY')
         )
         
         # Set sync frequency
@@ -116,6 +152,17 @@ def save_integration():
             'record_type': record_type
         }
         
+        # Optional filter on the records pushed to the platform, e.g. "Result.Status == 'Valid'"
+        if alchemy_config.get('query_term'):
+            alchemy_config_to_store['query_term'] = alchemy_config['query_term']
+        
+        # Background syncs need their own refresh token to write to Alchemy
+        refresh_token = alchemy_config.get('refresh_token')
+        if (not refresh_token or refresh_token == 'session') and tenant_id in session.get('alchemy_tokens', {}):
+            refresh_token = session['alchemy_tokens'][tenant_id].get('refresh_token')
+        if refresh_token and refresh_token != 'session':
+            alchemy_config_to_store['refresh_token'] = refresh_token
+        
         # Combine configurations
         full_config = {
             'platform': platform,
@@ -138,12 +185,9 @@ def save_integration():
                 
             processed_mappings.append(processed_mapping)
         
-        # Store as JSON in the database
-        # In a production app, you'd use proper encryption for sensitive values
-        integration.field_mappings = json.dumps({
-            'config': full_config,
-            'mappings': processed_mappings
-        })
+        # Configuration is stored as JSON (refresh token encrypted), mappings and
+        # summary columns in their own columns/table
+        integration.set_config(full_config, processed_mappings)
         
         # Save to database
         db.session.add(integration)
@@ -165,46 +209,148 @@ def save_integration():
             "message": f"Error: {str(e)}"
         }), 500
 
+def _integration_summary(integration):
+    """
+    Build the list entry for an integration from its summary columns
+    
+    Integrations saved before the columns existed and not yet migrated
+    (flask migrate-integrations) fall back to parsing their JSON configuration.
+    """
+    if integration.platform:
+        platform = integration.platform
+        record_type = integration.record_type
+        object_type = integration.object_type
+        mapping_count = integration.mapping_count
+    else:
+        mappings_data = integration.get_field_mappings()
+        config = mappings_data.get('config', {})
+        platform = config.get('platform', 'unknown')
+        record_type = config.get('alchemy', {}).get('record_type')
+        object_type = config.get(platform, {}).get('object_type')
+        mapping_count = len(mappings_data.get('mappings', []))
+    
+    return {
+        'id': integration.id,
+        'platform': platform,
+        'created_at': integration.created_at.isoformat() if integration.created_at else None,
+        'updated_at': integration.updated_at.isoformat() if integration.updated_at else None,
+        'is_active': integration.is_active,
+        'sync_frequency': integration.sync_frequency,
+        'details': {
+            'alchemy_record_type': record_type,
+            'platform_object_type': object_type if platform == 'hubspot' else None,
+            'mapping_count': mapping_count
+        }
+    }
+
+def _encode_cursor(value, integration_id):
+    """Encode the sort value and id of the last row of a page as an opaque cursor"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, integration_id]).encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor, sort):
+    """Decode a cursor into (sort value, id)"""
+    value, integration_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    if sort == 'updated_at':
+        value = datetime.fromisoformat(value)
+    return value, int(integration_id)
+
+def _after_cursor(sort_column, value, last_id, descending):
+    """Condition selecting the rows after (value, last_id) in (sort column, id) order"""
+    id_column = SalesforceIntegration.id
+    if sort_column is id_column:
+        return id_column < last_id if descending else id_column > last_id
+    if descending:
+        return or_(sort_column < value, and_(sort_column == value, id_column < last_id))
+    return or_(sort_column > value, and_(sort_column == value, id_column > last_id))
+
 @integration_bp.route('/integrations', methods=['GET'])
 def list_integrations():
     """
-    List all saved integrations
+    List saved integrations, one keyset-paginated page at a time
+    
+    Query parameters:
+        limit: Page size, up to MAX_PAGE_SIZE (default DEFAULT_PAGE_SIZE)
+        cursor: next_cursor from the previous page
+        sort: 'id' or 'updated_at' (default 'id'); order: 'asc' or 'desc' (default 'asc')
+        platform, record_type: Exact-match filters
+        active: 'true' or 'false'
+        fields: Comma-separated subset of LIST_FIELDS; id is always included
     """
     try:
-        integrations = SalesforceIntegration.query.all()
-        result = []
+        args = request.args
+        sort = args.get('sort', 'id')
+        order = args.get('order', 'asc')
+        if sort not in SORT_COLUMNS or order not in ('asc', 'desc'):
+            return jsonify({
+                'status': 'error',
+                'message': f"sort must be one of {', '.join(SORT_COLUMNS)} and order asc or desc"
+            }), 400
+        
+        try:
+            limit = min(max(int(args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': "limit must be an integer"}), 400
+        
+        fields = None
+        if args.get('fields'):
+            fields = {field.strip() for field in args['fields'].split(',') if field.strip()}
+            unknown = fields - set(LIST_FIELDS)
+            if unknown:
+                return jsonify({
+                    'status': 'error',
+                    'message': f"Unknown fields: {', '.join(sorted(unknown))}"
+                }), 400
+            fields.add('id')
+        
+        # The summary columns are enough here, so the JSON configuration is not loaded
+        query = SalesforceIntegration.query.options(defer(SalesforceIntegration.field_mappings))
+        
+        if args.get('platform'):
+            query = query.filter(SalesforceIntegration.platform == args['platform'])
+        if args.get('record_type'):
+            query = query.filter(SalesforceIntegration.record_type == args['record_type'])
+        if args.get('active'):
+            query = query.filter(SalesforceIntegration.is_active == (args['active'].lower() == 'true'))
+        
+        sort_column = SORT_COLUMNS[sort]
+        descending = order == 'desc'
+        if args.get('cursor'):
+            try:
+                value, last_id = _decode_cursor(args['cursor'], sort)
+            except (ValueError, TypeError, binascii.Error):
+                return jsonify({'status': 'error', 'message': "Invalid cursor"}), 400
+            query = query.filter(_after_cursor(sort_column, value, last_id, descending))
+        
+        if descending:
+            query = query.order_by(sort_column.desc(), SalesforceIntegration.id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), SalesforceIntegration.id.asc())
+        
+        # One extra row tells whether there is a next page
+        integrations = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(integrations) > limit:
+            integrations = integrations[:limit]
+            last = integrations[-1]
+            next_cursor = _encode_cursor(getattr(last, sort), last.id)
         
+        result = []
         for integration in integrations:
             try:
-                # Parse the field mappings to extract platform and other info
-                mappings_data = json.loads(integration.field_mappings)
-                config = mappings_data.get('config', {})
-                platform = config.get('platform', 'unknown')
-                
-                # Get platform-specific details
-                platform_config = config.get(platform, {})
-                
-                # Add to result list
-                result.append({
-                    'id': integration.id,
-                    'platform': platform,
-                    'created_at': integration.created_at.isoformat() if integration.created_at else None,
-                    'updated_at': integration.updated_at.isoformat() if integration.updated_at else None,
-                    'is_active': integration.is_active,
-                    'sync_frequency': integration.sync_frequency,
-                    'details': {
-                        'alchemy_record_type': config.get('alchemy', {}).get('record_type'),
-                        'platform_object_type': platform_config.get('object_type') if platform == 'hubspot' else None,
-                        'mapping_count': len(mappings_data.get('mappings', []))
-                    }
-                })
+                summary = _integration_summary(integration)
+                if fields:
+                    summary = {key: value for key, value in summary.items() if key in fields}
+                result.append(summary)
             except Exception as e:
                 logger.error(f"Error processing integration {integration.id}: {str(e)}")
                 # Continue with next integration
         
-        return jsonify({
+        return conditional_json({
             'status': 'success',
-            'integrations': result
+            'integrations': result,
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
@@ -215,13 +361,101 @@ def list_integrations():
             'message': f"Error: {str(e)}"
         }), 500
 
+@integration_bp.route('/integrations/export', methods=['GET'])
+def export_integrations():
+    """
+    Stream integrations as NDJSON, one integration per line
+    
+    Query parameters:
+        platform: Only export this platform
+        active: 'true' or 'false'
+        include_secrets: 'true' to export credentials too; requires
+            Authorization: Bearer <ADMIN_API_TOKEN>
+    
+    Credentials are left out by default, so an import needs them entered again.
+    """
+    try:
+        active = None
+        if request.args.get('active'):
+            active = request.args['active'].lower() == 'true'
+        
+        include_secrets = request.args.get('include_secrets', '').lower() == 'true'
+        if include_secrets and not is_admin_request():
+            return jsonify({
+                'status': 'error',
+                'message': "include_secrets requires Authorization: Bearer <ADMIN_API_TOKEN>"
+            }), 401
+        
+        lines = iter_export_lines(platform=request.args.get('platform'), active=active,
+                                  include_secrets=include_secrets)
+        response = Response(stream_with_context(lines), mimetype='application/x-ndjson')
+        response.headers['Content-Disposition'] = 'attachment; filename=integrations.ndjson'
+        return response
+        
+    except Exception as e:
+        logger.error(f"Error exporting integrations: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({
+            'status': 'error',
+            'message': f"Error: {str(e)}"
+        }), 500
+
+@integration_bp.route('/integrations/import', methods=['POST'])
+def import_integrations_route():
+    """
+    Create integrations from an NDJSON body in the export format
+    
+    The body is read line by line and inserted in chunks (chunk_size query
+    parameter), one transaction per chunk. Imported integrations get new IDs.
+    """
+    try:
+        try:
+            chunk_size = max(int(request.args.get('chunk_size', DEFAULT_CHUNK_SIZE)), 1)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': "chunk_size must be an integer"}), 400
+        
+        result = import_integrations(request.stream, chunk_size)
+        
+        if result['failed'] and not result['imported']:
+            status = 'error'
+        elif result['failed']:
+            status = 'partial'
+        else:
+            status = 'success'
+        
+        return jsonify({
+            'status': status,
+            'message': f"Imported {result['imported']} integrations, {result['failed']} failed",
+            **result
+        }), 400 if status == 'error' else 200
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error importing integrations: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({
+            'status': 'error',
+            'message': f"Error: {str(e)}"
+        }), 500
+
+def _public_alchemy_config(alchemy_config):
+    """Alchemy configuration without the stored refresh token, which is only reported as present"""
+    public = {key: value for key, value in alchemy_config.items() if key != 'refresh_token'}
+    public['has_refresh_token'] = bool(alchemy_config.get('refresh_token'))
+    return public
+
 @integration_bp.route('/integration/<int:integration_id>', methods=['GET'])
 def get_integration(integration_id):
     """
     Get a specific integration by ID
+    
+    The ETag comes from updated_at, so an unchanged integration is answered
+    with 304 before its configuration is parsed.
     """
     try:
-        integration = SalesforceIntegration.query.get(integration_id)
+        integration = SalesforceIntegration.query.options(
+            defer(SalesforceIntegration.field_mappings)
+        ).get(integration_id)
         
         if not integration:
             return jsonify({
@@ -229,11 +463,13 @@ def get_integration(integration_id):
                 'message': f"Integration with ID {integration_id} not found"
             }), 404
         
-        # Parse the field mappings to extract configuration and mappings
-        mappings_data = json.loads(integration.field_mappings)
-        config = mappings_data.get('config', {})
-        mappings = mappings_data.get('mappings', [])
-        platform = config.get('platform', 'unknown')
+        etag = etag_for('integration', integration.id, integration.updated_at)
+        if is_not_modified(etag):
+            return not_modified(etag)
+        
+        config = integration.get_config()
+        mappings = integration.get_mappings()
+        platform = integration.platform or config.get('platform', 'unknown')
         
         # Build response
         response = {
@@ -243,15 +479,15 @@ def get_integration(integration_id):
             'updated_at': integration.updated_at.isoformat() if integration.updated_at else None,
             'is_active': integration.is_active,
             'sync_frequency': integration.sync_frequency,
-            'alchemy_config': config.get('alchemy', {}),
+            'alchemy_config': _public_alchemy_config(config.get('alchemy', {})),
             'platform_config': config.get(platform, {}),
             'field_mappings': mappings
         }
         
-        return jsonify({
+        return conditional_json({
             'status': 'success',
             'integration': response
-        })
+        }, etag)
         
     except Exception as e:
         logger.error(f"Error getting integration {integration_id}: {str(e)}")
@@ -275,9 +511,10 @@ def delete_integration(integration_id):
                 'message': f"Integration with ID {integration_id} not found"
             }), 404
         
-        # Delete the integration
-        db.session.delete(integration)
+        # Delete the integration and everything kept for it, webhook events included
+        _delete_integrations([integration_id])
         db.session.commit()
+        integration_config_cache.invalidate(integration_id)
         
         logger.info(f"Deleted integration with ID {integration_id}")
         
@@ -293,3 +530,128 @@ def delete_integration(integration_id):
             'status': 'error',
             'message': f"Error: {str(e)}"
         }), 500
+
+def _id_chunks(ids):
+    """Split ids into lists small enough for one IN clause"""
+    ids = list(ids)
+    for start in range(0, len(ids), BULK_ID_CHUNK):
+        yield ids[start:start + BULK_ID_CHUNK]
+
+def _delete_integrations(ids):
+    """
+    Delete integrations with their rows in every DEPENDENT_MODELS table, without committing
+
+    Args:
+        ids (iterable): Integration IDs
+    """
+    for chunk in _id_chunks(ids):
+        for model in DEPENDENT_MODELS:
+            model.query.filter(model.integration_id.in_(chunk)).delete(synchronize_session=False)
+        SalesforceIntegration.query.filter(
+            SalesforceIntegration.id.in_(chunk)
+        ).delete(synchronize_session=False)
+
+@integration_bp.route('/integrations/bulk', methods=['POST'])
+def bulk_integrations():
+    """
+    Activate, deactivate or delete many integrations in one transaction
+    
+    Body:
+        action: 'activate', 'deactivate' or 'delete'
+        ids: List of integration IDs, or
+        filters: Any of platform, tenant_id, record_type (strings) and active
+            (boolean), e.g. {"tenant_id": "acme"} to pause every integration of a tenant
+    
+    Returns per-id results: activated, deactivated, unchanged, deleted or
+    not_found. Nothing is applied if any statement fails.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        action = data.get('action')
+        ids = data.get('ids')
+        filters = data.get('filters')
+        
+        if action not in BULK_ACTIONS:
+            return jsonify({
+                'status': 'error',
+                'message': f"action must be one of {', '.join(BULK_ACTIONS)}"
+            }), 400
+        if (ids is None) == (filters is None):
+            return jsonify({'status': 'error', 'message': "Provide either ids or filters"}), 400
+        
+        # Current state of every targeted integration: {id: is_active}
+        found = {}
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+                return jsonify({'status': 'error', 'message': "ids must be a list of integers"}), 400
+            for chunk in _id_chunks(set(ids)):
+                found.update(db.session.query(SalesforceIntegration.id, SalesforceIntegration.is_active).filter(
+                    SalesforceIntegration.id.in_(chunk)
+                ))
+        else:
+            if not isinstance(filters, dict) or not filters:
+                return jsonify({'status': 'error', 'message': "filters must name at least one column"}), 400
+            unknown = set(filters) - set(BULK_FILTERS)
+            if unknown:
+                return jsonify({
+                    'status': 'error',
+                    'message': f"Unknown filters: {', '.join(sorted(unknown))}"
+                }), 400
+            # A list would reach the database as a malformed IN, and "no" would silently match nothing
+            invalid = [
+                name for name, value in filters.items()
+                if not isinstance(value, bool if name == 'active' else str)
+            ]
+            if invalid:
+                return jsonify({
+                    'status': 'error',
+                    'message': f"Invalid values for {', '.join(sorted(invalid))}: "
+                               "active must be true or false, the other filters strings"
+                }), 400
+            query = db.session.query(SalesforceIntegration.id, SalesforceIntegration.is_active)
+            for name, value in filters.items():
+                query = query.filter(BULK_FILTERS[name] == value)
+            found.update(query)
+            ids = sorted(found)
+        
+        results = {}
+        now = datetime.utcnow()
+        if action == 'delete':
+            _delete_integrations(found)
+            results = {integration_id: 'deleted' for integration_id in found}
+        else:
+            active = action == 'activate'
+            # Rows already in the requested state keep their updated_at, and so their ETags
+            changed = [integration_id for integration_id, is_active in found.items() if is_active != active]
+            for chunk in _id_chunks(changed):
+                SalesforceIntegration.query.filter(
+                    SalesforceIntegration.id.in_(chunk)
+                ).update({'is_active': active, 'updated_at': now}, synchronize_session=False)
+            results = {integration_id: 'unchanged' for integration_id in found}
+            results.update({integration_id: f"{action}d" for integration_id in changed})
+        
+        db.session.commit()
+        
+        if action == 'delete':
+            for integration_id in found:
+                integration_config_cache.invalidate(integration_id)
+        
+        logger.info(f"Bulk {action} applied to {len(found)} integrations")
+        
+        return jsonify({
+            'status': 'success',
+            'message': f"Bulk {action} applied to {len(found)} integrations",
+            'results': [
+                {'id': integration_id, 'result': results.get(integration_id, 'not_found')}
+                for integration_id in dict.fromkeys(ids)
+            ]
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error applying bulk operation: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({
+            'status': 'error',
+            'message': f"Error: {str(e)}"
+        }), 500
@@ -0,0 +1,100 @@
+"""
+Non-blocking logging helpers
+
+Request threads only put records on a queue; a listener thread formats
+them and writes the files. Large payloads are logged through LazyJSON,
+so they are serialized by the listener and only for records that are
+actually emitted, and log_payload samples them per endpoint. LazyJSON
+copies the payload's containers when it is created, so the request can
+go on changing the payload while the record waits in the queue.
+"""
+from flask import current_app
+from logging.handlers import QueueHandler
+import itertools
+import json
+import logging
+import threading
+
+# Keys whose values are masked in logged payloads
+REDACTED_KEYS = ('token', 'secret', 'password', 'api_key')
+
+class NonFormattingQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread
+
+    The standard prepare() formats the message and traceback in the logging
+    thread so records can be pickled. The queue here is in-process, so the
+    record is passed as is.
+    """
+    def prepare(self, record):
+        return record
+
+class LazyJSON:
+    """
+    Log argument that is serialized only when the record is formatted
+
+    The payload is copied (dicts and lists, with credentials masked) on
+    creation, so it is logged as it was at the logging call.
+
+    Args:
+        payload: JSON-serializable value
+        limit (int, optional): Truncate the serialized text to this many characters. Defaults to None.
+    """
+    __slots__ = ('payload', 'limit')
+
+    def __init__(self, payload, limit=None):
+        self.payload = _redact(payload)
+        self.limit = limit
+
+    def __str__(self):
+        text = json.dumps(self.payload, default=str)
+        if self.limit and len(text) > self.limit:
+            return f"{text[:self.limit]}..."
+        return text
+
+def _redact(value):
+    """Copy of a payload's dicts and lists with credential values masked"""
+    if isinstance(value, dict):
+        return {
+            key: '***' if value[key] and any(part in str(key).lower() for part in REDACTED_KEYS) else _redact(value[key])
+            for key in value
+        }
+    if isinstance(value, list):
+        return [_redact(item) for item in value]
+    return value
+
+_sample_counters = {}
+_sample_lock = threading.Lock()
+
+def should_sample(endpoint, rate=None):
+    """
+    Decide whether this call of an endpoint logs its payload
+
+    Args:
+        endpoint (str): Key the sampling is counted per, e.g. the view name
+        rate (int, optional): Log one call in rate; 0 logs none. Defaults to LOG_PAYLOAD_SAMPLE_RATE.
+
+    Returns:
+        bool: True for the first call and every rate-th call after it
+    """
+    if rate is None:
+        rate = current_app.config.get('LOG_PAYLOAD_SAMPLE_RATE', 100)
+    if rate <= 0:
+        return False
+    with _sample_lock:
+        counter = _sample_counters.setdefault(endpoint, itertools.count())
+    return next(counter) % rate == 0
+
+def log_payload(logger, endpoint, message, payload, limit=None):
+    """
+    Log a request or response payload at INFO for a sample of an endpoint's calls
+
+    Args:
+        logger (Logger): Logger to write to
+        endpoint (str): Endpoint the sampling is counted per
+        message (str): Text logged before the payload
+        payload: JSON-serializable payload; credential values are masked
+        limit (int, optional): Maximum characters of payload to log. Defaults to None.
+    """
+    if logger.isEnabledFor(logging.INFO) and should_sample(endpoint):
+        logger.info("%s (sampled): %s", message, LazyJSON(payload, limit), stacklevel=2)
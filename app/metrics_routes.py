@@ -0,0 +1,48 @@
+"""
+Routes and request hooks for Prometheus metrics
+"""
+from flask import Blueprint, Response, g, request
+from services import metrics
+import logging
+import time
+import traceback
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Create a blueprint for metrics
+metrics_bp = Blueprint('metrics', __name__)
+
+HTTP_REQUESTS = metrics.counter('http_requests_total', 'HTTP requests by route, method and status',
+                                ('route', 'method', 'status'))
+HTTP_LATENCY = metrics.histogram('http_request_duration_seconds', 'HTTP request latency in seconds by route',
+                                 ('route', 'method'))
+
+@metrics_bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@metrics_bp.after_app_request
+def observe_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # The URL rule, not the path, so IDs don't multiply the series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_LATENCY.observe(time.perf_counter() - started, route=route, method=request.method)
+        HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    return response
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Expose request, upstream, cache and sync metrics in the Prometheus text format
+
+    With METRICS_MULTIPROC_DIR set, the totals cover every worker and CLI
+    sync process sharing the directory.
+    """
+    try:
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        logger.error(f"Error rendering metrics: {str(e)}")
+        logger.error(traceback.format_exc())
+        return Response(f"# Error rendering metrics: {str(e)}\n", status=500, mimetype='text/plain')
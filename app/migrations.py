@@ -0,0 +1,184 @@
+"""
+In-place upgrades for databases created before a schema change
+
+db.create_all() creates missing tables but never alters existing ones, so
+columns added to an existing model are added here at startup. Rows saved in
+the old format are backfilled only by a CLI command run once per release
+(flask migrate-integrations), never by the app's workers.
+"""
+from datetime import datetime
+from sqlalchemy import DateTime, bindparam, inspect, text
+from sqlalchemy.orm.attributes import flag_modified
+from app import db
+from app.credentials import is_encrypted, protect_config
+from app.models import SalesforceIntegration
+import json
+import logging
+import traceback
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Columns added to existing tables: {table: [(column, DDL type)]}
+ADDED_COLUMNS = {
+    'salesforce_integrations': [
+        ('platform', 'VARCHAR(50)'),
+        ('tenant_id', 'VARCHAR(100)'),
+        ('record_type', 'VARCHAR(100)'),
+        ('object_type', 'VARCHAR(100)'),
+        ('mapping_count', 'INTEGER NOT NULL DEFAULT 0')
+    ],
+    'record_links': [
+        ('platform_modified_at', 'BIGINT'),
+        ('pulled_hash', 'VARCHAR(64)')
+    ],
+    'webhook_events': [
+        ('attempts', 'INTEGER NOT NULL DEFAULT 0'),
+        ('lease_owner', 'VARCHAR(32)'),
+        ('lease_until', 'TIMESTAMP'),
+        ('failed_at', 'TIMESTAMP'),
+        ('last_error', 'TEXT')
+    ]
+}
+
+def upgrade_schema(engine):
+    """
+    Add missing columns and indexes to existing tables; safe to run on every start
+
+    Args:
+        engine (Engine): Database engine
+
+    Returns:
+        list: Columns added, as "table.column"
+    """
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    added = []
+
+    with engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            if table not in tables:
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table)}
+            for name, ddl in columns:
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                    added.append(f"{table}.{name}")
+
+        if 'salesforce_integrations' in tables:
+            # Rows from before updated_at had a default; keyset paging needs
+            # a value, and ALTER COLUMN ... NOT NULL is not portable. The
+            # fallback is bound as a DateTime so it is stored in the same
+            # format as the values the app writes.
+            conn.execute(text(
+                "UPDATE salesforce_integrations SET updated_at = COALESCE(created_at, :now) "
+                "WHERE updated_at IS NULL"
+            ).bindparams(bindparam('now', datetime.utcnow(), type_=DateTime)))
+            if engine.dialect.name == 'sqlite':
+                # SQLite compares the text, and the listing cursor compares
+                # against '... HH:MM:SS.ffffff'; a value without microseconds
+                # would sort before it and never equal it, so tied rows after
+                # the cursor would be skipped
+                conn.execute(text(
+                    "UPDATE salesforce_integrations SET updated_at = updated_at || '.000000' "
+                    "WHERE length(updated_at) = 19"
+                ))
+
+    # create_all skips indexes of tables that already existed
+    for index in SalesforceIntegration.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+    return added
+
+def count_unmigrated_integrations():
+    """Count integrations whose summary columns backfill_integrations has not filled yet"""
+    return SalesforceIntegration.query.filter(SalesforceIntegration.platform.is_(None)).count()
+
+def backfill_integrations(chunk_size=500):
+    """
+    Fill the summary columns and mappings table for integrations saved as a JSON blob only
+
+    Rows are migrated in chunks of chunk_size, one commit per chunk, so an
+    interrupted run can simply be restarted. updated_at is preserved.
+
+    Args:
+        chunk_size (int, optional): Rows per transaction. Defaults to 500.
+
+    Returns:
+        dict: {'migrated': int, 'failed': [integration ids]}
+    """
+    migrated = 0
+    failed = []
+    last_id = 0
+
+    while True:
+        integrations = SalesforceIntegration.query.filter(
+            SalesforceIntegration.platform.is_(None),
+            SalesforceIntegration.id > last_id
+        ).order_by(SalesforceIntegration.id).limit(chunk_size).all()
+        if not integrations:
+            break
+
+        for integration in integrations:
+            last_id = integration.id
+            try:
+                data = integration.get_field_mappings()
+                config = data.get('config', {})
+                if not config.get('platform'):
+                    # Older rows only recorded the platform as "<platform>_integration"
+                    config['platform'] = (integration.salesforce_username or '').replace('_integration', '') or 'unknown'
+
+                updated_at = integration.updated_at
+                integration.set_config(config, data.get('mappings', []))
+                integration.updated_at = updated_at
+                flag_modified(integration, 'updated_at')
+                migrated += 1
+            except Exception as e:
+                logger.error(f"Could not migrate integration {integration.id}: {str(e)}")
+                logger.error(traceback.format_exc())
+                failed.append(integration.id)
+
+        db.session.commit()
+        logger.info(f"Migrated integrations up to ID {last_id}")
+
+    return {'migrated': migrated, 'failed': failed}
+
+def encrypt_refresh_tokens(chunk_size=500):
+    """
+    Encrypt Alchemy refresh tokens stored in plaintext before encryption was introduced
+
+    Runs in chunks of chunk_size rows, one commit per chunk; updated_at is preserved.
+
+    Args:
+        chunk_size (int, optional): Rows per transaction. Defaults to 500.
+
+    Returns:
+        int: Number of integrations whose token was encrypted
+    """
+    encrypted = 0
+    last_id = 0
+
+    while True:
+        integrations = SalesforceIntegration.query.filter(
+            SalesforceIntegration.id > last_id
+        ).order_by(SalesforceIntegration.id).limit(chunk_size).all()
+        if not integrations:
+            break
+
+        for integration in integrations:
+            last_id = integration.id
+            data = integration.get_field_mappings()
+            token = data.get('config', {}).get('alchemy', {}).get('refresh_token')
+            if not token or is_encrypted(token):
+                continue
+            protect_config(data['config'])
+            updated_at = integration.updated_at
+            integration.field_mappings = json.dumps(data)
+            integration.updated_at = updated_at
+            flag_modified(integration, 'updated_at')
+            encrypted += 1
+
+        db.session.commit()
+
+    logger.info(f"Encrypted the refresh tokens of {encrypted} integrations")
+    return encrypted
@@ -1,5 +1,8 @@
 from app import db, ma
+from app.config_cache import integration_config_cache
+from app.credentials import protect_config
 from datetime import datetime
+from sqlalchemy import inspect
 import json
 
 class SalesforceIntegration(db.Model):
@@ -7,9 +10,20 @@ class SalesforceIntegration(db.Model):
     Model to store Salesforce integration configurations
     """
     __tablename__ = 'salesforce_integrations'
+    __table_args__ = (
+        db.Index('ix_integration_platform_active', 'platform', 'is_active'),
+        db.Index('ix_integration_updated', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
+    # Summary columns, so listing and filtering don't parse field_mappings
+    platform = db.Column(db.String(50), nullable=True)
+    tenant_id = db.Column(db.String(100), nullable=True, index=True)
+    record_type = db.Column(db.String(100), nullable=True, index=True)
+    object_type = db.Column(db.String(100), nullable=True)
+    mapping_count = db.Column(db.Integer, nullable=False, default=0)
+    
     # Alchemy LIMS Configuration
     alchemy_base_url = db.Column(db.String(255), nullable=False)
     alchemy_api_key = db.Column(db.String(255), nullable=False)
@@ -17,16 +31,24 @@ class SalesforceIntegration(db.Model):
     # Salesforce Connection Details
     salesforce_username = db.Column(db.String(255), nullable=False)
     
-    # Field Mapping Configuration
+    # Integration configuration ({'config': ...}); rows saved before the
+    # mappings table existed also carry their mappings here
     field_mappings = db.Column(db.JSON, nullable=True)
     
+    mapping_rows = db.relationship(
+        'IntegrationFieldMapping',
+        order_by='IntegrationFieldMapping.position',
+        cascade='all, delete-orphan'
+    )
+    
     # Synchronization Settings
     sync_frequency = db.Column(db.String(50), default='daily')
     is_active = db.Column(db.Boolean, default=True)
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Never NULL: the listing's keyset cursor compares on it
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def set_field_mappings(self, mappings):
         """
@@ -46,9 +68,239 @@ class SalesforceIntegration(db.Model):
         """
         return json.loads(self.field_mappings) if self.field_mappings else {}
     
+    def get_config(self):
+        """
+        Retrieve the stored integration configuration
+        
+        The parsed configuration is shared through the config cache, so
+        callers must not modify it.
+        
+        Returns:
+            dict: Configuration (platform, alchemy, platform-specific and sync_config sections)
+        """
+        return self._parsed_config()[0]
+    
+    def get_mappings(self):
+        """
+        Retrieve the processed field mappings
+        
+        Returns:
+            list: Mappings with alchemy_field and platform_field keys (shared, do not modify)
+        """
+        return self._parsed_config()[1]
+    
+    def _parsed_config(self):
+        """
+        Parse the configuration and mappings, or take them from the config cache
+        
+        Only persisted, unmodified rows use the cache: their updated_at
+        identifies exactly what was parsed. With field_mappings deferred, a
+        cache hit costs no JSON parse and no mappings query.
+        
+        Returns:
+            tuple: (config, mappings)
+        """
+        cacheable = self.id is not None and self.updated_at is not None and not inspect(self).modified
+        if cacheable:
+            cached = integration_config_cache.get(self.id, self.updated_at)
+            if cached is not None:
+                return cached
+        
+        data = self.get_field_mappings()
+        config = data.get('config', {})
+        if self.mapping_rows:
+            mappings = [row.to_dict() for row in self.mapping_rows]
+        else:
+            mappings = data.get('mappings', [])
+        
+        if cacheable:
+            integration_config_cache.store(self.id, self.updated_at, config, mappings)
+        return config, mappings
+    
+    def set_config(self, config, mappings):
+        """
+        Store the configuration and mappings, keeping the summary columns in step
+        
+        Stored credentials (the Alchemy refresh token) are encrypted first.
+        
+        Args:
+            config (dict): Configuration (platform, alchemy, platform-specific and sync_config sections)
+            mappings (list): Mappings with alchemy_field, platform_field and optional required keys
+        """
+        protect_config(config)
+        platform = config.get('platform')
+        self.platform = platform
+        self.salesforce_username = f"{platform}_integration"
+        self.tenant_id = config.get('alchemy', {}).get('tenant_id')
+        self.record_type = config.get('alchemy', {}).get('record_type')
+        self.object_type = config.get(platform, {}).get('object_type')
+        self.mapping_count = len(mappings)
+        self.field_mappings = json.dumps({'config': config})
+        self.mapping_rows = [
+            IntegrationFieldMapping(
+                position=position,
+                alchemy_field=mapping.get('alchemy_field'),
+                platform_field=mapping.get('platform_field'),
+                required=mapping.get('required')
+            )
+            for position, mapping in enumerate(mappings)
+        ]
+    
     def __repr__(self):
         return f'<SalesforceIntegration {self.id}>'
 
+@db.event.listens_for(SalesforceIntegration, 'after_update')
+@db.event.listens_for(SalesforceIntegration, 'after_delete')
+def _invalidate_integration_config(mapper, connection, target):
+    """Drop this process's parsed configuration when an integration is saved or deleted"""
+    integration_config_cache.invalidate(target.id)
+
+class IntegrationFieldMapping(db.Model):
+    """
+    Model to store one field mapping of an integration
+    """
+    __tablename__ = 'integration_field_mappings'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    integration_id = db.Column(db.Integer, db.ForeignKey('salesforce_integrations.id', ondelete='CASCADE'),
+                               nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    alchemy_field = db.Column(db.String(255), nullable=True)
+    platform_field = db.Column(db.String(255), nullable=True)
+    required = db.Column(db.Boolean, nullable=True)
+    
+    def to_dict(self):
+        """Mapping in the stored JSON format"""
+        mapping = {
+            'alchemy_field': self.alchemy_field,
+            'platform_field': self.platform_field
+        }
+        if self.required is not None:
+            mapping['required'] = self.required
+        return mapping
+    
+    def __repr__(self):
+        return f'<IntegrationFieldMapping {self.alchemy_field}->{self.platform_field}>'
+
+class SyncState(db.Model):
+    """
+    Model to store the incremental sync position of an integration
+    """
+    __tablename__ = 'sync_states'
+    __table_args__ = (
+        db.UniqueConstraint('integration_id', 'direction', name='uq_sync_state_direction'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    integration_id = db.Column(db.Integer, db.ForeignKey('salesforce_integrations.id', ondelete='CASCADE'), nullable=False)
+    
+    # 'pull' for platform -> Alchemy, 'push' for Alchemy -> platform
+    direction = db.Column(db.String(20), nullable=False)
+    
+    # Last modification time (epoch milliseconds) fully processed
+    watermark = db.Column(db.String(50), nullable=True)
+    
+    # Paging cursor of an interrupted run, valid only with the stored watermark
+    cursor = db.Column(db.String(255), nullable=True)
+    
+    last_run_at = db.Column(db.DateTime, nullable=True)
+    last_result = db.Column(db.JSON, nullable=True)
+    
+    def __repr__(self):
+        return f'<SyncState {self.integration_id}:{self.direction}>'
+
+class BatchSize(db.Model):
+    """
+    Model to persist adaptive batch sizes per integration and upstream channel
+    """
+    __tablename__ = 'batch_sizes'
+    __table_args__ = (
+        db.UniqueConstraint('integration_id', 'channel', name='uq_batch_size_channel'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    integration_id = db.Column(db.Integer, db.ForeignKey('salesforce_integrations.id', ondelete='CASCADE'), nullable=False)
+    
+    # e.g. 'alchemy_fetch', 'hubspot_write'
+    channel = db.Column(db.String(50), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<BatchSize {self.integration_id}:{self.channel}={self.size}>'
+
+class RecordLink(db.Model):
+    """
+    Model to cross-reference Alchemy records and their platform counterparts
+    """
+    __tablename__ = 'record_links'
+    __table_args__ = (
+        db.UniqueConstraint('integration_id', 'platform_record_id', name='uq_record_link_platform'),
+        db.Index('ix_record_link_alchemy', 'integration_id', 'alchemy_record_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    integration_id = db.Column(db.Integer, db.ForeignKey('salesforce_integrations.id', ondelete='CASCADE'), nullable=False)
+    alchemy_record_id = db.Column(db.String(100), nullable=False)
+    platform_record_id = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Echo suppression for bidirectional syncs: the platform's modification
+    # time (epoch milliseconds) of our last push, and a hash of the values
+    # our last pull wrote to Alchemy
+    platform_modified_at = db.Column(db.BigInteger, nullable=True)
+    pulled_hash = db.Column(db.String(64), nullable=True)
+    
+    def __repr__(self):
+        return f'<RecordLink {self.alchemy_record_id}<->{self.platform_record_id}>'
+
+class WebhookEvent(db.Model):
+    """
+    Model to queue incoming platform change events until a worker applies them
+    """
+    __tablename__ = 'webhook_events'
+    __table_args__ = (
+        db.Index('ix_webhook_event_pending', 'processed_at', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    integration_id = db.Column(db.Integer, nullable=False, index=True)
+    object_id = db.Column(db.String(100), nullable=False)
+    event_type = db.Column(db.String(100), nullable=True)
+    
+    # Event time reported by the platform (epoch milliseconds)
+    occurred_at = db.Column(db.BigInteger, nullable=True)
+    payload = db.Column(db.JSON, nullable=True)
+    
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    
+    # Drain attempts so far; a drainer owns the event until lease_until, and
+    # after a failure lease_until is the earliest retry time
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    lease_owner = db.Column(db.String(32), nullable=True)
+    lease_until = db.Column(db.DateTime, nullable=True)
+    
+    # Dead letter: set when the event failed on every attempt
+    failed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    
+    def __repr__(self):
+        return f'<WebhookEvent {self.id} {self.event_type}:{self.object_id}>'
+
+class ServerSession(db.Model):
+    """
+    Model to store session data server-side; the cookie only carries the session ID
+    """
+    __tablename__ = 'server_sessions'
+    
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<ServerSession expires {self.expires_at}>'
+
 class SalesforceIntegrationSchema(ma.SQLAlchemyAutoSchema):
     """
     Marshmallow schema for serializing SalesforceIntegration
@@ -4,10 +4,19 @@ from app.models import SalesforceIntegration, SalesforceIntegrationSchema
 from services.alchemy_service import (
     get_alchemy_access_token,
     get_alchemy_record_types,
-    fetch_alchemy_fields
+    fetch_alchemy_fields,
+    record_type_cache,
+    field_cache,
+    metadata_cache_key,
+    is_fallback_fields,
+    refresh_record_types,
+    refresh_fields
 )
 import logging
 import requests
+from services.upstream import CircuitOpenError, Deadline, upstream_request
+from app.conditional import conditional_json, etag_for
+from app.logging_utils import log_payload
 import json
 from datetime import datetime
 import traceback
@@ -38,10 +47,31 @@ def get_record_types():
         if not tenant_id or not refresh_token:
             return jsonify({"error": "Missing tenant_id or refresh_token"}), 400
 
+        # Serve cached record types immediately; expired entries refresh in the background
+        cache_key = metadata_cache_key(tenant_id, refresh_token)
+        record_types, cache_age = record_type_cache.lookup(
+            cache_key, refresh=lambda: refresh_record_types(refresh_token, tenant_id)
+        )
+        if record_types is not None:
+            return conditional_json({
+                "status": "success",
+                "message": f"Successfully retrieved {len(record_types)} record types",
+                "recordTypes": record_types,
+                "cache_age": round(cache_age)
+            }, etag_for('record_types', record_types))
+
+        deadline = Deadline(current_app.config['REQUEST_DEADLINE_SECONDS'])
+
         # Get access token using improved method
-        access_token = get_alchemy_access_token(refresh_token, tenant_id)
+        access_token = get_alchemy_access_token(refresh_token, tenant_id, deadline)
         if not access_token:
             current_app.logger.error(f"Failed to get access token for tenant {tenant_id}")
+            if deadline.expired():
+                return jsonify({
+                    "status": "error",
+                    "message": "Alchemy did not respond in time, please try again",
+                    "recordTypes": []
+                }), 504
             return jsonify({
                 "status": "error",
                 "message": "Unable to get access token - authentication may have expired",
@@ -49,20 +79,22 @@ def get_record_types():
             }), 401
 
         # Fetch record types
-        record_types = get_alchemy_record_types(access_token, tenant_id)
+        record_types = get_alchemy_record_types(access_token, tenant_id, deadline)
         if not record_types:
             current_app.logger.warning(f"No record types found for tenant {tenant_id}")
             return jsonify({
                 "status": "warning",
-                "message": "No record types found",
+                "message": "Alchemy did not respond in time" if deadline.expired() else "No record types found",
                 "recordTypes": []
             })
 
-        return jsonify({
+        record_type_cache.store(cache_key, record_types)
+        return conditional_json({
             "status": "success",
             "message": f"Successfully retrieved {len(record_types)} record types",
-            "recordTypes": record_types
-        })
+            "recordTypes": record_types,
+            "cache_age": 0
+        }, etag_for('record_types', record_types))
 
     except Exception as e:
         current_app.logger.error(f"Error in get_record_types: {str(e)}")
@@ -130,16 +162,27 @@ def get_fields():
                 "fields": []
             }), 400
 
-        # Get fields using improved service method
-        fields = fetch_alchemy_fields(tenant_id, refresh_token, record_type)
+        # Serve cached fields immediately; expired entries refresh in the background
+        cache_key = metadata_cache_key(tenant_id, refresh_token, record_type)
+        fields, cache_age = field_cache.lookup(
+            cache_key, refresh=lambda: refresh_fields(tenant_id, refresh_token, record_type)
+        )
+        if fields is not None:
+            return conditional_json({
+                "status": "success",
+                "message": f"Successfully fetched {len(fields)} fields",
+                "fields": fields,
+                "cache_age": round(cache_age)
+            }, etag_for('alchemy_fields', record_type, fields))
         
-        # Log the actual fields for debugging
-        current_app.logger.info(f"Fields to return: {json.dumps(fields)}")
+        # Get fields using improved service method
+        deadline = Deadline(current_app.config['REQUEST_DEADLINE_SECONDS'])
+        fields = fetch_alchemy_fields(tenant_id, refresh_token, record_type, deadline)
         
-        # Check if these are fallback fields
-        is_fallback = len(fields) == 4 and fields[0]['identifier'] == 'Name' and fields[1]['identifier'] == 'Description'
+        # Log the actual fields for debugging, for a sample of requests
+        log_payload(current_app.logger, 'get_fields', f"Fields to return for {record_type}", fields)
         
-        if is_fallback:
+        if is_fallback_fields(fields):
             current_app.logger.warning("Returning fallback fields")
             return jsonify({
                 "status": "warning",
@@ -147,11 +190,13 @@ def get_fields():
                 "fields": fields
             })
         
-        return jsonify({
+        field_cache.store(cache_key, fields)
+        return conditional_json({
             "status": "success",
             "message": f"Successfully fetched {len(fields)} fields",
-            "fields": fields
-        })
+            "fields": fields,
+            "cache_age": 0
+        }, etag_for('alchemy_fields', record_type, fields))
         
     except Exception as e:
         current_app.logger.error(f"Failed to fetch fields: {str(e)}")
@@ -221,8 +266,8 @@ def authenticate_alchemy():
         
         # Make the authentication request
         try:
-            response = requests.post(
-                auth_url,
+            response = upstream_request(
+                'POST', auth_url,
                 json={
                     "email": email,
                     "password": password
@@ -231,6 +276,12 @@ def authenticate_alchemy():
                     "Content-Type": "application/json"
                 }
             )
+        except CircuitOpenError as e:
+            current_app.logger.warning(f"Alchemy unavailable during authentication: {str(e)}")
+            return jsonify({
+                "status": "error",
+                "message": "Alchemy is currently unavailable, please try again shortly"
+            }), 503
         except requests.exceptions.RequestException as e:
             current_app.logger.error(f"Network error during authentication: {str(e)}")
             return jsonify({
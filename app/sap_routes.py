@@ -0,0 +1,194 @@
+# app/sap_routes.py
+from flask import Blueprint, request, jsonify
+from app.conditional import conditional_json
+from services.sap_service import get_sap_service
+import logging
+import traceback
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Create a blueprint for SAP routes
+sap_bp = Blueprint('sap', __name__, url_prefix='/sap')
+
+
+def _service_from_request(data):
+    """Build an SAP service from the connection details in a request body"""
+    base_url = data.get('base_url')
+    client_id = data.get('client_id')
+    client_secret = data.get('client_secret')
+
+    return get_sap_service(
+        base_url=base_url.strip() if base_url else None,
+        client_id=client_id.strip() if client_id else None,
+        client_secret=client_secret.strip() if client_secret else None
+    )
+
+
+@sap_bp.route('/validate', methods=['POST'])
+def validate_sap():
+    """
+    Validate SAP OData connection details by loading the service metadata
+    """
+    try:
+        data = request.get_json()
+
+        if not data.get('base_url'):
+            logger.error("Missing base URL in SAP validation request")
+            return jsonify({
+                "status": "error",
+                "message": "Missing base URL"
+            }), 400
+
+        logger.info(f"Validating SAP OData service at {data.get('base_url')}")
+
+        sap_service = _service_from_request(data)
+        is_valid, message = sap_service.validate_credentials()
+
+        if is_valid:
+            return jsonify({
+                "status": "success",
+                "message": message
+            })
+        else:
+            logger.warning(f"SAP validation failed: {message}")
+            return jsonify({
+                "status": "error",
+                "message": message
+            })
+
+    except Exception as e:
+        logger.error(f"Error validating SAP credentials: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({
+            "status": "error",
+            "message": f"Error: {str(e)}"
+        }), 500
+
+
+@sap_bp.route('/entity-sets', methods=['POST'])
+def get_entity_sets():
+    """
+    Get the entity sets exposed by an SAP OData service
+    """
+    try:
+        data = request.get_json()
+
+        if not data.get('base_url'):
+            logger.error("Missing base URL for entity sets request")
+            return jsonify({
+                "status": "error",
+                "message": "Missing base URL",
+                "entity_sets": []
+            }), 400
+
+        entity_sets = _service_from_request(data).get_entity_sets()
+
+        return conditional_json({
+            "status": "success",
+            "message": f"Successfully retrieved {len(entity_sets)} entity sets",
+            "entity_sets": entity_sets
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting SAP entity sets: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({
+            "status": "error",
+            "message": f"Error: {str(e)}",
+            "entity_sets": []
+        }), 500
+
+
+@sap_bp.route('/fields', methods=['POST'])
+def get_fields():
+    """
+    Get the properties of an SAP entity set
+    """
+    try:
+        data = request.get_json()
+        entity_set = data.get('entity_set')
+
+        if not data.get('base_url') or not entity_set:
+            logger.error("Missing base URL or entity set in fields request")
+            return jsonify({
+                "status": "error",
+                "message": "Missing base URL or entity set",
+                "fields": []
+            }), 400
+
+        logger.info(f"Fetching SAP fields for entity set: {entity_set}")
+
+        fields = _service_from_request(data).get_fields_for_entity_set(entity_set)
+
+        if fields:
+            return conditional_json({
+                "status": "success",
+                "message": f"Successfully retrieved {len(fields)} fields for {entity_set}",
+                "fields": fields
+            })
+        else:
+            return jsonify({
+                "status": "warning",
+                "message": f"No fields found for {entity_set}",
+                "fields": []
+            })
+
+    except Exception as e:
+        logger.error(f"Error getting SAP fields: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({
+            "status": "error",
+            "message": f"Error: {str(e)}",
+            "fields": []
+        }), 500
+
+
+@sap_bp.route('/records', methods=['POST'])
+def write_records():
+    """
+    Create or update records in an SAP entity set through $batch changesets
+
+    Expects base_url, client_id, client_secret, entity_set, records (list of
+    dicts keyed by SAP property name) and optionally batch_size.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        entity_set = data.get('entity_set')
+        records = data.get('records')
+
+        if not data.get('base_url') or not entity_set:
+            logger.error("Missing base URL or entity set in SAP write request")
+            return jsonify({
+                "status": "error",
+                "message": "Missing base URL or entity set"
+            }), 400
+
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            return jsonify({
+                "status": "error",
+                "message": "records must be a list of objects"
+            }), 400
+
+        sap_service = _service_from_request(data)
+        results = sap_service.write_records(entity_set, records, batch_size=data.get('batch_size'))
+        failed = [result for result in results if not result['success']]
+
+        return jsonify({
+            "status": "success" if not failed else "warning",
+            "message": f"Wrote {len(results) - len(failed)}/{len(results)} records to {entity_set}",
+            "results": results
+        })
+
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error writing SAP records: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({
+            "status": "error",
+            "message": f"Error: {str(e)}"
+        }), 500
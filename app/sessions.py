@@ -0,0 +1,165 @@
+"""
+Database-backed Flask sessions
+
+The session cookie holds only a signed session ID; the data (e.g. the
+Alchemy refresh tokens of every authenticated tenant) lives in the
+server_sessions table. Rows are written only when the data changes or
+the expiry needs extending, and expired rows are removed periodically
+and by flask cleanup-sessions.
+"""
+from datetime import datetime
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+from app import db
+from app.models import ServerSession
+import logging
+import secrets
+import threading
+import time
+import traceback
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Seconds between opportunistic cleanups of expired sessions, per process
+CLEANUP_INTERVAL = 3600
+
+class DatabaseSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its ID and the data it was loaded with"""
+    def __init__(self, initial=None, sid=None, new=False, stored=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        # Serialized data as stored, so unchanged sessions are not rewritten
+        self.stored = stored
+        self.expires_at = expires_at
+
+class DatabaseSessionInterface(SessionInterface):
+    """
+    Keep session data in the database and only a signed session ID in the cookie
+    """
+    serializer = TaggedJSONSerializer()
+    session_class = DatabaseSession
+    salt = 'server-session'
+
+    def __init__(self):
+        self._last_cleanup = time.time()
+        self._cleanup_lock = threading.Lock()
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def _new_session(self):
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+
+        # Static files never use the session, so don't look it up for them
+        if app.static_url_path and request.path.startswith(app.static_url_path + '/'):
+            return self.session_class()
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self._new_session()
+
+        try:
+            sid = self._signer(app).unsign(cookie).decode('ascii')
+        except BadSignature:
+            return self._new_session()
+
+        try:
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    ServerSession.__table__.select().where(
+                        ServerSession.id == sid,
+                        ServerSession.expires_at > datetime.utcnow()
+                    )
+                ).first()
+            if row is None:
+                return self._new_session()
+            return self.session_class(self.serializer.loads(row.data), sid=sid, stored=row.data,
+                                      expires_at=row.expires_at)
+        except Exception as e:
+            logger.error(f"Could not load session: {str(e)}")
+            logger.error(traceback.format_exc())
+            return self._new_session()
+
+    def save_session(self, app, session, response):
+        if session.sid is None:
+            return
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        table = ServerSession.__table__
+
+        if not session:
+            # Emptied session: forget it on both sides
+            if not session.new:
+                with db.engine.begin() as conn:
+                    conn.execute(table.delete().where(ServerSession.id == session.sid))
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        now = datetime.utcnow()
+        lifetime = app.permanent_session_lifetime
+        data = self.serializer.dumps(dict(session))
+        # Extend the expiry once half the lifetime has passed, not on every request
+        renew = session.expires_at is None or session.expires_at - now < lifetime / 2
+        if data == session.stored and not renew:
+            return
+
+        expires_at = now + lifetime
+        with db.engine.begin() as conn:
+            values = {'data': data, 'expires_at': expires_at}
+            if session.new or not conn.execute(
+                table.update().where(ServerSession.id == session.sid).values(**values)
+            ).rowcount:
+                conn.execute(table.insert().values(id=session.sid, **values))
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid.encode('ascii')).decode('ascii'),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+        self._maybe_cleanup()
+
+    def _maybe_cleanup(self):
+        """Remove expired sessions at most once per CLEANUP_INTERVAL in this process"""
+        if time.time() - self._last_cleanup < CLEANUP_INTERVAL or not self._cleanup_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_cleanup = time.time()
+            removed = cleanup_expired_sessions()
+            if removed:
+                logger.info(f"Removed {removed} expired sessions")
+        except Exception as e:
+            logger.error(f"Session cleanup failed: {str(e)}")
+            logger.error(traceback.format_exc())
+        finally:
+            self._cleanup_lock.release()
+
+def cleanup_expired_sessions():
+    """
+    Delete sessions past their expiry
+
+    Returns:
+        int: Number of sessions removed
+    """
+    with db.engine.begin() as conn:
+        result = conn.execute(ServerSession.__table__.delete().where(ServerSession.expires_at <= datetime.utcnow()))
+    return result.rowcount
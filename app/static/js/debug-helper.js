@@ -118,6 +118,40 @@
         console.log(`[DEBUG] ${message}`);
     };
     
+    // Log the Server-Timing breakdown of a response, slowest part first
+    function logServerTiming(url, header) {
+        if (!header) return;
+        
+        const parts = header.split(',').map(function(entry) {
+            const name = entry.split(';')[0].trim();
+            const dur = /dur=([\d.]+)/.exec(entry);
+            const desc = /desc="([^"]*)"/.exec(entry);
+            return { name: desc ? desc[1] : name, key: name, ms: dur ? parseFloat(dur[1]) : 0 };
+        });
+        
+        const total = parts.find(part => part.key === 'total');
+        const breakdown = parts
+            .filter(part => part.key !== 'total')
+            .sort((a, b) => b.ms - a.ms)
+            .map(part => `${part.name} ${part.ms.toFixed(0)}ms`)
+            .join(', ');
+        
+        const totalMs = total ? total.ms : 0;
+        logDebug(`Timing ${url}: ${totalMs.toFixed(0)}ms (${breakdown})`, totalMs > 2000 ? 'warning' : 'info');
+    }
+    
+    // Log the individual spans of a debug_timing block
+    function logDebugTiming(url, data) {
+        if (!data || !data.debug_timing || !data.debug_timing.spans) return;
+        
+        data.debug_timing.spans
+            .filter(span => span.category === 'upstream')
+            .forEach(function(span) {
+                const status = span.detail && span.detail.status ? ` [${span.detail.status}]` : '';
+                logDebug(`  ${span.name} +${span.start_ms.toFixed(0)}ms ${span.duration_ms.toFixed(0)}ms${status}`, 'info');
+            });
+    }
+    
     // Check for authentication elements
     function checkAuthElements() {
         const authBtn = document.getElementById('authenticateBtn');
@@ -169,10 +203,15 @@
         if (typeof $ !== 'undefined') {
             $(document).ajaxSend(function(event, jqXHR, settings) {
                 logDebug(`AJAX request to: ${settings.url}`, 'info');
+                if (!settings.crossDomain) {
+                    jqXHR.setRequestHeader('X-Debug-Timing', '1');
+                }
             });
             
             $(document).ajaxSuccess(function(event, jqXHR, settings, data) {
                 logDebug(`AJAX success: ${settings.url}`, 'success');
+                logServerTiming(settings.url, jqXHR.getResponseHeader('Server-Timing'));
+                logDebugTiming(settings.url, data);
                 
                 // Log authentication success
                 if (settings.url === '/authenticate-alchemy' && data && data.status === 'success') {
@@ -239,13 +278,29 @@
             
             logDebug(`Fetch request to: ${url}`, 'info');
             
-            return originalFetch.apply(this, arguments)
+            // Ask our own endpoints for the per-span debug_timing block
+            let init = options;
+            if (typeof url === 'string' && new URL(url, window.location.href).origin === window.location.origin) {
+                const headers = new Headers(options.headers || {});
+                headers.set('X-Debug-Timing', '1');
+                init = { ...options, headers: headers };
+            }
+            
+            return originalFetch.call(this, url, init)
                 .then(function(response) {
                     const clonedResponse = response.clone();
                     
+                    logServerTiming(url, response.headers.get('Server-Timing'));
+                    
                     if (response.ok) {
                         logDebug(`Fetch success: ${url}`, 'success');
                         
+                        if ((response.headers.get('Content-Type') || '').includes('application/json')) {
+                            response.clone().json().then(data => logDebugTiming(url, data)).catch(() => {
+                                // Not JSON response
+                            });
+                        }
+                        
                         // Log authentication success
                         if (url === '/authenticate-alchemy') {
                             clonedResponse.json().then(data => {
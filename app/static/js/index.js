@@ -84,8 +84,55 @@ document.addEventListener('DOMContentLoaded', function() {
     debugLog('Index page initialization complete', 'success');
 });
 
+// Integrations fetched per page, newest first, with only the fields the table shows
+const INTEGRATIONS_PAGE_SIZE = 50;
+const INTEGRATION_LIST_FIELDS = 'id,platform,created_at,is_active,details';
+
+// Integration pages that carried an ETag, by URL, for If-None-Match revalidation
+const integrationPageCache = new Map();
+
+/**
+ * Fetch JSON, revalidating a previously fetched URL with its ETag
+ * Resolves to the stored data when the server answers 304 Not Modified.
+ */
+function fetchJSONConditional(url) {
+    const cached = integrationPageCache.get(url);
+    const headers = cached ? { 'If-None-Match': cached.etag } : {};
+    
+    return fetch(url, { headers })
+        .then(response => {
+            debugLog(`Received response with status: ${response.status}`);
+            if (response.status === 304 && cached) {
+                return cached.data;
+            }
+            return response.json().then(data => {
+                const etag = response.headers.get('ETag');
+                if (etag && response.ok) {
+                    integrationPageCache.set(url, { etag, data });
+                }
+                return data;
+            });
+        });
+}
+
+/**
+ * Build the /integrations URL for a page
+ */
+function integrationsPageUrl(cursor) {
+    const params = new URLSearchParams({
+        limit: INTEGRATIONS_PAGE_SIZE,
+        sort: 'id',
+        order: 'desc',
+        fields: INTEGRATION_LIST_FIELDS
+    });
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    return `/integrations?${params.toString()}`;
+}
+
 /**
- * Load integrations from the API
+ * Load the first page of integrations from the API
  */
 function loadIntegrations() {
     const integrationsContainer = document.getElementById('integrationsContainer');
@@ -104,16 +151,12 @@ function loadIntegrations() {
     `;
     
     // Fetch integrations
-    fetch('/integrations')
-        .then(response => {
-            debugLog(`Received response with status: ${response.status}`);
-            return response.json();
-        })
+    fetchJSONConditional(integrationsPageUrl())
         .then(data => {
             debugLog(`Processed response data: ${data.status}`, data.status === 'success' ? 'success' : 'warning');
             
             if (data.status === 'success') {
-                displayIntegrations(data.integrations);
+                displayIntegrations(data.integrations, data.next_cursor);
             } else {
                 showError(data.message || 'Failed to load integrations');
             }
@@ -125,10 +168,65 @@ function loadIntegrations() {
         });
 }
 
+/**
+ * Load the next page of integrations and append it to the table
+ */
+function loadMoreIntegrations(cursor) {
+    const loadMoreBtn = document.getElementById('loadMoreBtn');
+    if (loadMoreBtn) {
+        loadMoreBtn.disabled = true;
+        loadMoreBtn.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Loading...';
+    }
+    
+    debugLog('Loading next page of integrations');
+    
+    fetchJSONConditional(integrationsPageUrl(cursor))
+        .then(data => {
+            if (data.status === 'success') {
+                const tableBody = document.getElementById('integrationsTableBody');
+                if (tableBody) {
+                    tableBody.insertAdjacentHTML('beforeend', data.integrations.map(renderIntegrationRow).join(''));
+                    bindIntegrationActions();
+                }
+                updateLoadMore(data.next_cursor);
+            } else {
+                showToast('error', data.message || 'Failed to load more integrations');
+                updateLoadMore(cursor);
+            }
+        })
+        .catch(error => {
+            debugLog(`Error loading more integrations: ${error.message}`, 'error');
+            showToast('error', 'Error loading more integrations. Please try again.');
+            updateLoadMore(cursor);
+        });
+}
+
+/**
+ * Show a "Load more" button while there are more pages
+ */
+function updateLoadMore(nextCursor) {
+    const loadMoreContainer = document.getElementById('loadMoreContainer');
+    if (!loadMoreContainer) return;
+    
+    if (!nextCursor) {
+        loadMoreContainer.innerHTML = '';
+        return;
+    }
+    
+    loadMoreContainer.innerHTML = `
+        <button type="button" id="loadMoreBtn" class="btn btn-outline-primary">
+            <i class="fas fa-chevron-down me-2"></i>Load more
+        </button>
+    `;
+    document.getElementById('loadMoreBtn').addEventListener('click', function() {
+        loadMoreIntegrations(nextCursor);
+    });
+}
+
 /**
  * Display integrations in the container
  */
-function displayIntegrations(integrations) {
+function displayIntegrations(integrations, nextCursor) {
     const integrationsContainer = document.getElementById('integrationsContainer');
     if (!integrationsContainer) return;
     
@@ -176,78 +274,87 @@ function displayIntegrations(integrations) {
                         <th>Actions</th>
                     </tr>
                 </thead>
-                <tbody>
-    `;
-    
-    // Add each integration
-    integrations.forEach(integration => {
-        const platformIcon = getPlatformIcon(integration.platform);
-        const statusBadge = integration.is_active 
-            ? '<span class="badge bg-success">Active</span>' 
-            : '<span class="badge bg-secondary">Inactive</span>';
-        
-        // Format created date
-        const createdDate = integration.created_at 
-            ? new Date(integration.created_at).toLocaleString() 
-            : 'Unknown';
-        
-        // Determine details text based on platform
-        let detailsText = '';
-        
-        if (integration.platform === 'hubspot') {
-            detailsText = `Alchemy <strong>${integration.details.alchemy_record_type}</strong> ↔ HubSpot <strong>${integration.details.platform_object_type || 'Object'}</strong>`;
-        } else if (integration.platform === 'salesforce') {
-            detailsText = `Alchemy <strong>${integration.details.alchemy_record_type}</strong> ↔ Salesforce Object`;
-        } else if (integration.platform === 'sap') {
-            detailsText = `Alchemy <strong>${integration.details.alchemy_record_type}</strong> ↔ SAP Object`;
-        } else {
-            detailsText = `Alchemy <strong>${integration.details.alchemy_record_type}</strong> ↔ Unknown`;
-        }
-        
-        html += `
-            <tr data-integration-id="${integration.id}">
-                <td>
-                    <div class="d-flex align-items-center">
-                        ${platformIcon}
-                        <span class="ms-2">${capitalize(integration.platform)}</span>
-                    </div>
-                </td>
-                <td>${detailsText}</td>
-                <td>${statusBadge}</td>
-                <td>${createdDate}</td>
-                <td>
-                    <div class="btn-group">
-                        <button type="button" class="btn btn-sm btn-outline-primary view-integration" data-id="${integration.id}">
-                            <i class="fas fa-eye"></i>
-                        </button>
-                        <button type="button" class="btn btn-sm btn-outline-danger delete-integration" data-id="${integration.id}">
-                            <i class="fas fa-trash"></i>
-                        </button>
-                    </div>
-                </td>
-            </tr>
-        `;
-    });
-    
-    // Close table
-    html += `
+                <tbody id="integrationsTableBody">
+                    ${integrations.map(renderIntegrationRow).join('')}
                 </tbody>
             </table>
         </div>
+        <div id="loadMoreContainer" class="text-center mt-3"></div>
     `;
     
     // Update container
     integrationsContainer.innerHTML = html;
     
-    // Add event listeners to buttons
-    document.querySelectorAll('.view-integration').forEach(button => {
+    bindIntegrationActions();
+    updateLoadMore(nextCursor);
+}
+
+/**
+ * Build the table row for an integration
+ */
+function renderIntegrationRow(integration) {
+    const platformIcon = getPlatformIcon(integration.platform);
+    const statusBadge = integration.is_active 
+        ? '<span class="badge bg-success">Active</span>' 
+        : '<span class="badge bg-secondary">Inactive</span>';
+    
+    // Format created date
+    const createdDate = integration.created_at 
+        ? new Date(integration.created_at).toLocaleString() 
+        : 'Unknown';
+    
+    // Determine details text based on platform
+    let detailsText = '';
+    
+    if (integration.platform === 'hubspot') {
+        detailsText = `Alchemy <strong>${integration.details.alchemy_record_type}</strong> ↔ HubSpot <strong>${integration.details.platform_object_type || 'Object'}</strong>`;
+    } else if (integration.platform === 'salesforce') {
+        detailsText = `Alchemy <strong>${integration.details.alchemy_record_type}</strong> ↔ Salesforce Object`;
+    } else if (integration.platform === 'sap') {
+        detailsText = `Alchemy <strong>${integration.details.alchemy_record_type}</strong> ↔ SAP Object`;
+    } else {
+        detailsText = `Alchemy <strong>${integration.details.alchemy_record_type}</strong> ↔ Unknown`;
+    }
+    
+    return `
+        <tr data-integration-id="${integration.id}">
+            <td>
+                <div class="d-flex align-items-center">
+                    ${platformIcon}
+                    <span class="ms-2">${capitalize(integration.platform)}</span>
+                </div>
+            </td>
+            <td>${detailsText}</td>
+            <td>${statusBadge}</td>
+            <td>${createdDate}</td>
+            <td>
+                <div class="btn-group">
+                    <button type="button" class="btn btn-sm btn-outline-primary view-integration" data-id="${integration.id}">
+                        <i class="fas fa-eye"></i>
+                    </button>
+                    <button type="button" class="btn btn-sm btn-outline-danger delete-integration" data-id="${integration.id}">
+                        <i class="fas fa-trash"></i>
+                    </button>
+                </div>
+            </td>
+        </tr>
+    `;
+}
+
+/**
+ * Add click handlers to row buttons that don't have one yet
+ */
+function bindIntegrationActions() {
+    document.querySelectorAll('.view-integration:not([data-bound])').forEach(button => {
+        button.setAttribute('data-bound', 'true');
         button.addEventListener('click', function() {
             const id = this.getAttribute('data-id');
             viewIntegration(id);
         });
     });
     
-    document.querySelectorAll('.delete-integration').forEach(button => {
+    document.querySelectorAll('.delete-integration:not([data-bound])').forEach(button => {
+        button.setAttribute('data-bound', 'true');
         button.addEventListener('click', function() {
             const id = this.getAttribute('data-id');
             confirmDeleteIntegration(id);
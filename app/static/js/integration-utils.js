@@ -111,28 +111,48 @@ const IntegrationUtils = {
     }
   },
   
+  /**
+   * Responses that carried an ETag, keyed by method, URL and body, so
+   * repeat requests can be revalidated with If-None-Match
+   */
+  etagCache: new Map(),
+  
   /**
    * Make an API request with proper error handling
+   * Repeat requests send the last ETag and reuse the stored data on a 304.
    * @param {string} url - The API endpoint URL
    * @param {Object} options - Fetch options
    * @returns {Promise} - Promise that resolves to the response data
    */
   fetchAPI: async function(url, options = {}) {
+    const cacheKey = `${options.method || 'GET'} ${url} ${options.body || ''}`;
+    const cached = this.etagCache.get(cacheKey);
+    
     try {
       const response = await fetch(url, {
+        ...options,
         headers: {
           'Content-Type': 'application/json',
+          ...(cached ? { 'If-None-Match': cached.etag } : {}),
           ...options.headers
-        },
-        ...options
+        }
       });
       
+      if (response.status === 304 && cached) {
+        return cached.data;
+      }
+      
       const data = await response.json();
       
       if (!response.ok) {
         throw new Error(data.message || `Server returned ${response.status}`);
       }
       
+      const etag = response.headers.get('ETag');
+      if (etag) {
+        this.etagCache.set(cacheKey, { etag, data });
+      }
+      
       return data;
     } catch (error) {
       console.error(`API error: ${error.message}`);
@@ -233,7 +253,7 @@ const IntegrationUtils = {
         if (data.status === 'warning') {
           this.showStatus('recordTypeStatus', 'warning', data.message || 'Using fallback fields');
         } else {
-          this.showStatus('recordTypeStatus', 'success', `Successfully retrieved ${data.fields.length} fields for record type: ${recordType}`);
+          this.showStatus('recordTypeStatus', 'success', `Successfully retrieved ${data.fields.length} fields for record type: ${recordType}${this.formatCacheAge(data.cache_age)}`);
         }
         
         return { success: true, fields: data.fields, message: data.message };
@@ -269,6 +289,19 @@ const IntegrationUtils = {
     }
   },
   
+  /**
+   * Describe how old cached metadata is, e.g. " (refreshed 5 min ago)"
+   * @param {number} seconds - cache_age from a metadata response
+   * @returns {string} - Suffix for a status message, empty for live data
+   */
+  formatCacheAge: function(seconds) {
+    if (!seconds) return '';
+    if (seconds < 60) return ' (refreshed just now)';
+    const minutes = Math.round(seconds / 60);
+    if (minutes < 60) return ` (refreshed ${minutes} min ago)`;
+    return ` (refreshed ${Math.round(minutes / 60)} h ago)`;
+  },
+  
   /**
    * Capitalize the first letter of a string
    * @param {string} str - String to capitalize
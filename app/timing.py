@@ -0,0 +1,129 @@
+"""
+Request hooks that report where a request spent its time
+
+Every response gets a Server-Timing header with the request's total
+upstream and database time and the remainder spent in our own code.
+Callers presenting the operator token (see app.admin_auth), and every
+caller in debug mode, get each upstream endpoint in the header too, and
+with ?debug_timing=1 or an X-Debug-Timing: 1 header JSON responses also
+get a debug_timing block listing each span. Endpoint and table names stay
+hidden from everyone else.
+"""
+from flask import Blueprint, current_app, g, request
+from app.admin_auth import is_admin_request
+from services import tracing
+import json
+import logging
+import re
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Create a blueprint for the timing hooks
+timing_bp = Blueprint('timing', __name__)
+
+# Upstream entries in the Server-Timing header, slowest first
+MAX_HEADER_ENTRIES = 10
+
+def _detailed_timing_allowed():
+    return current_app.debug or is_admin_request()
+
+def _wants_debug_timing():
+    flag = request.args.get('debug_timing') or request.headers.get('X-Debug-Timing', '')
+    return flag.lower() in ('1', 'true', 'yes')
+
+def _metric_name(text):
+    """Turn a span name into a Server-Timing metric name (an HTTP token)"""
+    return re.sub(r'[^A-Za-z0-9_.-]+', '-', text).strip('-')
+
+def build_timing(trace):
+    """
+    Summarize a trace
+
+    Args:
+        trace (Trace): Finished request trace
+
+    Returns:
+        dict: total_ms, upstream_ms, db_ms, app_ms, db_queries, upstream ({name: {'duration_ms', 'count'}}) and spans
+    """
+    total_ms = trace.elapsed() * 1000
+    upstream = {}
+    db_ms = 0.0
+    db_queries = 0
+    for item in trace.spans:
+        if item['category'] == 'db':
+            db_ms += item['duration_ms']
+            db_queries += 1
+        else:
+            entry = upstream.setdefault(item['name'], {'duration_ms': 0.0, 'count': 0})
+            entry['duration_ms'] += item['duration_ms']
+            entry['count'] += 1
+    upstream_ms = sum(entry['duration_ms'] for entry in upstream.values())
+
+    return {
+        'total_ms': round(total_ms, 2),
+        'upstream_ms': round(upstream_ms, 2),
+        'db_ms': round(db_ms, 2),
+        # Upstream calls and queries run on the request thread, so the rest is our own code
+        'app_ms': round(max(total_ms - upstream_ms - db_ms, 0.0), 2),
+        'db_queries': db_queries,
+        'upstream': upstream,
+        'spans': trace.spans,
+        'dropped_spans': trace.dropped
+    }
+
+def server_timing_header(timing, detailed=True):
+    """
+    Format a timing summary as a Server-Timing header value
+
+    Args:
+        timing (dict): Summary from build_timing
+        detailed (bool, optional): Name each upstream endpoint; otherwise upstream time is one
+            aggregate entry. Defaults to True.
+
+    Returns:
+        str: Header value
+    """
+    entries = []
+    if detailed:
+        slowest = sorted(timing['upstream'].items(), key=lambda item: item[1]['duration_ms'], reverse=True)
+        for name, entry in slowest[:MAX_HEADER_ENTRIES]:
+            desc = name if entry['count'] == 1 else f"{name} x{entry['count']}"
+            entries.append(f'{_metric_name(name)};dur={entry["duration_ms"]:.1f};desc="{desc}"')
+    elif timing['upstream']:
+        entries.append(f'upstream;dur={timing["upstream_ms"]:.1f}')
+    if timing['db_queries']:
+        queries = 'query' if timing['db_queries'] == 1 else 'queries'
+        entries.append(f'db;dur={timing["db_ms"]:.1f};desc="{timing["db_queries"]} {queries}"')
+    entries.append(f'app;dur={timing["app_ms"]:.1f};desc="own code"')
+    entries.append(f'total;dur={timing["total_ms"]:.1f}')
+    return ', '.join(entries)
+
+@timing_bp.before_app_request
+def start_timing():
+    if not current_app.config.get('SERVER_TIMING_ENABLED', True):
+        return
+    if current_app.static_url_path and request.path.startswith(current_app.static_url_path + '/'):
+        return
+    g.trace_token = tracing.start_trace()
+
+@timing_bp.after_app_request
+def add_timing(response):
+    token = g.pop('trace_token', None)
+    if token is None:
+        return response
+
+    try:
+        timing = build_timing(tracing.end_trace(token))
+        detailed = _detailed_timing_allowed()
+        response.headers['Server-Timing'] = server_timing_header(timing, detailed)
+
+        if (detailed and _wants_debug_timing() and response.is_json and not response.is_streamed
+                and response.status_code != 304):
+            payload = response.get_json(silent=True)
+            if isinstance(payload, dict):
+                payload['debug_timing'] = timing
+                response.set_data(json.dumps(payload))
+    except Exception as e:
+        logger.error(f"Could not add request timing: {str(e)}")
+    return response
@@ -0,0 +1,255 @@
+"""
+NDJSON export and import of integrations, for moving configurations between environments
+
+Each line is one integration:
+{"id", "platform", "is_active", "sync_frequency", "created_at", "updated_at", "config", "mappings"}
+IDs are informational; imported integrations get new IDs.
+
+Credentials (SECRET_FIELDS of every configuration section) are left out
+unless the export asks for them; then they are exported in plaintext, so
+they can be imported into an environment with a different encryption key.
+"""
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
+from app import db
+from app.credentials import decrypt_secret
+from app.models import IntegrationFieldMapping, SalesforceIntegration
+from datetime import datetime
+import json
+import logging
+import traceback
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+# Errors reported back in detail; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+# Credential fields, in any section of a configuration
+SECRET_FIELDS = ('access_token', 'refresh_token', 'client_secret', 'password', 'security_token', 'api_key')
+
+def export_config(config, include_secrets=False):
+    """
+    Copy a stored configuration for export
+
+    Args:
+        config (dict): Stored configuration (shared, not modified)
+        include_secrets (bool, optional): Keep credentials, decrypted. Defaults to False.
+
+    Returns:
+        dict: Configuration without credentials, or with plaintext credentials
+    """
+    exported = {}
+    for section, values in config.items():
+        if not isinstance(values, dict):
+            exported[section] = values
+        elif include_secrets:
+            exported[section] = {
+                key: decrypt_secret(value) if key in SECRET_FIELDS else value
+                for key, value in values.items()
+            }
+        else:
+            exported[section] = {key: value for key, value in values.items() if key not in SECRET_FIELDS}
+    return exported
+
+def iter_export_lines(platform=None, active=None, chunk_size=DEFAULT_CHUNK_SIZE, include_secrets=False):
+    """
+    Yield integrations as NDJSON lines, reading chunk_size rows at a time
+
+    Args:
+        platform (str, optional): Only export this platform. Defaults to None.
+        active (bool, optional): Only export active or inactive integrations. Defaults to None.
+        chunk_size (int, optional): Rows per query. Defaults to DEFAULT_CHUNK_SIZE.
+        include_secrets (bool, optional): Export credentials too. Defaults to False.
+
+    Yields:
+        str: One JSON document followed by a newline
+    """
+    last_id = 0
+    while True:
+        query = SalesforceIntegration.query.options(selectinload(SalesforceIntegration.mapping_rows))
+        if platform:
+            query = query.filter(SalesforceIntegration.platform == platform)
+        if active is not None:
+            query = query.filter(SalesforceIntegration.is_active == active)
+        integrations = query.filter(SalesforceIntegration.id > last_id).order_by(
+            SalesforceIntegration.id
+        ).limit(chunk_size).all()
+        if not integrations:
+            break
+
+        for integration in integrations:
+            config = integration.get_config()
+            yield json.dumps({
+                'id': integration.id,
+                'platform': integration.platform or config.get('platform'),
+                'is_active': integration.is_active,
+                'sync_frequency': integration.sync_frequency,
+                'created_at': integration.created_at.isoformat() if integration.created_at else None,
+                'updated_at': integration.updated_at.isoformat() if integration.updated_at else None,
+                'config': export_config(config, include_secrets),
+                'mappings': integration.get_mappings()
+            }) + '\n'
+
+        last_id = integrations[-1].id
+        # Keep memory flat however many integrations there are
+        db.session.expunge_all()
+
+def _check_type(value, types, message):
+    """Raise ValueError(message) unless value is None or one of types"""
+    if value is not None and not isinstance(value, types):
+        raise ValueError(message)
+
+def _build_rows(document, now):
+    """
+    Build the integration row and mapping rows for an exported document
+
+    Every value is type-checked here, so a bad line is reported on its own
+    instead of failing the insert of its whole chunk.
+
+    Args:
+        document (dict): One parsed NDJSON line
+        now (datetime): Timestamp for updated_at, and created_at if the document has none
+
+    Returns:
+        tuple: (integration row dict, list of mapping row dicts without integration_id)
+
+    Raises:
+        ValueError: If the document is invalid
+    """
+    if not isinstance(document, dict):
+        raise ValueError("Line is not a JSON object")
+    config = document.get('config')
+    mappings = document.get('mappings', [])
+    if not isinstance(config, dict) or not config.get('platform'):
+        raise ValueError("config with a platform is required")
+    platform = config['platform']
+    _check_type(platform, str, "config.platform must be a string")
+    for section in ('alchemy', platform, 'sync_config'):
+        _check_type(config.get(section), dict, f"config.{section} must be an object")
+    _check_type(config.get('alchemy', {}).get('tenant_id'), str, "config.alchemy.tenant_id must be a string")
+    _check_type(config.get('alchemy', {}).get('record_type'), str, "config.alchemy.record_type must be a string")
+    _check_type(config.get(platform, {}).get('object_type'), str, f"config.{platform}.object_type must be a string")
+    if not isinstance(mappings, list):
+        raise ValueError("mappings must be a list")
+    for position, mapping in enumerate(mappings):
+        if not isinstance(mapping, dict):
+            raise ValueError(f"mappings[{position}] must be an object")
+        for key in ('alchemy_field', 'platform_field'):
+            _check_type(mapping.get(key), str, f"mappings[{position}].{key} must be a string")
+        _check_type(mapping.get('required'), bool, f"mappings[{position}].required must be true or false")
+
+    is_active = document.get('is_active', True)
+    if not isinstance(is_active, bool):
+        raise ValueError("is_active must be true or false")
+    sync_frequency = document.get('sync_frequency') or config.get('sync_config', {}).get('frequency', 'daily')
+    _check_type(sync_frequency, str, "sync_frequency must be a string")
+    created_at = document.get('created_at')
+    _check_type(created_at, str, "created_at must be an ISO 8601 timestamp")
+    try:
+        created_at = datetime.fromisoformat(created_at) if created_at else now
+    except ValueError:
+        raise ValueError("created_at must be an ISO 8601 timestamp")
+
+    # set_config keeps the summary columns, stored JSON and encryption the
+    # same as for integrations saved through the API
+    integration = SalesforceIntegration()
+    integration.set_config(config, mappings)
+    row = {
+        'alchemy_base_url': current_app.config.get('ALCHEMY_BASE_URL'),
+        'alchemy_api_key': current_app.config.get('ALCHEMY_API_KEY'),
+        'salesforce_username': integration.salesforce_username,
+        'field_mappings': integration.field_mappings,
+        'platform': integration.platform,
+        'tenant_id': integration.tenant_id,
+        'record_type': integration.record_type,
+        'object_type': integration.object_type,
+        'mapping_count': integration.mapping_count,
+        'sync_frequency': sync_frequency,
+        'is_active': is_active,
+        'created_at': created_at,
+        'updated_at': now
+    }
+    mapping_rows = [
+        {
+            'position': mapping.position,
+            'alchemy_field': mapping.alchemy_field,
+            'platform_field': mapping.platform_field,
+            'required': mapping.required
+        }
+        for mapping in integration.mapping_rows
+    ]
+    return row, mapping_rows
+
+def import_integrations(lines, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Create integrations from NDJSON lines, one transaction per chunk
+
+    Invalid lines are skipped and reported. Each chunk is written with
+    bulk inserts: one executemany for its mapping rows, and one for its
+    integrations where the driver can return their IDs in a batch. If a chunk
+    fails to insert, it is rolled back and its lines are reported; earlier
+    chunks stay committed.
+
+    Args:
+        lines (iterable): NDJSON lines (str or bytes), e.g. an open file or request stream
+        chunk_size (int, optional): Integrations per transaction. Defaults to DEFAULT_CHUNK_SIZE.
+
+    Returns:
+        dict: {'imported': int, 'failed': int, 'errors': [{'line': int, 'message': str}]}
+    """
+    result = {'imported': 0, 'failed': 0, 'errors': []}
+
+    def fail(line_number, message):
+        result['failed'] += 1
+        if len(result['errors']) < MAX_REPORTED_ERRORS:
+            result['errors'].append({'line': line_number, 'message': message})
+
+    def flush(chunk):
+        try:
+            rows = [row for _, row, _ in chunk]
+            # return_defaults fills in each row's new id, which the mappings need
+            db.session.bulk_insert_mappings(SalesforceIntegration, rows, return_defaults=True)
+            mapping_rows = [
+                dict(mapping, integration_id=row['id'])
+                for _, row, mappings in chunk
+                for mapping in mappings
+            ]
+            if mapping_rows:
+                db.session.execute(insert(IntegrationFieldMapping), mapping_rows)
+            db.session.commit()
+            result['imported'] += len(chunk)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Could not import integrations on lines {chunk[0][0]}-{chunk[-1][0]}: {str(e)}")
+            logger.error(traceback.format_exc())
+            for line_number, _, _ in chunk:
+                fail(line_number, f"Chunk insert failed: {str(e)}")
+
+    chunk = []
+    now = datetime.utcnow()
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            row, mapping_rows = _build_rows(json.loads(line), now)
+            chunk.append((line_number, row, mapping_rows))
+        except ValueError as e:
+            # json.JSONDecodeError is a ValueError too
+            fail(line_number, str(e))
+            continue
+
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+
+    if chunk:
+        flush(chunk)
+
+    logger.info(f"Imported {result['imported']} integrations, {result['failed']} failed")
+    return result
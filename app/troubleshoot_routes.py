@@ -7,6 +7,7 @@ import logging
 import json
 # Fix the import path to match your project structure
 from services.alchemy_service import get_alchemy_access_token
+from services.upstream import DEFAULT_TIMEOUT, breaker_states
 
 # Create a blueprint for troubleshooting routes
 troubleshoot_bp = Blueprint('troubleshoot', __name__)
@@ -44,7 +45,8 @@ def test_alchemy_auth():
             response = requests.put(
                 refresh_url, 
                 json={"refreshToken": refresh_token},
-                headers={"Content-Type": "application/json"}
+                headers={"Content-Type": "application/json"},
+                timeout=DEFAULT_TIMEOUT
             )
             
             current_app.logger.info(f"Auth response status: {response.status_code}")
@@ -133,7 +135,7 @@ def test_record_types():
         url = "https://core-production.alchemy.cloud/core/api/v2/record-templates"
         headers = {"Authorization": f"Bearer {access_token}"}
         
-        response = requests.get(url, headers=headers)
+        response = requests.get(url, headers=headers, timeout=DEFAULT_TIMEOUT)
         
         current_app.logger.info(f"Record types response status: {response.status_code}")
         
@@ -196,7 +198,8 @@ def api_health_check():
             "auth_api": {
                 "status_code": auth_response.status_code,
                 "available": auth_response.status_code < 500
-            }
+            },
+            "circuits": breaker_states()
         })
     except Exception as e:
         return jsonify({
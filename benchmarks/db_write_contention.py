@@ -0,0 +1,143 @@
+"""
+Write-contention benchmark for sync job state
+
+Starts several processes, like gunicorn or sync workers, that each keep
+checkpointing their own sync_states row while a reader process lists
+integrations. Reports committed writes per second, commit latency and
+"database is locked" failures.
+
+Compare the tuned engine with SQLite's defaults:
+
+    python benchmarks/db_write_contention.py
+    python benchmarks/db_write_contention.py --untuned
+
+or point it at another database:
+
+    python benchmarks/db_write_contention.py --database-url postgresql://...
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.database import configure_sqlite, engine_options
+from app.models import SalesforceIntegration, SyncState
+
+def make_engine(database_url, tuned):
+    """Build an engine the way the app does, or with driver defaults"""
+    if not tuned:
+        # pysqlite's own lock wait is 5 seconds
+        return create_engine(database_url)
+    engine = create_engine(database_url, **engine_options(database_url))
+    configure_sqlite(engine)
+    return engine
+
+def setup(database_url, tuned, integrations):
+    """Create the tables and one integration with a pull state per writer"""
+    engine = make_engine(database_url, tuned)
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for integration_id in range(1, integrations + 1):
+            conn.execute(SalesforceIntegration.__table__.insert().values(
+                id=integration_id, alchemy_base_url='', alchemy_api_key='',
+                salesforce_username='hubspot_integration', platform='hubspot', mapping_count=0
+            ))
+            conn.execute(SyncState.__table__.insert().values(integration_id=integration_id, direction='pull'))
+    engine.dispose()
+
+def writer(database_url, tuned, integration_id, seconds, results):
+    """Checkpoint one sync state as fast as possible, one short transaction per page"""
+    engine = make_engine(database_url, tuned)
+    table = SyncState.__table__
+    latencies = []
+    locked = 0
+    page = 0
+    deadline = time.time() + seconds
+
+    while time.time() < deadline:
+        page += 1
+        started = time.time()
+        try:
+            with engine.begin() as conn:
+                conn.execute(update(table).where(table.c.integration_id == integration_id).values(
+                    cursor=str(page), last_result={'pages': page}
+                ))
+            latencies.append(time.time() - started)
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+
+    engine.dispose()
+    results.put((latencies, locked))
+
+def reader(database_url, tuned, seconds, results):
+    """List integrations and their states, like the dashboard and the scheduler"""
+    engine = make_engine(database_url, tuned)
+    reads = 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        with engine.connect() as conn:
+            conn.execute(select(SalesforceIntegration.__table__.c.id, SyncState.__table__.c.cursor).join(
+                SyncState.__table__, SyncState.__table__.c.integration_id == SalesforceIntegration.__table__.c.id
+            )).fetchall()
+        reads += 1
+    engine.dispose()
+    results.put(reads)
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', help='Database to test. Defaults to a temporary SQLite file.')
+    parser.add_argument('--writers', type=int, default=8, help='Concurrent writer processes')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Duration of the run')
+    parser.add_argument('--untuned', action='store_true', help='Use driver defaults instead of the app engine setup')
+    args = parser.parse_args()
+
+    tuned = not args.untuned
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'contention.db')}"
+    setup(database_url, tuned, args.writers)
+
+    write_results = multiprocessing.Queue()
+    read_results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=writer, args=(database_url, tuned, integration_id, args.seconds, write_results))
+        for integration_id in range(1, args.writers + 1)
+    ]
+    processes.append(multiprocessing.Process(target=reader, args=(database_url, tuned, args.seconds, read_results)))
+    for process in processes:
+        process.start()
+
+    latencies = []
+    locked = 0
+    for _ in range(args.writers):
+        worker_latencies, worker_locked = write_results.get()
+        latencies.extend(worker_latencies)
+        locked += worker_locked
+    reads = read_results.get()
+    for process in processes:
+        process.join()
+
+    print(f"Database:       {database_url} ({'tuned' if tuned else 'untuned'})")
+    print(f"Writers:        {args.writers} processes for {args.seconds:.0f}s")
+    print(f"Commits:        {len(latencies)} ({len(latencies) / args.seconds:.0f}/s)")
+    print(f"Commit latency: p50 {percentile(latencies, 0.5) * 1000:.1f}ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms, max {max(latencies, default=0) * 1000:.1f}ms")
+    print(f"Locked errors:  {locked}")
+    print(f"Reads:          {reads} ({reads / args.seconds:.0f}/s)")
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,9 @@
 from app import create_app, db
+import click
+import json
 import os
 import sys
+import time
 
 # Create application instance
 app = create_app()
@@ -15,6 +18,89 @@ def create_db():
         print(f"Error creating database: {e}")
         sys.exit(1)
 
+@app.cli.command("cleanup-sessions")
+def cleanup_sessions():
+    """Delete expired server-side sessions"""
+    from app.sessions import cleanup_expired_sessions
+    print(f"Removed {cleanup_expired_sessions()} expired sessions")
+
+@app.cli.command("migrate-integrations")
+@click.option("--chunk-size", type=int, default=500, help="Integrations per transaction")
+def migrate_integrations(chunk_size):
+    """Backfill summary columns and mapping rows, and encrypt plaintext refresh tokens"""
+    from app.migrations import upgrade_schema, backfill_integrations, encrypt_refresh_tokens
+    added = upgrade_schema(db.engine)
+    if added:
+        print(f"Added columns: {', '.join(added)}")
+    result = backfill_integrations(chunk_size)
+    result['encrypted_tokens'] = encrypt_refresh_tokens(chunk_size)
+    print(json.dumps(result, indent=2))
+    if result['failed']:
+        sys.exit(1)
+
+@app.cli.command("export-integrations")
+@click.option("--output", type=click.File("w"), default="-", help="NDJSON file to write (defaults to stdout)")
+@click.option("--platform", default=None, help="Only export this platform")
+@click.option("--chunk-size", type=int, default=500, help="Integrations read per query")
+@click.option("--include-secrets", is_flag=True, help="Export credentials too, in plaintext")
+def export_integrations(output, platform, chunk_size, include_secrets):
+    """Export integrations as NDJSON, one integration per line"""
+    from app.transfer import iter_export_lines
+    for line in iter_export_lines(platform=platform, chunk_size=chunk_size, include_secrets=include_secrets):
+        output.write(line)
+
+@app.cli.command("import-integrations")
+@click.argument("source", type=click.File("r"))
+@click.option("--chunk-size", type=int, default=500, help="Integrations per transaction")
+def import_integrations(source, chunk_size):
+    """Create integrations from an NDJSON export (use - for stdin)"""
+    from app.transfer import import_integrations as run_import
+    result = run_import(source, chunk_size)
+    print(json.dumps(result, indent=2))
+    if result['failed']:
+        sys.exit(1)
+
+@app.cli.command("reverse-sync")
+@click.option("--integration-id", type=int, default=None, help="Only sync this integration")
+def reverse_sync(integration_id):
+    """Pull HubSpot changes into Alchemy for active integrations"""
+    from services.sync_service import run_reverse_syncs
+    results = run_reverse_syncs(integration_id)
+    print(json.dumps(results, indent=2))
+
+@app.cli.command("forward-sync")
+@click.option("--integration-id", type=int, default=None, help="Only sync this integration")
+def forward_sync(integration_id):
+    """Push Alchemy changes to HubSpot for active integrations"""
+    from services.sync_service import run_forward_syncs
+    results = run_forward_syncs(integration_id)
+    print(json.dumps(results, indent=2))
+
+@app.cli.command("run-syncs")
+@click.option("--integration-id", type=int, default=None, help="Only sync this integration")
+@click.option("--workers", type=int, default=None, help="Worker threads (defaults to SYNC_WORKERS)")
+def run_syncs(integration_id, workers):
+    """Run due pulls and pushes with fair scheduling across tenants and portals"""
+    from services.sync_service import run_scheduled_syncs
+    results = run_scheduled_syncs(integration_id, workers)
+    print(json.dumps(results, indent=2))
+
+@app.cli.command("drain-webhooks")
+@click.option("--limit", type=int, default=1000, help="Maximum events per drain")
+@click.option("--loop", is_flag=True, help="Keep draining until interrupted")
+@click.option("--interval", type=float, default=2.0, help="Seconds to wait when the queue is empty")
+def drain_webhooks(limit, loop, interval):
+    """Apply queued HubSpot webhook events to Alchemy"""
+    from services.sync_service import drain_webhook_queue
+    while True:
+        results = drain_webhook_queue(limit)
+        if results:
+            print(json.dumps(results, indent=2))
+        if not loop:
+            break
+        if not results:
+            time.sleep(interval)
+
 if __name__ == '__main__':
     # Ensure database exists
     try:
@@ -1,13 +1,63 @@
-import requests
+import codecs
+import hashlib
 import logging
 import json
+import re
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from services.upstream import UpstreamError, CircuitOpenError, DeadlineExceeded, upstream_request
+from services.metadata_cache import MetadataCache
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
-def get_alchemy_access_token(refresh_token, tenant_id):
-    """Get access token from refresh token using the working method from scanner app"""
+# Bytes read from the socket per step when streaming filter-records
+STREAM_CHUNK_SIZE = 64 * 1024
+_RECORDS_ARRAY = re.compile(r'"records"\s*:\s*\[')
+_WHITESPACE = re.compile(r'[\s,]*')
+
+# Concurrent write calls allowed per Alchemy tenant, shared by every writer in the process
+DEFAULT_WRITE_CONCURRENCY = 4
+_tenant_write_slots = {}
+_tenant_write_slots_lock = threading.Lock()
+
+# Record types and fields per tenant and refresh token. Entries older than
+# METADATA_CACHE_TTL are still served while a background refresh runs.
+METADATA_CACHE_TTL = 600
+record_type_cache = MetadataCache('alchemy_record_types', METADATA_CACHE_TTL)
+field_cache = MetadataCache('alchemy_fields', METADATA_CACHE_TTL)
+
+def metadata_cache_key(tenant_id, refresh_token, *parts):
+    """Key metadata cache entries by a hash of the refresh token so tokens are not kept in memory"""
+    token_hash = hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()
+    return (tenant_id, token_hash) + parts
+
+def is_fallback_fields(fields):
+    """Check whether fetch_alchemy_fields returned its fallback list"""
+    return len(fields) == 4 and fields[0]['identifier'] == 'Name' and fields[1]['identifier'] == 'Description'
+
+def refresh_record_types(refresh_token, tenant_id):
+    """Fetch record types for a background cache refresh, or None on failure"""
+    access_token = get_alchemy_access_token(refresh_token, tenant_id)
+    if not access_token:
+        return None
+    return get_alchemy_record_types(access_token, tenant_id) or None
+
+def refresh_fields(tenant_id, refresh_token, record_type):
+    """Fetch fields for a background cache refresh, or None if only the fallback came back"""
+    fields = fetch_alchemy_fields(tenant_id, refresh_token, record_type)
+    return None if is_fallback_fields(fields) else fields
+
+def get_alchemy_access_token(refresh_token, tenant_id, deadline=None):
+    """
+    Get access token from refresh token using the working method from scanner app
+    
+    Args:
+        refresh_token (str): Alchemy refresh token
+        tenant_id (str): Tenant to get the token for
+        deadline (Deadline, optional): Request budget for the call. Defaults to None.
+    """
     # Use the working API endpoint
     refresh_url = "https://core-production.alchemy.cloud/core/api/v2/refresh-token"
     
@@ -17,8 +67,8 @@ def get_alchemy_access_token(refresh_token, tenant_id):
     
     try:
         # Use PUT with JSON payload
-        response = requests.put(
-            refresh_url, 
+        response = upstream_request(
+            'PUT', refresh_url, deadline=deadline, tenant=tenant_id,
             json={"refreshToken": refresh_token},
             headers={"Content-Type": "application/json"}
         )
@@ -60,13 +110,16 @@ def get_alchemy_access_token(refresh_token, tenant_id):
             except:
                 logger.error(f"Token error response: {response.text}")
             return None
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        logger.warning(f"Skipping token refresh for tenant {tenant_id}: {str(e)}")
+        return None
     except Exception as e:
         logger.error(f"Exception getting access token: {str(e)}")
         logger.error(traceback.format_exc())
         return None
 
-def get_alchemy_record_types(access_token, tenant_id):
-    """Get record types with detailed logging"""
+def get_alchemy_record_types(access_token, tenant_id, deadline=None):
+    """Get record types with detailed logging, within the request deadline if one is given"""
     headers = {
         "Authorization": f"Bearer {access_token}"
     }
@@ -75,7 +128,7 @@ def get_alchemy_record_types(access_token, tenant_id):
     logger.info(f"Fetching record types from {url}")
     
     try:
-        response = requests.get(url, headers=headers)
+        response = upstream_request('GET', url, headers=headers, deadline=deadline, hedge=True, tenant=tenant_id)
         logger.info(f"Record types response status: {response.status_code}")
         
         if response.status_code == 200:
@@ -91,13 +144,30 @@ def get_alchemy_record_types(access_token, tenant_id):
             except:
                 logger.error(f"Record types error response: {response.text}")
             return []
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        logger.warning(f"Skipping record types fetch for tenant {tenant_id}: {str(e)}")
+        return []
     except Exception as e:
         logger.error(f"Exception getting record types: {str(e)}")
         logger.error(traceback.format_exc())
         return []
 
-def fetch_alchemy_fields(tenant_id, refresh_token, record_type):
-    """Fetch fields for record type with improved authentication method"""
+def fetch_alchemy_fields(tenant_id, refresh_token, record_type, deadline=None):
+    """
+    Fetch fields for record type with improved authentication method
+    
+    The token refresh, record-templates and filter-records calls share the
+    deadline, and the fallback fields are returned once it runs out.
+    
+    Args:
+        tenant_id (str): Alchemy tenant
+        refresh_token (str): Alchemy refresh token
+        record_type (str): Record template identifier
+        deadline (Deadline, optional): Request budget for all calls. Defaults to None.
+        
+    Returns:
+        list: Fields with identifier and name
+    """
     logger.info(f"Starting field fetch for record type '{record_type}' in tenant '{tenant_id}'")
     
     # Fallback fields to return in case of errors
@@ -109,7 +179,7 @@ def fetch_alchemy_fields(tenant_id, refresh_token, record_type):
     ]
     
     # Get access token using the improved method
-    access_token = get_alchemy_access_token(refresh_token, tenant_id)
+    access_token = get_alchemy_access_token(refresh_token, tenant_id, deadline)
     
     if not access_token:
         logger.error(f"Failed to get access token for tenant {tenant_id}")
@@ -127,7 +197,8 @@ def fetch_alchemy_fields(tenant_id, refresh_token, record_type):
             templates_url = "https://core-production.alchemy.cloud/core/api/v2/record-templates"
             logger.info(f"Fetching templates from {templates_url}")
             
-            templates_response = requests.get(templates_url, headers=headers)
+            templates_response = upstream_request('GET', templates_url, headers=headers, deadline=deadline,
+                                                  hedge=True, tenant=tenant_id)
             
             if templates_response.status_code == 200:
                 templates_data = templates_response.json()
@@ -144,6 +215,9 @@ def fetch_alchemy_fields(tenant_id, refresh_token, record_type):
                                 for f in template_fields]
             
             logger.warning("Could not get fields from templates, trying filter-records endpoint")
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            logger.warning(f"Returning fallback fields for {record_type}: {str(e)}")
+            return fallback_fields
         except Exception as template_error:
             logger.error(f"Error getting template metadata: {str(template_error)}")
         
@@ -158,9 +232,10 @@ def fetch_alchemy_fields(tenant_id, refresh_token, record_type):
         }
         
         filter_url = "https://core-production.alchemy.cloud/core/api/v2/filter-records"
-        logger.info(f"Fetching fields from {filter_url} with payload: {json.dumps(body)}")
+        logger.debug("Fetching fields from %s with payload: %s", filter_url, body)
         
-        response = requests.put(filter_url, headers=headers, json=body)
+        response = upstream_request('PUT', filter_url, headers=headers, json=body, deadline=deadline,
+                                    tenant=tenant_id)
         
         logger.info(f"Fields response status: {response.status_code}")
         
@@ -206,7 +281,352 @@ def fetch_alchemy_fields(tenant_id, refresh_token, record_type):
         logger.warning("No fields found in API response, returning fallback fields")
         return fallback_fields
         
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        logger.warning(f"Returning fallback fields for {record_type}: {str(e)}")
+        return fallback_fields
     except Exception as e:
         logger.error(f"Exception fetching fields: {str(e)}")
         logger.error(traceback.format_exc())
         return fallback_fields
+
+def _projection_hook(field_identifiers):
+    """
+    Build a json object_hook that drops unmapped fields from each record
+
+    The hook runs as each object is decoded, so unmapped field values are
+    released as soon as their record is built instead of living as long as the page.
+    """
+    wanted = set(field_identifiers)
+
+    def hook(obj):
+        fields = obj.get("fields")
+        if isinstance(fields, list):
+            obj["fields"] = [f for f in fields if isinstance(f, dict) and f.get("identifier") in wanted]
+        field_values = obj.get("fieldValues")
+        if isinstance(field_values, dict):
+            obj["fieldValues"] = {k: v for k, v in field_values.items() if k in wanted}
+        return obj
+
+    return hook
+
+def fetch_alchemy_records(access_token, record_type, field_identifiers=None, drop=0, take=100,
+                          changed_from="2021-03-03T00:00:00Z", changed_to="2028-03-04T00:00:00Z",
+                          query_term=None, tenant_id=None):
+    """
+    Fetch one page of records through filter-records
+
+    Args:
+        access_token (str): Alchemy access token
+        record_type (str): Record template identifier
+        field_identifiers (list, optional): Only keep these fields on each record,
+            e.g. the Alchemy side of an integration's mappings. Defaults to None (all fields).
+        drop (int, optional): Records to skip. Defaults to 0.
+        take (int, optional): Page size. Defaults to 100.
+        changed_from (str, optional): Lower bound on the record last-changed time.
+        changed_to (str, optional): Upper bound on the record last-changed time.
+        query_term (str, optional): Alchemy query restricting the records,
+            e.g. "Result.Status == 'Valid'". Defaults to None (all records).
+        tenant_id (str, optional): Tenant the token belongs to, for its circuit breaker. Defaults to None.
+
+    Returns:
+        list: Records, or None if the request failed
+    """
+    try:
+        return list(iter_alchemy_records(access_token, record_type, field_identifiers, drop, take,
+                                         changed_from, changed_to, query_term, tenant_id))
+    except Exception as e:
+        logger.error(f"Exception fetching {record_type} records: {str(e)}")
+        logger.error(traceback.format_exc())
+        return None
+
+def iter_json_array(chunks, object_hook=None):
+    """
+    Decode the elements of a JSON array incrementally
+
+    Accepts either a top-level array or an object with a "records" array.
+    Only the current element and the unread part of the latest chunk are
+    held in memory, never the whole body or the whole decoded list.
+
+    Args:
+        chunks (iterable): Raw body chunks (bytes)
+        object_hook (callable, optional): Passed to the JSON decoder. Defaults to None.
+
+    Yields:
+        Decoded array elements, in order
+    """
+    decoder = json.JSONDecoder(object_hook=object_hook)
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    position = 0
+    started = False
+    exhausted = False
+
+    def read_more():
+        nonlocal buffer, position, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buffer = buffer[position:] + text_decoder.decode(b'', final=True)
+        else:
+            buffer = buffer[position:] + text_decoder.decode(chunk)
+        position = 0
+
+    while True:
+        if not started:
+            stripped = buffer.lstrip()
+            if stripped.startswith('['):
+                position = len(buffer) - len(stripped) + 1
+                started = True
+                continue
+            match = _RECORDS_ARRAY.search(buffer) if stripped.startswith('{') else None
+            if match:
+                position = match.end()
+                started = True
+                continue
+            if exhausted:
+                return
+            read_more()
+            continue
+
+        position = _WHITESPACE.match(buffer, position).end()
+        if position < len(buffer) and buffer[position] == ']':
+            return
+
+        if position < len(buffer):
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Element continues in the next chunk
+                if exhausted:
+                    raise
+            else:
+                # A trailing number may still be growing; wait for its delimiter
+                if end < len(buffer) or exhausted or isinstance(element, (dict, list, str)):
+                    position = end
+                    yield element
+                    continue
+
+        if exhausted:
+            raise json.JSONDecodeError("Unterminated JSON array", buffer, position)
+        read_more()
+
+def iter_alchemy_records(access_token, record_type, field_identifiers=None, drop=0, take=100,
+                         changed_from="2021-03-03T00:00:00Z", changed_to="2028-03-04T00:00:00Z",
+                         query_term=None, tenant_id=None):
+    """
+    Stream one page of filter-records results, one record at a time
+
+    Same request as fetch_alchemy_records, but the body is read from the
+    socket incrementally, so peak memory is one record rather than the raw
+    page plus its decoded copy.
+
+    Yields:
+        dict: Records, projected onto field_identifiers when given
+
+    Raises:
+        UpstreamError: If the request fails
+    """
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+    url = "https://core-production.alchemy.cloud/core/api/v2/filter-records"
+    body = {
+        "recordTemplateIdentifier": record_type,
+        "drop": drop,
+        "take": take,
+        "lastChangedOnFrom": changed_from,
+        "lastChangedOnTo": changed_to
+    }
+    if query_term:
+        body["queryTerm"] = query_term
+
+    with upstream_request('PUT', url, headers=headers, json=body, stream=True, tenant=tenant_id) as response:
+        if response.status_code != 200:
+            raise UpstreamError(f"Failed to fetch {record_type} records: {response.status_code} - {response.text[:200]}",
+                                response.status_code)
+
+        hook = _projection_hook(field_identifiers) if field_identifiers else None
+        count = 0
+        for record in iter_json_array(response.iter_content(chunk_size=STREAM_CHUNK_SIZE), object_hook=hook):
+            count += 1
+            yield record
+
+    logger.info(f"Streamed {count} {record_type} records (drop={drop}, take={take})")
+
+def _alchemy_field_payload(fields):
+    """Convert {identifier: value} into the Alchemy fields/rows/values structure"""
+    return [
+        {
+            "identifier": identifier,
+            "rows": [{"row": 0, "values": [{"value": value}]}]
+        }
+        for identifier, value in fields.items()
+    ]
+
+def update_alchemy_record(access_token, record_id, fields, tenant_id=None):
+    """
+    Update several fields of one Alchemy record in a single call
+    
+    Args:
+        access_token (str): Alchemy access token
+        record_id (str): Record to update
+        fields (dict): {identifier: value}
+        tenant_id (str, optional): Tenant the token belongs to, for its circuit breaker. Defaults to None.
+    
+    Returns:
+        tuple: (bool, str) indicating success and message
+    """
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+    url = "https://core-production.alchemy.cloud/core/api/v2/update-record"
+    
+    try:
+        response = upstream_request('PUT', url, headers=headers, tenant=tenant_id, json={
+            "recordId": record_id,
+            "fields": _alchemy_field_payload(fields)
+        })
+        
+        if response.status_code == 200:
+            return True, "Record updated"
+        
+        logger.error(f"Update record {record_id} failed: {response.status_code} - {response.text[:200]}")
+        return False, f"Update failed: {response.status_code}"
+    except Exception as e:
+        logger.error(f"Exception updating record {record_id}: {str(e)}")
+        return False, f"Error: {str(e)}"
+
+def create_alchemy_record(access_token, record_type, fields, tenant_id=None):
+    """
+    Create an Alchemy record of the given template
+    
+    Args:
+        access_token (str): Alchemy access token
+        record_type (str): Record template
+        fields (dict): {identifier: value}
+        tenant_id (str, optional): Tenant the token belongs to, for its circuit breaker. Defaults to None.
+    
+    Returns:
+        tuple: (record id or None, str message)
+    """
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+    url = "https://core-production.alchemy.cloud/core/api/v2/create-record"
+    
+    try:
+        response = upstream_request('POST', url, headers=headers, tenant=tenant_id, json={
+            "templateIdentifier": record_type,
+            "fields": _alchemy_field_payload(fields)
+        })
+        
+        if response.status_code in (200, 201):
+            record_id = response.json().get("id")
+            return (str(record_id) if record_id is not None else None), "Record created"
+        
+        logger.error(f"Create {record_type} record failed: {response.status_code} - {response.text[:200]}")
+        return None, f"Create failed: {response.status_code}"
+    except Exception as e:
+        logger.error(f"Exception creating {record_type} record: {str(e)}")
+        return None, f"Error: {str(e)}"
+
+def _tenant_write_slot(tenant_id, concurrency):
+    """Get the semaphore bounding concurrent writes to a tenant"""
+    with _tenant_write_slots_lock:
+        slot = _tenant_write_slots.get(tenant_id)
+        if slot is None:
+            slot = threading.BoundedSemaphore(max(1, int(concurrency)))
+            _tenant_write_slots[tenant_id] = slot
+        return slot
+
+class AlchemyRecordWriter:
+    """
+    Batched writer for Alchemy records
+    
+    Field updates are queued and merged per record template and record, so
+    each record costs one call however many fields changed. flush() sends
+    the calls concurrently, bounded per tenant, and returns a result per record.
+    """
+    def __init__(self, access_token, tenant_id, concurrency=DEFAULT_WRITE_CONCURRENCY):
+        self.access_token = access_token
+        self.tenant_id = tenant_id
+        self.concurrency = max(1, int(concurrency or DEFAULT_WRITE_CONCURRENCY))
+        # record_type -> record_id -> merged fields
+        self._updates = {}
+        # record_type -> [(key, fields)]
+        self._creates = {}
+    
+    def queue_update(self, record_type, record_id, fields):
+        """
+        Queue field updates for an existing record
+        
+        Args:
+            record_type (str): Record template identifier
+            record_id (str): Alchemy record ID
+            fields (dict): {field identifier: value}, merged with earlier updates
+        """
+        if fields:
+            self._updates.setdefault(record_type, {}).setdefault(str(record_id), {}).update(fields)
+    
+    def queue_create(self, record_type, fields, key=None):
+        """
+        Queue creation of a new record
+        
+        Args:
+            record_type (str): Record template identifier
+            fields (dict): {field identifier: value}
+            key (str, optional): Caller reference echoed in the result. Defaults to None.
+        """
+        if fields:
+            self._creates.setdefault(record_type, []).append((key, dict(fields)))
+    
+    def pending(self):
+        """Number of record calls queued"""
+        return (sum(len(records) for records in self._updates.values()) +
+                sum(len(records) for records in self._creates.values()))
+    
+    def _run(self, job):
+        action, record_type, record_id, key, fields = job
+        with _tenant_write_slot(self.tenant_id, self.concurrency):
+            if action == 'update':
+                success, message = update_alchemy_record(self.access_token, record_id, fields, tenant_id=self.tenant_id)
+            else:
+                record_id, message = create_alchemy_record(self.access_token, record_type, fields, tenant_id=self.tenant_id)
+                success = record_id is not None
+        return {
+            'action': action,
+            'record_type': record_type,
+            'record_id': record_id,
+            'key': key,
+            'success': success,
+            'message': message
+        }
+    
+    def flush(self):
+        """
+        Send every queued write
+        
+        Returns:
+            list: One result per record with action, record_type, record_id, key, success and message
+        """
+        jobs = []
+        for record_type, records in self._updates.items():
+            jobs.extend(('update', record_type, record_id, record_id, fields) for record_id, fields in records.items())
+        for record_type, records in self._creates.items():
+            jobs.extend(('create', record_type, None, key, fields) for key, fields in records)
+        self._updates = {}
+        self._creates = {}
+        
+        if not jobs:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(jobs))) as executor:
+            results = list(executor.map(self._run, jobs))
+        
+        failed = sum(1 for r in results if not r['success'])
+        logger.info(f"Flushed {len(results)} Alchemy writes for tenant {self.tenant_id} ({failed} failed)")
+        return results
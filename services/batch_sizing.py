@@ -0,0 +1,83 @@
+"""
+Adaptive batch sizing driven by observed upstream latency and errors
+"""
+import logging
+
+import requests
+
+from services.upstream import UpstreamError
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Statuses that mean "send less per call"
+SHRINK_STATUSES = (408, 413, 429, 502, 503, 504)
+
+
+class AdaptiveBatchSizer:
+    """
+    Additive-increase / multiplicative-decrease controller for a batch size
+
+    Grows the size a step at a time while calls stay under the latency
+    target, backs off gently when they are slow, and halves it on timeouts,
+    rate limits and payload-size errors.
+    """
+    def __init__(self, size, minimum=1, maximum=100, target_latency=2.0):
+        """
+        Args:
+            size (int): Starting size, e.g. the persisted size from the last run
+            minimum (int, optional): Smallest size. Defaults to 1.
+            maximum (int, optional): Largest size, e.g. the API's hard limit. Defaults to 100.
+            target_latency (float, optional): Seconds per call considered healthy. Defaults to 2.0.
+        """
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.size = min(self.maximum, max(self.minimum, int(size or self.minimum)))
+        self.target_latency = target_latency
+        self.observations = 0
+        self.failures = 0
+
+    def observe(self, latency, status_code=200):
+        """
+        Record the outcome of one call and adjust the size
+
+        Args:
+            latency (float): Seconds the call took
+            status_code (int, optional): HTTP status, None for a timeout. Defaults to 200.
+
+        Returns:
+            int: The new size
+        """
+        self.observations += 1
+        previous = self.size
+
+        if status_code is None or status_code in SHRINK_STATUSES or status_code >= 500:
+            self.failures += 1
+            self.size = max(self.minimum, self.size // 2)
+        elif status_code < 400:
+            if latency <= self.target_latency:
+                self.size = min(self.maximum, self.size + max(1, self.size // 10))
+            elif latency > self.target_latency * 1.5:
+                self.size = max(self.minimum, int(self.size * 0.75))
+
+        if self.size != previous:
+            logger.debug(f"Batch size {previous} -> {self.size} (latency {latency:.2f}s, status {status_code})")
+        return self.size
+
+    def observe_error(self, error, latency=0.0):
+        """
+        Record a failed call from its exception
+
+        Returns:
+            bool: True if the size shrank, so retrying with a smaller batch may help
+        """
+        if isinstance(error, UpstreamError):
+            status_code = error.status_code
+        elif isinstance(error, requests.exceptions.Timeout):
+            status_code = None
+        else:
+            return False
+
+        previous = self.size
+        self.observe(latency, status_code)
+        return self.size < previous
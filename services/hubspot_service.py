@@ -4,11 +4,61 @@ HubSpot API integration service with OAuth support
 import requests
 import logging
 import json
+import base64
+import hashlib
+import hmac
+import time
 from flask import current_app
+from services.upstream import UpstreamError, upstream_request
+from services.rate_limit import DEFAULT_MAX_WAIT, get_bucket
+from services.metadata_cache import MetadataCache
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
+# Property definitions per (portal token, object type). Properties change
+# rarely, so wizard steps and sync runs share one fetch; entries older than
+# PROPERTY_CACHE_TTL are still served while a background refresh runs.
+PROPERTY_CACHE_TTL = 600
+property_cache = MetadataCache('hubspot_properties', PROPERTY_CACHE_TTL)
+
+# Standard object types use plural names in the CRM objects API
+OBJECT_PATHS = {
+    "contact": "contacts",
+    "company": "companies",
+    "deal": "deals",
+    "ticket": "tickets",
+    "product": "products"
+}
+
+# Search API limits
+SEARCH_PAGE_SIZE = 100
+SEARCH_MAX_RESULTS = 10000
+
+# Batch read/create/update API limit
+BATCH_READ_SIZE = 100
+BATCH_WRITE_SIZE = 100
+
+# Starting limits per portal token until HubSpot's X-HubSpot-RateLimit-*
+# headers report the real ones (100 requests / 10s is the lowest tier)
+DEFAULT_RATE_LIMIT = (100, 10.0)
+# The CRM search endpoints have a separate, lower limit and send no headers
+SEARCH_RATE_LIMIT = (4, 1.0)
+MAX_RATE_LIMIT_RETRIES = 3
+# A batch write still rate limited after those retries backs off
+# exponentially (at least Retry-After) before its objects are given up
+BATCH_RATE_LIMIT_RETRIES = 4
+BATCH_RETRY_BACKOFF = 2.0
+BATCH_MAX_BACKOFF = 60.0
+
+# Portal IDs per token hash. A portal's tokens rotate, but its ID and rate
+# limits stay; failed lookups are retried after PORTAL_ID_RETRY_SECONDS
+_portal_ids = MetadataCache('hubspot_portal_ids', ttl=float('inf'), max_entries=1000)
+PORTAL_ID_RETRY_SECONDS = 300
+
+# HubSpot rejects v3 webhook signatures older than five minutes
+WEBHOOK_MAX_AGE_MS = 5 * 60 * 1000
+
 class HubSpotService:
     """
     Service for interacting with the HubSpot API
@@ -19,10 +69,150 @@ class HubSpotService:
         self.base_url = "https://api.hubapi.com"
         self.oauth_mode = oauth_mode
     
-    def validate_credentials(self):
+    def _headers(self):
+        """Build request headers with the normalized token"""
+        token = self.access_token.strip() if self.access_token else ""
+        return {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+    
+    def _token_hash(self):
+        """Identify a token without keeping the token itself"""
+        token = self.access_token.strip() if self.access_token else ""
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+    
+    def _fetch_portal_id(self):
+        """Ask HubSpot which portal the token belongs to; None if it cannot tell"""
+        try:
+            # The token goes in the Authorization header rather than the
+            # access-tokens/{token} path, which would end up in latency keys
+            response = upstream_request('GET', f"{self.base_url}/account-info/v3/details",
+                                        upstream='hubspot', headers=self._headers())
+            if response.status_code == 200:
+                portal_id = response.json().get('portalId')
+                if portal_id:
+                    return str(portal_id)
+            logger.warning(f"Could not look up the HubSpot portal of a token: {response.status_code}")
+        except (requests.exceptions.RequestException, UpstreamError, ValueError) as e:
+            logger.warning(f"Could not look up the HubSpot portal of a token: {str(e)}")
+        return None
+    
+    def portal_id(self):
+        """
+        Get the ID of the portal the token belongs to, looked up once per token
+        
+        Returns:
+            str: Portal ID, or None if the lookup failed
+        """
+        if not self.access_token:
+            return None
+        token_hash = self._token_hash()
+        portal_id, age = _portal_ids.lookup(token_hash)
+        if age is None or (portal_id is None and age >= PORTAL_ID_RETRY_SECONDS):
+            portal_id = self._fetch_portal_id()
+            _portal_ids.store(token_hash, portal_id)
+        return portal_id
+    
+    @property
+    def portal_key(self):
+        """
+        Stable key for the portal this service talks to, for shared limits and scheduling
+        
+        The portal ID, so every token of a portal (rotated OAuth tokens,
+        several integrations) shares one key; the token hash until HubSpot
+        has told us the portal.
+        """
+        portal_id = self.portal_id()
+        return f"portal-{portal_id}" if portal_id else self._token_hash()
+    
+    def _cache_key(self, object_type):
+        """Key property cache entries by a hash of the token so tokens are not kept in memory twice"""
+        return (self._token_hash(), object_type)
+    
+    def request(self, method, url, **kwargs):
+        """
+        Make a HubSpot API request through the portal's shared rate limiter
+        
+        HubSpot limits apply per app and portal, so every service instance
+        whose token belongs to the same portal shares one token bucket. Callers wait for capacity instead of failing, the
+        bucket follows the X-HubSpot-RateLimit-* response headers, and a 429
+        pauses the bucket for everyone before the call is retried. Calls also
+        pass through the HubSpot circuit breaker, and the portal's own breaker
+        for rejected credentials and rate limits, and get a default timeout.
+        
+        Args:
+            method (str): HTTP method
+            url (str): Full request URL
+            **kwargs: Passed to upstream_request; a deadline also bounds the rate limit wait
+            
+        Returns:
+            requests.Response: The final response (still 429 if retries ran out)
+            
+        Raises:
+            CircuitOpenError: If the HubSpot circuit is open
+        """
+        is_search = url.endswith('/search')
+        bucket = self._bucket(url)
+        deadline = kwargs.get('deadline')
+        
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            waited = bucket.acquire(max_wait=deadline.remaining() if deadline else DEFAULT_MAX_WAIT)
+            if waited > 1:
+                logger.info(f"Waited {waited:.1f}s for HubSpot rate limit capacity")
+            
+            response = upstream_request(method, url, upstream='hubspot', tenant=self.portal_key, **kwargs)
+            if not is_search:
+                self._update_rate_limit(bucket, response.headers)
+            
+            if response.status_code != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+                return response
+            
+            delay = self._retry_after(response, bucket.interval)
+            logger.warning(f"HubSpot rate limit hit, pausing {delay:g}s before retry {attempt + 1}")
+            bucket.pause(delay)
+        
+        return response
+    
+    def _bucket(self, url):
+        """Get the shared rate limit bucket a request URL draws from"""
+        if url.endswith('/search'):
+            return get_bucket((self.portal_key, 'search'), *SEARCH_RATE_LIMIT)
+        return get_bucket((self.portal_key, 'api'), *DEFAULT_RATE_LIMIT)
+    
+    @staticmethod
+    def _retry_after(response, default):
+        """Seconds a 429 response asks us to wait, or default if it does not say"""
+        retry_after = response.headers.get('Retry-After', '')
+        return float(retry_after) if retry_after.replace('.', '', 1).isdigit() else default
+    
+    @staticmethod
+    def _update_rate_limit(bucket, headers):
+        """Align the bucket with the limits HubSpot reports"""
+        try:
+            capacity = headers.get('X-HubSpot-RateLimit-Max')
+            interval_ms = headers.get('X-HubSpot-RateLimit-Interval-Milliseconds')
+            remaining = headers.get('X-HubSpot-RateLimit-Remaining')
+            bucket.update(
+                capacity=int(capacity) if capacity else None,
+                interval=int(interval_ms) / 1000.0 if interval_ms else None,
+                remaining=int(remaining) if remaining is not None else None
+            )
+        except (TypeError, ValueError):
+            pass
+    
+    @staticmethod
+    def modified_date_property(object_type):
+        """Contacts expose lastmodifieddate, every other object hs_lastmodifieddate"""
+        return "lastmodifieddate" if object_type == "contact" else "hs_lastmodifieddate"
+    
+    def validate_credentials(self, deadline=None):
         """
         Validate HubSpot credentials by making a simple request
         
+        Args:
+            deadline (Deadline, optional): Request budget for the call. Defaults to None.
+            
         Returns:
             tuple: (bool, str) indicating success and message
         """
@@ -60,7 +250,7 @@ class HubSpotService:
                 params = {}
             
             logger.info(f"Making validation request to: {url}")
-            response = requests.get(url, headers=headers, params=params)
+            response = self.request('GET', url, headers=headers, params=params, deadline=deadline)
             
             # Log the response status
             logger.info(f"HubSpot API response status: {response.status_code}")
@@ -119,16 +309,66 @@ class HubSpotService:
             logger.error(f"Error getting HubSpot object types: {str(e)}")
             return []
     
-    def get_fields_for_object(self, object_type):
+    def get_fields_for_object(self, object_type, use_cache=True, deadline=None):
         """
         Get available fields/properties for a given object type
         
         Args:
             object_type (str): The object type to get fields for (e.g., contact, company)
+            use_cache (bool, optional): Serve from the property cache. Defaults to True.
+            deadline (Deadline, optional): Request budget for the API call. Defaults to None.
             
         Returns:
             list: List of fields with id and name
         """
+        return self.get_fields_with_age(object_type, use_cache, deadline)[0]
+    
+    def get_fields_with_age(self, object_type, use_cache=True, deadline=None):
+        """
+        Get fields for an object type along with how old the cached copy is
+        
+        Cached properties are returned immediately, even after they expire,
+        and expired entries are refreshed in the background. When a live
+        fetch fails or runs out of time, an old cache entry is served before
+        falling back to the default field list.
+        
+        Args:
+            object_type (str): The object type to get fields for (e.g., contact, company)
+            use_cache (bool, optional): Serve from the property cache. Defaults to True.
+            deadline (Deadline, optional): Request budget for a live fetch. Defaults to None.
+            
+        Returns:
+            tuple: (fields, cache age in seconds - 0 for a live fetch, None for fallback fields)
+        """
+        key = self._cache_key(object_type)
+        if use_cache:
+            fields, age = property_cache.lookup(key, refresh=lambda: self._cacheable_fields(object_type))
+            if fields is not None:
+                logger.debug(f"Property cache hit for object type {object_type} ({age:.0f}s old)")
+                return fields, age
+        
+        fields = self._fetch_fields_for_object(object_type, deadline)
+        
+        # Only cache real API results, never fallbacks or errors
+        if fields and not getattr(fields, 'is_fallback', False):
+            property_cache.store(key, fields)
+            return fields, 0
+        
+        cached, age = property_cache.lookup(key)
+        if cached is not None:
+            logger.warning(f"Serving cached properties for object type {object_type} after a failed fetch")
+            return cached, age
+        return fields, None
+    
+    def _cacheable_fields(self, object_type):
+        """Fetch fields for a background refresh, or None if only fallbacks came back"""
+        fields = self._fetch_fields_for_object(object_type)
+        if not fields or getattr(fields, 'is_fallback', False):
+            return None
+        return fields
+    
+    def _fetch_fields_for_object(self, object_type, deadline=None):
+        """Fetch properties for an object type from the HubSpot API"""
         try:
             logger.info(f"Fetching fields for HubSpot object type: {object_type}")
             
@@ -147,7 +387,7 @@ class HubSpotService:
                 "Content-Type": "application/json"
             }
             
-            response = requests.get(url, headers=headers)
+            response = self.request('GET', url, headers=headers, deadline=deadline, hedge=True)
             
             if response.status_code != 200:
                 logger.error(f"Error fetching fields: {response.status_code} - {response.text[:100]}")
@@ -175,10 +415,223 @@ class HubSpotService:
             logger.error(f"Error getting fields for object type {object_type}: {str(e)}")
             
             # Return fallback fields for error cases based on object type
-            fallback_fields = self.get_fallback_fields(object_type)
+            fallback_fields = FallbackFields(self.get_fallback_fields(object_type))
             logger.info(f"Using {len(fallback_fields)} fallback fields for {object_type}")
             return fallback_fields
     
+    def search_modified_since(self, object_type, since_ms, properties, after=None, limit=SEARCH_PAGE_SIZE):
+        """
+        Search for objects modified at or after a point in time, oldest first
+        
+        Args:
+            object_type (str): The object type to search (e.g., contact, company)
+            since_ms (int): Lower bound on the last modified date, in epoch milliseconds
+            properties (list): Property names to return for each object
+            after (str, optional): Paging cursor from a previous page. Defaults to None.
+            limit (int, optional): Page size, at most 100. Defaults to SEARCH_PAGE_SIZE.
+            
+        Returns:
+            tuple: (list of objects, next paging cursor or None)
+        """
+        modified_property = self.modified_date_property(object_type)
+        object_path = OBJECT_PATHS.get(object_type, object_type)
+        url = f"{self.base_url}/crm/v3/objects/{object_path}/search"
+        
+        # GTE rather than GT so objects sharing the watermark millisecond are not
+        # skipped; re-applying an unchanged object is harmless
+        body = {
+            "filterGroups": [{
+                "filters": [{
+                    "propertyName": modified_property,
+                    "operator": "GTE",
+                    "value": str(int(since_ms or 0))
+                }]
+            }],
+            "sorts": [{"propertyName": modified_property, "direction": "ASCENDING"}],
+            "properties": list(dict.fromkeys(list(properties) + [modified_property])),
+            "limit": min(int(limit), SEARCH_PAGE_SIZE)
+        }
+        if after:
+            body["after"] = after
+        
+        response = self.request('POST', url, headers=self._headers(), json=body)
+        
+        if response.status_code != 200:
+            raise UpstreamError(f"HubSpot search failed: {response.status_code} - {response.text[:100]}", response.status_code)
+        
+        data = response.json()
+        next_after = data.get("paging", {}).get("next", {}).get("after")
+        return data.get("results", []), next_after
+    
+    def batch_read(self, object_type, object_ids, properties):
+        """
+        Read the current properties of several objects
+        
+        Args:
+            object_type (str): The object type to read (e.g., contact, company)
+            object_ids (list): Object IDs, any number (read in chunks of 100)
+            properties (list): Property names to return for each object
+            
+        Returns:
+            list: Objects that still exist
+        """
+        object_path = OBJECT_PATHS.get(object_type, object_type)
+        url = f"{self.base_url}/crm/v3/objects/{object_path}/batch/read"
+        modified_property = self.modified_date_property(object_type)
+        
+        results = []
+        for start in range(0, len(object_ids), BATCH_READ_SIZE):
+            chunk = object_ids[start:start + BATCH_READ_SIZE]
+            body = {
+                "inputs": [{"id": str(object_id)} for object_id in chunk],
+                "properties": list(dict.fromkeys(list(properties) + [modified_property]))
+            }
+            response = self.request('POST', url, headers=self._headers(), json=body)
+            
+            # 207 means some IDs were not found (e.g. deleted since the event)
+            if response.status_code not in (200, 207):
+                raise UpstreamError(f"HubSpot batch read failed: {response.status_code} - {response.text[:100]}", response.status_code)
+            results.extend(response.json().get("results", []))
+        
+        return results
+    
+    def batch_write(self, object_type, action, inputs, batch_size=BATCH_WRITE_SIZE, sizer=None):
+        """
+        Create or update objects through the CRM batch API
+        
+        Args:
+            object_type (str): The object type to write (e.g., contact, company)
+            action (str): 'create' or 'update'
+            inputs (list): {'properties': {...}} for create, {'id': ..., 'properties': {...}} for update;
+                creates may carry their own unique 'objectWriteTraceId'
+            batch_size (int, optional): Objects per call, at most 100. Defaults to BATCH_WRITE_SIZE.
+            sizer (AdaptiveBatchSizer, optional): Picks the size of each call from observed
+                latency and errors instead of batch_size. Defaults to None.
+        
+        A chunk that is still rate limited after request()'s own retries is
+        sent again after an exponential backoff of at least Retry-After, up to
+        BATCH_RATE_LIMIT_RETRIES times, before its objects are reported failed.
+            
+        Returns:
+            list: One result per input, in input order:
+                {'id': str or None, 'success': bool, 'message': str, 'updated_at': str or None}
+        """
+        object_path = OBJECT_PATHS.get(object_type, object_type)
+        url = f"{self.base_url}/crm/v3/objects/{object_path}/batch/{action}"
+        
+        if action == 'create':
+            # New objects have no ID yet, so each input gets a trace ID that
+            # HubSpot echoes on its result
+            inputs = [
+                item if item.get('objectWriteTraceId') else dict(item, objectWriteTraceId=str(index))
+                for index, item in enumerate(inputs)
+            ]
+        
+        results = []
+        start = 0
+        rate_limited = 0
+        while start < len(inputs):
+            size = max(1, min(int(sizer.size if sizer else batch_size), BATCH_WRITE_SIZE))
+            chunk = inputs[start:start + size]
+            started = time.time()
+            try:
+                response = self.request('POST', url, headers=self._headers(), json={"inputs": chunk})
+            except requests.exceptions.Timeout as e:
+                if sizer and sizer.observe_error(e, time.time() - started):
+                    continue
+                raise
+            
+            if sizer:
+                sizer.observe(time.time() - started, response.status_code)
+                # Retry the same objects in a smaller batch after a size error
+                if response.status_code == 413 and sizer.size < size:
+                    continue
+            if response.status_code == 429 and rate_limited < BATCH_RATE_LIMIT_RETRIES:
+                # Pausing the portal's bucket holds back every caller, this retry included
+                delay = max(self._retry_after(response, 0.0),
+                            min(BATCH_RETRY_BACKOFF * 2 ** rate_limited, BATCH_MAX_BACKOFF))
+                rate_limited += 1
+                logger.warning(f"Batch {action} still rate limited, retrying in {delay:g}s ({rate_limited}/{BATCH_RATE_LIMIT_RETRIES})")
+                self._bucket(url).pause(delay)
+                continue
+            start += len(chunk)
+            rate_limited = 0
+            
+            if response.status_code not in (200, 201, 207):
+                message = f"Batch {action} failed: {response.status_code} - {response.text[:100]}"
+                logger.error(message)
+                results.extend({'id': item.get('id'), 'success': False, 'message': message, 'updated_at': None}
+                               for item in chunk)
+                continue
+            
+            returned = response.json().get("results", [])
+            if action == 'update':
+                written = {str(r.get('id')): r for r in returned}
+                for item in chunk:
+                    result = written.get(str(item.get('id')))
+                    results.append({
+                        'id': str(item.get('id')),
+                        'success': result is not None,
+                        'message': 'updated' if result is not None else 'Not updated',
+                        'updated_at': result.get('updatedAt') if result else None
+                    })
+            else:
+                # Results are not guaranteed to follow input order; match them on the trace ID
+                created = {str(r.get('objectWriteTraceId')): r for r in returned if r.get('objectWriteTraceId') is not None}
+                for item in chunk:
+                    result = created.get(item['objectWriteTraceId'])
+                    if result is not None:
+                        results.append({'id': str(result.get('id')), 'success': True, 'message': 'created',
+                                        'updated_at': result.get('updatedAt')})
+                    else:
+                        results.append({'id': None, 'success': False, 'message': 'Not created', 'updated_at': None})
+        
+        return results
+    
+    def verify_webhook_signature(self, method, uri, body, headers):
+        """
+        Verify that a webhook request was signed with this app's client secret
+        
+        Supports v3 signatures (HMAC-SHA256 with a timestamp) and the older
+        v1/v2 SHA-256 signatures.
+        
+        Args:
+            method (str): HTTP method of the webhook request
+            uri (str): Full request URL, as HubSpot called it
+            body (bytes): Raw request body
+            headers (Mapping): Request headers
+            
+        Returns:
+            bool: True if the signature is valid
+        """
+        if not self.client_secret:
+            logger.error("Cannot verify webhook signature without a client secret")
+            return False
+        
+        secret = self.client_secret.encode('utf-8')
+        body_text = body.decode('utf-8') if isinstance(body, bytes) else (body or '')
+        
+        signature_v3 = headers.get('X-HubSpot-Signature-v3')
+        if signature_v3:
+            timestamp = headers.get('X-HubSpot-Request-Timestamp', '')
+            if not timestamp.isdigit() or abs(time.time() * 1000 - int(timestamp)) > WEBHOOK_MAX_AGE_MS:
+                logger.warning("Rejecting webhook with missing or stale timestamp")
+                return False
+            source = f"{method}{uri}{body_text}{timestamp}".encode('utf-8')
+            expected = base64.b64encode(hmac.new(secret, source, hashlib.sha256).digest()).decode('ascii')
+            return hmac.compare_digest(expected, signature_v3)
+        
+        signature = headers.get('X-HubSpot-Signature')
+        if not signature:
+            return False
+        
+        if headers.get('X-HubSpot-Signature-Version') == 'v2':
+            source = f"{self.client_secret}{method}{uri}{body_text}"
+        else:
+            source = f"{self.client_secret}{body_text}"
+        expected = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        return hmac.compare_digest(expected, signature)
+    
     def get_fallback_fields(self, object_type):
         """Get fallback fields for different object types"""
         # Common fields for all object types
@@ -243,6 +696,10 @@ class HubSpotService:
                 {"identifier": "custom_field3", "name": "Custom Field 3", "type": "string", "required": False}
             ]
 
+class FallbackFields(list):
+    """List of fallback fields, marked so it is never stored in the property cache"""
+    is_fallback = True
+
 def get_hubspot_service(access_token=None, client_secret=None, oauth_mode=False):
     """
     Factory function to create a HubSpot service instance
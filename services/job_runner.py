@@ -0,0 +1,153 @@
+"""
+Fair job runner with per-tenant and per-portal concurrency caps
+"""
+import logging
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Job priorities - every runnable incremental job starts before any backfill
+PRIORITY_INCREMENTAL = 0
+PRIORITY_BACKFILL = 1
+
+
+class Job:
+    """A unit of sync work and the upstream resources it occupies while running"""
+    __slots__ = ('name', 'resources', 'func', 'args', 'priority')
+
+    def __init__(self, name, resources, func, args=(), priority=PRIORITY_INCREMENTAL):
+        self.name = name
+        # e.g. ('alchemy:<tenant>', 'hubspot:<portal>'); the first one is the fairness queue
+        self.resources = tuple(resources)
+        self.func = func
+        self.args = tuple(args)
+        self.priority = priority
+
+
+class FairJobRunner:
+    """
+    Runs jobs on a worker pool, sharing workers fairly across tenants
+
+    Jobs queue per tenant (their first resource) and tenants are served
+    round-robin, so one tenant's backfill cannot hold every worker while
+    another tenant's incremental sync waits. A job only starts while each of
+    its resources is below its concurrency cap, and incremental jobs always
+    go before backfills.
+    """
+    def __init__(self, app=None, workers=4, caps=None, default_cap=2):
+        """
+        Args:
+            app (Flask, optional): Jobs run inside this app's context. Defaults to None.
+            workers (int, optional): Worker threads. Defaults to 4.
+            caps (dict, optional): {resource: max concurrent jobs}. Defaults to None.
+            default_cap (int, optional): Cap for resources not in caps. Defaults to 2.
+        """
+        self.app = app
+        self.workers = max(1, int(workers))
+        self.caps = dict(caps or {})
+        self.default_cap = max(1, int(default_cap))
+        # tenant -> [incremental deque, backfill deque]
+        self._queues = {}
+        # round-robin order of tenants
+        self._rotation = deque()
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name, resources, func, args=(), priority=PRIORITY_INCREMENTAL):
+        """
+        Queue a job
+
+        Args:
+            name (str): Unique job name, used as the result key
+            resources (iterable): Resource keys the job occupies, tenant first
+            func (callable): Work to run
+            args (tuple, optional): Arguments for func. Defaults to ().
+            priority (int, optional): PRIORITY_INCREMENTAL or PRIORITY_BACKFILL.
+        """
+        job = Job(name, resources, func, args, priority)
+        tenant = job.resources[0]
+        with self._lock:
+            if tenant not in self._queues:
+                self._queues[tenant] = [deque(), deque()]
+                self._rotation.append(tenant)
+            self._queues[tenant][priority].append(job)
+
+    def pending(self):
+        """Number of queued jobs"""
+        with self._lock:
+            return sum(len(q) for queues in self._queues.values() for q in queues)
+
+    def _cap(self, resource):
+        return self.caps.get(resource, self.default_cap)
+
+    def _runnable(self, job):
+        return all(self._active.get(r, 0) < self._cap(r) for r in job.resources)
+
+    def _next_job(self):
+        """Pick the next job: highest priority first, tenants round-robin, caps respected"""
+        with self._lock:
+            for priority in (PRIORITY_INCREMENTAL, PRIORITY_BACKFILL):
+                for _ in range(len(self._rotation)):
+                    tenant = self._rotation[0]
+                    self._rotation.rotate(-1)
+                    queue = self._queues[tenant][priority]
+                    # The first job whose resources are free, so a job held
+                    # back by its portal or integration cap does not block
+                    # the rest of its tenant's queue
+                    job = next((job for job in queue if self._runnable(job)), None)
+                    if job is not None:
+                        queue.remove(job)
+                        for resource in job.resources:
+                            self._active[resource] = self._active.get(resource, 0) + 1
+                        return job
+            return None
+
+    def _release(self, job):
+        with self._lock:
+            for resource in job.resources:
+                self._active[resource] -= 1
+
+    def _execute(self, job):
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    return job.func(*job.args)
+            return job.func(*job.args)
+        except Exception as e:
+            logger.error(f"Job {job.name} failed: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {'status': 'error', 'message': str(e)}
+
+    def run(self):
+        """
+        Run every queued job, including jobs submitted while running
+
+        Returns:
+            dict: {job name: job result}
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            running = {}
+            while True:
+                while len(running) < self.workers:
+                    job = self._next_job()
+                    if job is None:
+                        break
+                    running[pool.submit(self._execute, job)] = job
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    self._release(job)
+                    results[job.name] = future.result()
+
+        if self.pending():
+            logger.warning(f"{self.pending()} jobs left unscheduled - check concurrency caps")
+        return results
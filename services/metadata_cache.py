@@ -0,0 +1,108 @@
+"""
+Stale-while-revalidate cache for rarely changing upstream metadata
+"""
+import logging
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from services import metrics
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+CACHE_LOOKUPS = metrics.counter('cache_lookups_total', 'Cache lookups by result (hit, stale, miss)',
+                                ('cache', 'result'))
+
+# Background refreshes are cheap metadata calls, so a couple of threads is plenty
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='metadata-refresh')
+
+
+class MetadataCache:
+    """
+    Cache that keeps serving entries after they expire
+
+    lookup() always answers from the cache when it has an entry. Once the
+    entry is older than ttl, it also starts one background refresh for the
+    key, so the caller gets the stale entry now and the next caller gets
+    fresh data. Refresh functions return None for results that should not
+    replace the cached entry (errors, fallbacks).
+    """
+    def __init__(self, name, ttl, max_entries=1000):
+        """
+        Args:
+            name (str): Name used in log messages
+            ttl (float): Seconds an entry counts as fresh
+            max_entries (int, optional): Oldest entries are dropped beyond this. Defaults to 1000.
+        """
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def lookup(self, key, refresh=None):
+        """
+        Get a cached entry, refreshing it in the background if it has expired
+
+        Args:
+            key (hashable): Cache key
+            refresh (callable, optional): Returns a new value or None; run in the background
+                when the entry has expired. Defaults to None.
+
+        Returns:
+            tuple: (value, age in seconds), or (None, None) if nothing is cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            CACHE_LOOKUPS.inc(cache=self.name, result='miss')
+            return None, None
+
+        stored_at, value = entry
+        age = time.time() - stored_at
+        if age >= self.ttl:
+            CACHE_LOOKUPS.inc(cache=self.name, result='stale')
+            if refresh is not None:
+                self._schedule(key, refresh)
+        else:
+            CACHE_LOOKUPS.inc(cache=self.name, result='hit')
+        return value, age
+
+    def store(self, key, value):
+        """Cache a value as fresh"""
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Drop a cached entry"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _schedule(self, key, refresh):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        _refresh_pool.submit(self._refresh, key, refresh)
+
+    def _refresh(self, key, refresh):
+        try:
+            value = refresh()
+            if value is not None:
+                self.store(key, value)
+                logger.info(f"Refreshed {self.name} cache entry in the background")
+            else:
+                logger.warning(f"Background refresh of {self.name} returned nothing, keeping stale entry")
+        except Exception as e:
+            logger.error(f"Background refresh of {self.name} failed: {str(e)}")
+            logger.error(traceback.format_exc())
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
@@ -0,0 +1,312 @@
+"""
+Process-wide counters and histograms, exposed in the Prometheus text format
+
+Each process keeps its metrics in memory. With a multiprocess directory
+configured (METRICS_MULTIPROC_DIR), every process - gunicorn workers and
+CLI sync runs alike - also writes a snapshot file there every few
+seconds and on exit, and render() sums all snapshots, so a scrape of any
+one worker reports totals. Snapshots of exited processes are folded into
+one archive file, keeping counters monotonic without piling up files.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from cache hits to slow upstream pages
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Seconds between snapshot writes in multiprocess mode
+FLUSH_SECONDS = 5.0
+
+ARCHIVE_FILE = 'metrics-archive.json'
+LOCK_FILE = 'metrics.lock'
+
+_registry = {}
+_registry_lock = threading.Lock()
+_multiproc_dir = None
+_snapshot_file = None
+_flusher = None
+
+
+class Counter:
+    """Monotonic count per label combination"""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """Add amount to the count for these labels"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+
+class Histogram:
+    """Bucketed distribution of observed values per label combination"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Record one observation for these labels"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), [list(counts), total, count]] for key, (counts, total, count) in self._values.items()]
+
+
+def _register(metric):
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name, help_text, labelnames=()):
+    """Get or create the process-wide counter with this name"""
+    return _register(Counter(name, help_text, labelnames))
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Get or create the process-wide histogram with this name"""
+    return _register(Histogram(name, help_text, labelnames, buckets))
+
+
+def snapshot():
+    """
+    Get this process's metrics as a JSON-serializable dict
+
+    Returns:
+        dict: {name: {'type', 'help', 'labelnames', 'buckets', 'samples'}}
+    """
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {
+        metric.name: {
+            'type': metric.kind,
+            'help': metric.help,
+            'labelnames': list(metric.labelnames),
+            'buckets': list(getattr(metric, 'buckets', [])),
+            'samples': metric.samples()
+        }
+        for metric in metrics
+    }
+
+
+def merge(target, source):
+    """Add the samples of one snapshot into another, in place"""
+    for name, metric in source.items():
+        merged = target.setdefault(name, dict(metric, samples=[]))
+        values = {tuple(labels): value for labels, value in merged['samples']}
+        for labels, value in metric['samples']:
+            key = tuple(labels)
+            current = values.get(key)
+            if current is None:
+                values[key] = value
+            elif metric['type'] == 'histogram':
+                values[key] = [
+                    [a + b for a, b in zip(current[0], value[0])],
+                    current[1] + value[1],
+                    current[2] + value[2]
+                ]
+            else:
+                values[key] = current + value
+        merged['samples'] = [[list(key), value] for key, value in values.items()]
+    return target
+
+
+def configure(multiproc_dir):
+    """
+    Share metrics between processes through snapshot files in a directory
+
+    Args:
+        multiproc_dir (str): Directory every process can write to; empty for single-process mode
+    """
+    global _multiproc_dir
+    if not multiproc_dir or _multiproc_dir == multiproc_dir:
+        return
+
+    os.makedirs(multiproc_dir, exist_ok=True)
+    _multiproc_dir = multiproc_dir
+    _start_flusher()
+    atexit.register(flush)
+
+
+def _start_flusher():
+    global _snapshot_file, _flusher
+    _snapshot_file = os.path.join(_multiproc_dir, f"metrics-{os.getpid()}-{int(time.time() * 1000)}.json")
+    _flusher = threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True)
+    _flusher.start()
+
+
+def _after_fork():
+    """Give a forked worker (gunicorn --preload) its own empty metrics and snapshot file"""
+    with _registry_lock:
+        for metric in _registry.values():
+            metric._lock = threading.Lock()
+            metric._values = {}
+    if _multiproc_dir:
+        _start_flusher()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def flush():
+    """Write this process's snapshot file (multiprocess mode only)"""
+    if not _snapshot_file:
+        return
+    tmp_file = f"{_snapshot_file}.tmp"
+    with open(tmp_file, 'w') as handle:
+        json.dump(snapshot(), handle)
+    os.replace(tmp_file, _snapshot_file)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Could not write metrics snapshot: {str(e)}")
+            logger.error(traceback.format_exc())
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def collect():
+    """
+    Get the metrics of every process sharing the multiprocess directory, summed
+
+    Returns:
+        dict: Snapshot of all processes, or of this one in single-process mode
+    """
+    if not _multiproc_dir:
+        return snapshot()
+
+    flush()
+    with open(os.path.join(_multiproc_dir, LOCK_FILE), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = os.path.join(_multiproc_dir, ARCHIVE_FILE)
+        archive = _read(archive_path)
+        live = []
+        exited = []
+        for filename in os.listdir(_multiproc_dir):
+            if not (filename.startswith('metrics-') and filename.endswith('.json')) or filename == ARCHIVE_FILE:
+                continue
+            path = os.path.join(_multiproc_dir, filename)
+            pid = int(filename.split('-')[1])
+            (live if _pid_alive(pid) else exited).append(path)
+
+        if exited:
+            for path in exited:
+                merge(archive, _read(path))
+            tmp_file = f"{archive_path}.tmp"
+            with open(tmp_file, 'w') as handle:
+                json.dump(archive, handle)
+            os.replace(tmp_file, archive_path)
+            for path in exited:
+                os.remove(path)
+
+        total = merge({}, archive)
+        for path in live:
+            merge(total, _read(path))
+    return total
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value):
+    """Format a sample value without losing precision"""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render():
+    """
+    Render all metrics in the Prometheus text exposition format
+
+    Returns:
+        str: Exposition text
+    """
+    lines = []
+    for name, metric in sorted(collect().items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric['labelnames']
+        for labels, value in sorted(metric['samples']):
+            if metric['type'] != 'histogram':
+                lines.append(f"{name}{_labels(labelnames, labels)} {_number(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(metric['buckets'], counts):
+                cumulative += bucket_count
+                bucket_labels = _labels(labelnames, labels, 'le="%g"' % bound)
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = _labels(labelnames, labels, 'le="+Inf"')
+            lines.append(f"{name}_bucket{inf_labels} {count}")
+            lines.append(f"{name}_sum{_labels(labelnames, labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labelnames, labels)} {count}")
+    return '\n'.join(lines) + '\n'
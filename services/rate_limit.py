@@ -0,0 +1,130 @@
+"""
+Token-bucket rate limiting for upstream APIs
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from services.upstream import UpstreamError
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Longest a caller waits in the queue before giving up
+DEFAULT_MAX_WAIT = 60.0
+
+# Buckets kept; the least recently used beyond this are dropped
+MAX_BUCKETS = 1000
+
+
+class TokenBucket:
+    """
+    Token bucket shared by every caller of one rate-limited API key
+
+    Holds up to `capacity` tokens and refills continuously at
+    capacity / interval per second. acquire() blocks until a token is free
+    instead of failing, so concurrent callers queue behind the limit.
+    """
+    def __init__(self, capacity, interval):
+        """
+        Args:
+            capacity (int): Requests allowed per interval
+            interval (float): Interval length in seconds
+        """
+        self.capacity = float(capacity)
+        self.interval = float(interval)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        rate = self.capacity / self.interval
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+    def acquire(self, max_wait=DEFAULT_MAX_WAIT):
+        """
+        Take one token, waiting for it if necessary
+
+        Args:
+            max_wait (float, optional): Seconds to wait before giving up. Defaults to DEFAULT_MAX_WAIT.
+
+        Returns:
+            float: Seconds spent waiting
+
+        Raises:
+            UpstreamError: With status 429 if no token frees up within max_wait
+        """
+        started = time.monotonic()
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - started
+                rate = self.capacity / self.interval
+                wait = max(self.blocked_until - now, (1 - self.tokens) / rate)
+
+            if now + wait - started > max_wait:
+                raise UpstreamError(f"Rate limit wait exceeded {max_wait:.0f}s", 429)
+            time.sleep(wait)
+
+    def update(self, capacity=None, interval=None, remaining=None):
+        """
+        Adjust the bucket to limits reported by the API
+
+        Args:
+            capacity (int, optional): Requests allowed per interval
+            interval (float, optional): Interval length in seconds
+            remaining (int, optional): Requests the API says are left in the current interval
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            if capacity and interval and (capacity != self.capacity or interval != self.interval):
+                logger.info(f"Rate limit updated to {capacity} requests per {interval:g}s")
+                self.capacity = float(capacity)
+                self.interval = float(interval)
+                self.tokens = min(self.tokens, self.capacity)
+            if remaining is not None:
+                # Other processes may be spending the same allowance
+                self.tokens = min(self.tokens, float(remaining))
+
+    def pause(self, seconds):
+        """Stop handing out tokens for a while, e.g. after a 429"""
+        with self.lock:
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+            self.blocked_until = max(self.blocked_until, self.updated + seconds)
+
+
+_buckets = OrderedDict()
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(key, capacity, interval):
+    """
+    Get the shared bucket for a key, creating it with the given limits
+
+    Args:
+        key (hashable): What the limit applies to, e.g. (portal, 'search')
+        capacity (int): Requests per interval for a new bucket
+        interval (float): Interval length in seconds for a new bucket
+
+    Returns:
+        TokenBucket: The bucket every caller with this key shares
+    """
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(capacity, interval)
+            _buckets[key] = bucket
+            # Keys come and go with tenants and portals; a dropped bucket is
+            # one nobody has used for a long while, and starts full again
+            while len(_buckets) > MAX_BUCKETS:
+                _buckets.popitem(last=False)
+        else:
+            _buckets.move_to_end(key)
+        return bucket
@@ -0,0 +1,108 @@
+"""
+Compact in-flight representation of records moving through a sync batch
+"""
+
+# Marks a field the source record did not carry, as opposed to an explicit null
+MISSING = object()
+
+
+def alchemy_field_value(record, identifier, default=MISSING):
+    """
+    Extract the first value of a field from an Alchemy record
+
+    Handles both response shapes: 'fields' entries with rows/values, and a
+    flat 'fieldValues' mapping.
+    """
+    field_values = record.get('fieldValues')
+    if isinstance(field_values, dict):
+        return field_values.get(identifier, default)
+
+    for field in record.get('fields') or ():
+        if field.get('identifier') != identifier:
+            continue
+        if 'value' in field:
+            return field['value']
+        for row in field.get('rows') or ():
+            for value in row.get('values') or ():
+                return value.get('value')
+        return None
+
+    return default
+
+
+class RecordBatch:
+    """
+    Column-oriented batch of records restricted to an integration's mapped fields
+
+    Each mapped field is one list, aligned with the record ID list, instead
+    of one nested dict per record cloned from the API JSON. A record costs
+    one slot per mapped field, and a batch is a handful of large lists that
+    the garbage collector tracks as a few objects.
+    """
+    __slots__ = ('fields', 'ids', 'modified', 'columns', '_positions')
+
+    def __init__(self, fields):
+        """
+        Args:
+            fields (iterable): Field names, in the mapping's order
+        """
+        self.fields = tuple(fields)
+        self._positions = {field: i for i, field in enumerate(self.fields)}
+        self.ids = []
+        self.modified = []
+        self.columns = tuple([] for _ in self.fields)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, record_id, values, modified=None):
+        """
+        Add a record
+
+        Args:
+            record_id (str): Source record ID
+            values (Mapping): {field: value}; unmapped keys are ignored
+            modified (optional): Source last-modified marker, kept for watermarks
+        """
+        self.ids.append(str(record_id))
+        self.modified.append(modified)
+        for field, column in zip(self.fields, self.columns):
+            column.append(values.get(field, MISSING))
+
+    def append_alchemy_record(self, record):
+        """Add an Alchemy API record, keeping only the batch fields"""
+        self.ids.append(str(record.get('id', record.get('recordId'))))
+        self.modified.append(record.get('lastChangedOn'))
+        for field, column in zip(self.fields, self.columns):
+            column.append(alchemy_field_value(record, field))
+
+    def column(self, field):
+        """Get the values of one field, aligned with ids"""
+        return self.columns[self._positions[field]]
+
+    def iter_mapped(self, field_map):
+        """
+        Transform records into target-system field dicts, one at a time
+
+        Args:
+            field_map (dict): {batch field: target field}
+
+        Yields:
+            tuple: (record_id, {target field: value}) without fields the source did not carry
+        """
+        targets = [(field_map.get(field), column) for field, column in zip(self.fields, self.columns)]
+        targets = [(target, column) for target, column in targets if target]
+        for index, record_id in enumerate(self.ids):
+            values = {}
+            for target, column in targets:
+                value = column[index]
+                if value is not MISSING:
+                    values[target] = value
+            yield record_id, values
+
+    def clear(self):
+        """Empty the batch so its lists can be reused for the next page"""
+        del self.ids[:]
+        del self.modified[:]
+        for column in self.columns:
+            del column[:]
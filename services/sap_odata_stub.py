@@ -0,0 +1,271 @@
+"""
+Local stand-in SAP OData server
+
+Serves a small $metadata document and accepts $batch changesets so the SAP
+connector can be exercised without an SAP system.
+
+Usage:
+    python -m services.sap_odata_stub --port 8765
+
+Then point an SAP integration's base_url at http://localhost:8765/sap/opu/odata/sap/ZLIMS_SRV
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+import argparse
+import base64
+import json
+import threading
+import uuid
+
+SERVICE_ROOT = '/sap/opu/odata/sap/ZLIMS_SRV'
+
+METADATA = """<?xml version="1.0" encoding="utf-8"?>
+<edmx:Edmx Version="1.0" xmlns:edmx="http://schemas.microsoft.com/ado/2007/06/edmx">
+  <edmx:DataServices m:DataServiceVersion="2.0" xmlns:m="http://schemas.microsoft.com/ado/2007/08/dataservices/metadata">
+    <Schema Namespace="ZLIMS_SRV" xmlns="http://schemas.microsoft.com/ado/2008/09/edm">
+      <EntityType Name="Result">
+        <Key><PropertyRef Name="ResultId"/></Key>
+        <Property Name="ResultId" Type="Edm.String" Nullable="false"/>
+        <Property Name="SampleId" Type="Edm.String"/>
+        <Property Name="Material" Type="Edm.String"/>
+        <Property Name="Value" Type="Edm.Decimal"/>
+        <Property Name="Unit" Type="Edm.String"/>
+        <Property Name="Status" Type="Edm.String"/>
+      </EntityType>
+      <EntityContainer Name="ZLIMS_SRV_Entities" m:IsDefaultEntityContainer="true">
+        <EntitySet Name="Results" EntityType="ZLIMS_SRV.Result"/>
+      </EntityContainer>
+    </Schema>
+  </edmx:DataServices>
+</edmx:Edmx>
+"""
+
+CSRF_TOKEN = 'stub-csrf-token'
+
+
+class StubState:
+    """In-memory entity store and request counters shared by the handler threads"""
+    def __init__(self, credentials=None):
+        """
+        Args:
+            credentials (tuple, optional): (user, password) required as basic auth. Defaults to None (no auth).
+        """
+        self.lock = threading.Lock()
+        self.credentials = credentials
+        self.entities = {}
+        self.request_counts = {'metadata': 0, 'batch': 0}
+
+
+def _split_parts(body, boundary):
+    """Split a multipart body into its parts, without the boundary lines"""
+    parts = []
+    for part in body.split(f"--{boundary}")[1:]:
+        if part.startswith('--'):
+            break
+        parts.append(part.strip('\r\n'))
+    return parts
+
+
+def _boundary(content_type):
+    for item in content_type.split(';'):
+        item = item.strip()
+        if item.startswith('boundary='):
+            return item[len('boundary='):].strip('"')
+    return None
+
+
+def _parse_request(part):
+    """Parse an application/http part into (method, entity key or None, JSON record or None)"""
+    _, _, http = part.partition('\r\n\r\n')
+    head, _, payload = http.partition('\r\n\r\n')
+    method, target = head.split('\r\n', 1)[0].split()[:2]
+    target = target.split('?', 1)[0]
+    key = None
+    if target.endswith(')') and '(' in target:
+        literal = unquote(target[target.index('(') + 1:-1])
+        key = literal[1:-1].replace("''", "'") if literal.startswith("'") else literal
+    payload = payload.strip()
+    return method, key, json.loads(payload) if payload else None
+
+
+class ODataStubHandler(BaseHTTPRequestHandler):
+    """Request handler for the stand-in OData service"""
+
+    def log_message(self, format, *args):
+        # Keep test output quiet
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def _send(self, status, body=b'', content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        if self.state.credentials is None:
+            return True
+        expected = base64.b64encode(':'.join(self.state.credentials).encode('utf-8')).decode('ascii')
+        if self.headers.get('Authorization') == f"Basic {expected}":
+            return True
+        self._send(401, b'{"error": "unauthorized"}', headers={'WWW-Authenticate': 'Basic realm="SAP"'})
+        return False
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        path = self.path.split('?', 1)[0].rstrip('/')
+        csrf = {'X-CSRF-Token': CSRF_TOKEN} if self.headers.get('X-CSRF-Token', '').lower() == 'fetch' else {}
+
+        if path == f"{SERVICE_ROOT}/$metadata":
+            with self.state.lock:
+                self.state.request_counts['metadata'] += 1
+            self._send(200, METADATA.encode('utf-8'), 'application/xml', csrf)
+        elif path == SERVICE_ROOT:
+            self._send(200, json.dumps({'d': {'EntitySets': ['Results']}}).encode('utf-8'), headers=csrf)
+        else:
+            self._send(404, b'{"error": "not found"}')
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        path = self.path.split('?', 1)[0]
+        if path != f"{SERVICE_ROOT}/$batch":
+            self._send(404, b'{"error": "not found"}')
+            return
+
+        if self.headers.get('X-CSRF-Token') != CSRF_TOKEN:
+            self._send(403, b'CSRF token validation failed', 'text/plain', {'X-CSRF-Token': 'Required'})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        boundary = _boundary(self.headers.get('Content-Type', ''))
+        if not boundary:
+            self._send(400, b'{"error": "missing boundary"}')
+            return
+
+        with self.state.lock:
+            self.state.request_counts['batch'] += 1
+            # Each top-level part is a GET or a changeset, answered in order
+            answers = []
+            for part in _split_parts(body, boundary):
+                changeset = _boundary(part.split('\r\n', 1)[0])
+                if changeset:
+                    answers.append(self._apply_changeset(_split_parts(part.partition('\r\n\r\n')[2], changeset)))
+                else:
+                    answers.append(self._read(part))
+
+        boundary = f"batchresponse_{uuid.uuid4().hex}"
+        parts = []
+        for answer in answers:
+            parts.append(f"--{boundary}")
+            if isinstance(answer, list):
+                changeset = f"changesetresponse_{uuid.uuid4().hex}"
+                parts.extend([f"Content-Type: multipart/mixed; boundary={changeset}", ""])
+                for response in answer:
+                    parts.append(f"--{changeset}")
+                    parts.extend(self._http_part(*response))
+                parts.extend([f"--{changeset}--", ""])
+            else:
+                parts.extend(self._http_part(*answer))
+        parts.extend([f"--{boundary}--", ""])
+        self._send(202, "\r\n".join(parts).encode('utf-8'), f"multipart/mixed; boundary={boundary}")
+
+    @staticmethod
+    def _http_part(status, reason, payload):
+        return [
+            "Content-Type: application/http",
+            "Content-Transfer-Encoding: binary",
+            "",
+            f"HTTP/1.1 {status} {reason}",
+            "Content-Type: application/json",
+            "",
+            payload,
+            ""
+        ]
+
+    def _read(self, part):
+        """Answer a GET of a single entity"""
+        method, key, _ = _parse_request(part)
+        if method != 'GET':
+            return 400, 'Bad Request', json.dumps({'error': {'message': 'Only GET is allowed outside a changeset'}})
+        if key not in self.state.entities:
+            return 404, 'Not Found', json.dumps({'error': {'message': 'Resource not found'}})
+        return 200, 'OK', json.dumps({'d': {'ResultId': key}})
+
+    def _apply_changeset(self, parts):
+        """
+        Apply every operation of a changeset atomically
+
+        Like SAP, a failed changeset is answered with one error response
+        (a tuple) instead of a list of responses.
+        """
+        operations = []
+        for part in parts:
+            try:
+                operations.append(_parse_request(part))
+            except ValueError:
+                return 400, 'Bad Request', json.dumps({'error': {'message': 'Invalid JSON payload'}})
+
+        # Validate everything before applying anything
+        known = set(self.state.entities)
+        for method, key, record in operations:
+            if method == 'POST':
+                if not (record or {}).get('ResultId'):
+                    return 400, 'Bad Request', json.dumps({'error': {'message': 'ResultId is required'}})
+                if record['ResultId'] in known:
+                    return 400, 'Bad Request', json.dumps({'error': {'message': 'Entity already exists'}})
+                known.add(record['ResultId'])
+            elif key not in known:
+                return 404, 'Not Found', json.dumps({'error': {'message': 'Resource not found'}})
+
+        responses = []
+        for method, key, record in operations:
+            if method == 'POST':
+                self.state.entities[record['ResultId']] = dict(record)
+                responses.append((201, 'Created', json.dumps({'d': record})))
+            else:
+                self.state.entities[key].update(record)
+                responses.append((204, 'No Content', ''))
+        return responses
+
+
+def start_stub_server(host='127.0.0.1', port=0, credentials=None):
+    """
+    Start the stand-in server in a background thread
+
+    Args:
+        host (str, optional): Interface to bind. Defaults to 127.0.0.1.
+        port (int, optional): Port to bind, 0 picks a free one. Defaults to 0.
+        credentials (tuple, optional): (user, password) to require as basic auth. Defaults to None.
+
+    Returns:
+        tuple: (server, base_url) - call server.shutdown() when done
+    """
+    server = ThreadingHTTPServer((host, port), ODataStubHandler)
+    server.state = StubState(credentials)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://{host}:{server.server_address[1]}{SERVICE_ROOT}"
+    return server, base_url
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a stand-in SAP OData service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--user', help='Require basic auth with this user')
+    parser.add_argument('--password', default='', help='Password for --user')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), ODataStubHandler)
+    server.state = StubState((args.user, args.password) if args.user else None)
+    print(f"SAP OData stub listening on http://{args.host}:{args.port}{SERVICE_ROOT}")
+    server.serve_forever()
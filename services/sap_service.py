@@ -0,0 +1,562 @@
+"""
+SAP OData service with cached $metadata and $batch changeset writes
+"""
+import requests
+from requests.adapters import HTTPAdapter
+import hashlib
+import logging
+import json
+import math
+import threading
+import uuid
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from urllib.parse import quote
+from services.upstream import upstream_request
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Parsed $metadata documents, keyed like the sessions. Metadata only changes
+# when the SAP service is redeployed, so it is fetched once per process and
+# credential set.
+_metadata_cache = {}
+_metadata_lock = threading.Lock()
+
+# Pooled HTTP sessions, keyed by (base_url, client_id, secret hash), least
+# recently used first
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_POOL_SIZE = 10
+MAX_SESSIONS = 100
+
+# Key literal formats per EDM type (OData V2 URI conventions)
+NUMERIC_SUFFIXES = {
+    'Edm.Byte': '', 'Edm.SByte': '', 'Edm.Int16': '', 'Edm.Int32': '',
+    'Edm.Int64': 'L', 'Edm.Decimal': 'M', 'Edm.Double': 'd', 'Edm.Single': 'f'
+}
+INTEGER_TYPES = ('Edm.Byte', 'Edm.SByte', 'Edm.Int16', 'Edm.Int32', 'Edm.Int64')
+PREFIXED_TYPES = {
+    'Edm.Guid': 'guid', 'Edm.DateTime': 'datetime', 'Edm.DateTimeOffset': 'datetimeoffset',
+    'Edm.Time': 'time', 'Edm.Binary': 'binary'
+}
+
+
+def _session_key(base_url, client_id, client_secret):
+    """Cache key for a service and credential set; the secret is only kept as a hash"""
+    secret_hash = hashlib.sha256((client_secret or '').encode('utf-8')).hexdigest()
+    return (base_url, client_id, secret_hash)
+
+
+def _get_session(base_url, client_id, client_secret, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Get (or create) a pooled session for an SAP service
+
+    The session keeps connections alive between $batch calls and carries the
+    cookies SAP ties to the CSRF token. A changed secret gets a new session;
+    the old secret's session stays until SAP rejects it (see _drop_session)
+    or it becomes the least recently used of MAX_SESSIONS, so one caller with
+    a wrong secret cannot throw away everyone else's session.
+    """
+    key = _session_key(base_url, client_id, client_secret)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if client_id:
+                session.auth = (client_id, client_secret or '')
+            _sessions[key] = session
+            while len(_sessions) > MAX_SESSIONS:
+                old_key, old_session = _sessions.popitem(last=False)
+                old_session.close()
+                _metadata_cache.pop(old_key, None)
+        else:
+            _sessions.move_to_end(key)
+        return session
+
+
+def _drop_session(key):
+    """Close and forget the session and metadata of a credential set SAP rejected"""
+    with _sessions_lock:
+        session = _sessions.pop(key, None)
+        _metadata_cache.pop(key, None)
+    if session is not None:
+        session.close()
+
+
+def format_key_literal(value, edm_type):
+    """
+    Format a key value as an OData V2 URI literal for its EDM type
+
+    Args:
+        value: Key value from the record
+        edm_type (str): Property type from $metadata, e.g. 'Edm.String' or 'Edm.Int32'
+
+    Returns:
+        str: Literal such as 'O''Brien', 42, 42L or guid'...'
+    """
+    if edm_type in NUMERIC_SUFFIXES:
+        if isinstance(value, bool):
+            raise ValueError(f"Invalid {edm_type} key value: {value!r}")
+        if edm_type in INTEGER_TYPES:
+            text = str(int(value))
+        else:
+            # Keep the caller's digits (decimals), but only ever a finite number
+            text = str(value).strip()
+            if not math.isfinite(float(text)):
+                raise ValueError(f"Invalid {edm_type} key value: {value!r}")
+        return f"{text}{NUMERIC_SUFFIXES[edm_type]}"
+    if edm_type == 'Edm.Boolean':
+        if isinstance(value, str):
+            return 'true' if value.strip().lower() in ('true', '1') else 'false'
+        return 'true' if value else 'false'
+    text = str(value).replace("'", "''")
+    prefix = PREFIXED_TYPES.get(edm_type, '')
+    return f"{prefix}'{text}'"
+
+
+def format_key_predicate(entity_type, record):
+    """
+    Build the URL-encoded key predicate of a record, e.g. ('A%2F1') or (Order=1L,Item=10)
+
+    Args:
+        entity_type (dict): Parsed entity type with keys and properties
+        record (dict): Record holding every key property
+
+    Returns:
+        str: Key predicate including the parentheses
+    """
+    types = {prop['name']: prop['type'] for prop in entity_type['properties']}
+    keys = entity_type['keys']
+    literals = [quote(format_key_literal(record[k], types.get(k, 'Edm.String')), safe="'")
+                for k in keys]
+    if len(keys) == 1:
+        return f"({literals[0]})"
+    return "(" + ",".join(f"{k}={literal}" for k, literal in zip(keys, literals)) + ")"
+
+
+def parse_metadata(xml_text):
+    """
+    Parse an OData EDMX $metadata document
+
+    Args:
+        xml_text (str|bytes): Raw $metadata document
+
+    Returns:
+        dict: {'entity_types': {name: {'keys': [...], 'properties': [...]}},
+               'entity_sets': {set_name: entity_type_name}}
+    """
+    root = ET.fromstring(xml_text)
+    entity_types = {}
+    entity_sets = {}
+
+    for element in root.iter():
+        tag = element.tag.rsplit('}', 1)[-1]
+
+        if tag == 'EntityType':
+            keys = []
+            properties = []
+            for child in element:
+                child_tag = child.tag.rsplit('}', 1)[-1]
+                if child_tag == 'Key':
+                    keys = [ref.get('Name') for ref in child]
+                elif child_tag == 'Property':
+                    properties.append({
+                        'name': child.get('Name'),
+                        'type': child.get('Type', 'Edm.String'),
+                        'nullable': child.get('Nullable', 'true') != 'false'
+                    })
+            entity_types[element.get('Name')] = {'keys': keys, 'properties': properties}
+
+        elif tag == 'EntitySet':
+            # EntityType is namespace-qualified, e.g. "ZLIMS_SRV.Result"
+            entity_sets[element.get('Name')] = element.get('EntityType', '').rsplit('.', 1)[-1]
+
+    return {'entity_types': entity_types, 'entity_sets': entity_sets}
+
+
+def _build_batch_body(operations, batch_boundary, changeset_boundary):
+    """
+    Build a multipart/mixed $batch body holding a single changeset
+
+    Args:
+        operations (list): (method, path, record) per request, e.g. ('MERGE', "Results('A1')", {...})
+        batch_boundary (str): Boundary of the $batch body
+        changeset_boundary (str): Boundary of the changeset
+    """
+    lines = [
+        f"--{batch_boundary}",
+        f"Content-Type: multipart/mixed; boundary={changeset_boundary}",
+        ""
+    ]
+
+    for index, (method, path, record) in enumerate(operations):
+        lines.extend([
+            f"--{changeset_boundary}",
+            "Content-Type: application/http",
+            "Content-Transfer-Encoding: binary",
+            f"Content-ID: {index + 1}",
+            "",
+            f"{method} {path} HTTP/1.1",
+            "Content-Type: application/json",
+            "Accept: application/json",
+            "",
+            json.dumps(record),
+            ""
+        ])
+
+    lines.extend([
+        f"--{changeset_boundary}--",
+        "",
+        f"--{batch_boundary}--",
+        ""
+    ])
+    return "\r\n".join(lines)
+
+
+def _build_read_batch_body(paths, batch_boundary):
+    """Build a multipart/mixed $batch body of GET requests, which must sit outside changesets"""
+    lines = []
+    for path in paths:
+        lines.extend([
+            f"--{batch_boundary}",
+            "Content-Type: application/http",
+            "Content-Transfer-Encoding: binary",
+            "",
+            f"GET {path} HTTP/1.1",
+            "Accept: application/json",
+            "",
+            ""
+        ])
+    lines.extend([f"--{batch_boundary}--", ""])
+    return "\r\n".join(lines)
+
+
+def parse_batch_response(content_type, body):
+    """
+    Extract the HTTP status codes and bodies from a $batch response
+
+    Args:
+        content_type (str): Content-Type header of the $batch response
+        body (str): Raw response body
+
+    Returns:
+        list: [{'status': int, 'body': str}] in response order
+    """
+    boundary = None
+    for part in content_type.split(';'):
+        part = part.strip()
+        if part.startswith('boundary='):
+            boundary = part[len('boundary='):].strip('"')
+
+    if not boundary:
+        return []
+
+    results = []
+    for part in body.split(f"--{boundary}"):
+        part = part.strip()
+        if not part or part == '--':
+            continue
+
+        headers, _, payload = part.partition("\r\n\r\n")
+        if not payload:
+            headers, _, payload = part.partition("\n\n")
+
+        if 'multipart/mixed' in headers:
+            # Changeset - recurse with its own boundary
+            nested_type = next(
+                (line.split(':', 1)[1] for line in headers.splitlines()
+                 if line.lower().startswith('content-type:')),
+                ''
+            )
+            results.extend(parse_batch_response(nested_type, payload))
+            continue
+
+        # Embedded HTTP response: status line, headers, blank line, body
+        status_line = next((line for line in payload.splitlines() if line.startswith('HTTP/')), None)
+        if not status_line:
+            continue
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            continue
+
+        _, _, inner_body = payload.partition("\r\n\r\n")
+        if not inner_body:
+            _, _, inner_body = payload.partition("\n\n")
+        results.append({'status': status, 'body': inner_body.strip()})
+
+    return results
+
+
+class SAPODataService:
+    """
+    Service for interacting with an SAP OData (V2) service
+    """
+    def __init__(self, base_url=None, client_id=None, client_secret=None,
+                 batch_size=DEFAULT_BATCH_SIZE, timeout=30):
+        self.base_url = (base_url or '').rstrip('/')
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+        self.timeout = timeout
+        self.session = _get_session(self.base_url, client_id, client_secret)
+        self.cache_key = _session_key(self.base_url, client_id, client_secret)
+        self.csrf_token = None
+
+    def _request(self, method, url, **kwargs):
+        """Make a call through the pooled session, dropping the session if SAP rejects its credentials"""
+        response = upstream_request(method, url, session=self.session, timeout=self.timeout, **kwargs)
+        if response.status_code == 401:
+            logger.warning(f"SAP rejected the credentials of {self.client_id} at {self.base_url}, dropping the session")
+            _drop_session(self.cache_key)
+        return response
+
+    def _fetch_csrf_token(self):
+        """Fetch a CSRF token, which SAP requires on every modifying request"""
+        response = self._request('GET', f"{self.base_url}/",
+                                 headers={"X-CSRF-Token": "Fetch", "Accept": "application/json"})
+        self.csrf_token = response.headers.get('X-CSRF-Token')
+        return self.csrf_token
+
+    def get_metadata(self, refresh=False):
+        """
+        Get the parsed $metadata for the service, fetching it at most once
+
+        Args:
+            refresh (bool, optional): Force a re-fetch. Defaults to False.
+
+        Returns:
+            dict: Parsed metadata (see parse_metadata)
+        """
+        if not refresh:
+            cached = _metadata_cache.get(self.cache_key)
+            if cached is not None:
+                return cached
+
+        with _metadata_lock:
+            if not refresh and self.cache_key in _metadata_cache:
+                return _metadata_cache[self.cache_key]
+
+            url = f"{self.base_url}/$metadata"
+            logger.info(f"Fetching SAP OData metadata from {url}")
+
+            # Piggyback the CSRF token fetch on the metadata call
+            response = self._request('GET', url, headers={"X-CSRF-Token": "Fetch"})
+            if response.status_code != 200:
+                raise RuntimeError(f"SAP metadata request failed: {response.status_code} - {response.text[:100]}")
+
+            if response.headers.get('X-CSRF-Token'):
+                self.csrf_token = response.headers['X-CSRF-Token']
+
+            metadata = parse_metadata(response.content)
+            _metadata_cache[self.cache_key] = metadata
+            logger.info(f"Cached SAP metadata: {len(metadata['entity_sets'])} entity sets")
+            return metadata
+
+    def validate_credentials(self):
+        """
+        Validate SAP credentials by loading the service metadata
+
+        Returns:
+            tuple: (bool, str) indicating success and message
+        """
+        try:
+            if not self.base_url:
+                return False, "No base URL provided"
+            metadata = self.get_metadata(refresh=True)
+            return True, f"Connected - {len(metadata['entity_sets'])} entity sets available"
+        except Exception as e:
+            logger.error(f"Error validating SAP credentials: {str(e)}")
+            return False, f"Error: {str(e)}"
+
+    def get_entity_sets(self):
+        """
+        Get the entity sets exposed by the service
+
+        Returns:
+            list: List of entity sets with id and name
+        """
+        metadata = self.get_metadata()
+        return [{"id": name, "name": name, "entity_type": entity_type}
+                for name, entity_type in sorted(metadata['entity_sets'].items())]
+
+    def get_fields_for_entity_set(self, entity_set):
+        """
+        Get the properties of an entity set in the standard field format
+
+        Args:
+            entity_set (str): Entity set name
+
+        Returns:
+            list: List of fields with identifier and name
+        """
+        metadata = self.get_metadata()
+        entity_type = metadata['entity_types'].get(metadata['entity_sets'].get(entity_set), {})
+        keys = entity_type.get('keys', [])
+        return [{
+            "identifier": prop['name'],
+            "name": prop['name'],
+            "type": prop['type'],
+            "required": prop['name'] in keys or not prop['nullable']
+        } for prop in entity_type.get('properties', [])]
+
+    def write_records(self, entity_set, records, batch_size=None):
+        """
+        Create or update records through $batch changesets
+
+        Each chunk of up to batch_size records first has its keys looked up in
+        one read-only $batch, then existing entities are merged and the rest
+        created (SAP answers a MERGE on a missing entity with 404). Each
+        changeset is applied atomically by SAP, so a failed changeset reports
+        the same error for every record in it.
+
+        Args:
+            entity_set (str): Target entity set
+            records (list): List of dicts keyed by SAP property name
+            batch_size (int, optional): Records per $batch request. Defaults to the service batch size.
+
+        Returns:
+            list: [{'index': int, 'status': int, 'success': bool, 'body': str}] one per record
+        """
+        batch_size = max(1, int(batch_size or self.batch_size))
+        metadata = self.get_metadata()
+        entity_type = metadata['entity_types'].get(metadata['entity_sets'].get(entity_set))
+        if entity_type is None:
+            raise ValueError(f"Unknown SAP entity set: {entity_set}")
+
+        results = []
+        for start in range(0, len(records), batch_size):
+            chunk = records[start:start + batch_size]
+            chunk_results = self._write_chunk(entity_set, entity_type, chunk)
+
+            if len(chunk_results) == len(chunk):
+                statuses = chunk_results
+            else:
+                # A failed changeset returns a single error for the whole chunk
+                failure = chunk_results[0] if chunk_results else {'status': 500, 'body': 'Empty $batch response'}
+                statuses = [failure] * len(chunk)
+
+            for offset, outcome in enumerate(statuses):
+                results.append({
+                    'index': start + offset,
+                    'status': outcome['status'],
+                    'success': 200 <= outcome['status'] < 300,
+                    'body': outcome['body']
+                })
+
+        succeeded = sum(1 for r in results if r['success'])
+        logger.info(f"Wrote {succeeded}/{len(records)} records to SAP entity set {entity_set}")
+        return results
+
+    def _write_chunk(self, entity_set, entity_type, records):
+        """Send one chunk as a changeset of MERGEs for existing entities and POSTs for new ones"""
+        key_fields = entity_type['keys']
+        predicates = []
+        for record in records:
+            if key_fields and all(record.get(k) not in (None, '') for k in key_fields):
+                try:
+                    predicates.append(format_key_predicate(entity_type, record))
+                except (TypeError, ValueError) as e:
+                    return [{'status': 400, 'body': f"Invalid key: {str(e)}"}]
+            else:
+                predicates.append(None)
+
+        keyed = [p for p in predicates if p is not None]
+        existing = self._existing_keys(entity_set, key_fields, keyed) if keyed else set()
+        if existing is None:
+            return [{'status': 502, 'body': 'Could not look up existing SAP entities'}]
+
+        operations = []
+        for record, predicate in zip(records, predicates):
+            if predicate in existing:
+                operations.append(('MERGE', f"{entity_set}{predicate}", record))
+            else:
+                operations.append(('POST', entity_set, record))
+                if predicate is not None:
+                    # A repeat of the key later in this changeset updates what the POST created
+                    existing.add(predicate)
+
+        batch_boundary = f"batch_{uuid.uuid4().hex}"
+        changeset_boundary = f"changeset_{uuid.uuid4().hex}"
+        body = _build_batch_body(operations, batch_boundary, changeset_boundary)
+        return self._send_batch(body, batch_boundary)
+
+    def _existing_keys(self, entity_set, key_fields, predicates):
+        """
+        Look up which key predicates already exist, with one read-only $batch of GETs
+
+        Returns:
+            set: Predicates SAP returned 200 for, or None if the lookup failed
+        """
+        unique = list(dict.fromkeys(predicates))
+        batch_boundary = f"batch_{uuid.uuid4().hex}"
+        # Only the keys come back, so large entities don't bloat the lookup
+        select = ','.join(key_fields)
+        paths = [f"{entity_set}{predicate}?$select={select}" for predicate in unique]
+        outcomes = self._send_batch(_build_read_batch_body(paths, batch_boundary), batch_boundary)
+        if len(outcomes) != len(unique):
+            logger.error(f"SAP key lookup returned {len(outcomes)} responses for {len(unique)} keys")
+            return None
+        existing = set()
+        for predicate, outcome in zip(unique, outcomes):
+            if outcome['status'] == 200:
+                existing.add(predicate)
+            elif outcome['status'] != 404:
+                logger.error(f"SAP key lookup failed for {entity_set}{predicate}: {outcome['status']}")
+                return None
+        return existing
+
+    def _send_batch(self, body, batch_boundary):
+        """Send one $batch request, retrying once on a stale CSRF token"""
+        for attempt in range(2):
+            if not self.csrf_token:
+                self._fetch_csrf_token()
+
+            response = self._request(
+                'POST', f"{self.base_url}/$batch",
+                data=body.encode('utf-8'),
+                headers={
+                    "Content-Type": f"multipart/mixed; boundary={batch_boundary}",
+                    "Accept": "multipart/mixed",
+                    "X-CSRF-Token": self.csrf_token or ''
+                }
+            )
+
+            if response.status_code == 403 and response.headers.get('X-CSRF-Token', '').lower() == 'required' and attempt == 0:
+                logger.info("SAP CSRF token expired, fetching a new one")
+                self.csrf_token = None
+                continue
+            break
+
+        if response.status_code != 202 and response.status_code != 200:
+            logger.error(f"SAP $batch request failed: {response.status_code} - {response.text[:200]}")
+            return [{'status': response.status_code, 'body': response.text[:500]}]
+
+        return parse_batch_response(response.headers.get('Content-Type', ''), response.text)
+
+
+def get_sap_service(base_url=None, client_id=None, client_secret=None, batch_size=None):
+    """
+    Factory function to create an SAP OData service instance
+
+    Args:
+        base_url (str, optional): OData service root URL. Defaults to None.
+        client_id (str, optional): Communication user / client ID. Defaults to None.
+        client_secret (str, optional): Communication user password / client secret. Defaults to None.
+        batch_size (int, optional): Records per $batch request. Defaults to DEFAULT_BATCH_SIZE.
+
+    Returns:
+        SAPODataService: Service instance
+    """
+    return SAPODataService(
+        base_url=base_url,
+        client_id=client_id,
+        client_secret=client_secret,
+        batch_size=batch_size or DEFAULT_BATCH_SIZE
+    )
@@ -0,0 +1,937 @@
+"""
+Synchronization runs between Alchemy and the connected platforms
+"""
+import functools
+import hashlib
+import json
+import logging
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+from app import db
+from app.credentials import stored_refresh_token
+from app.models import SalesforceIntegration, SyncState, RecordLink, WebhookEvent, BatchSize
+from flask import current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer
+from services.alchemy_service import (
+    get_alchemy_access_token,
+    iter_alchemy_records,
+    AlchemyRecordWriter
+)
+from services.hubspot_service import (
+    get_hubspot_service,
+    SEARCH_PAGE_SIZE,
+    SEARCH_MAX_RESULTS
+)
+from services.record_batch import RecordBatch
+from services.batch_sizing import AdaptiveBatchSizer
+from services.job_runner import FairJobRunner, PRIORITY_INCREMENTAL, PRIORITY_BACKFILL
+from services import metrics
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+PULL_DIRECTIONS = ('platform_to_alchemy', 'bidirectional')
+PUSH_DIRECTIONS = ('alchemy_to_platform', 'bidirectional')
+
+# Lower bound for the first push of an integration
+INITIAL_PUSH_FROM = "2021-03-03T00:00:00Z"
+
+# Webhook drain - how long a drainer owns claimed events, retry backoff
+# (doubling from WEBHOOK_RETRY_SECONDS) and attempts before dead-lettering
+WEBHOOK_LEASE_SECONDS = 300
+WEBHOOK_RETRY_SECONDS = 30
+WEBHOOK_MAX_RETRY_SECONDS = 3600
+WEBHOOK_MAX_ATTEMPTS = 8
+
+# Throughput metrics; record counts come from the run summaries
+SYNC_RUNS = metrics.counter('sync_runs_total', 'Sync runs by direction and status', ('direction', 'status'))
+SYNC_RECORDS = metrics.counter('sync_records_total', 'Records processed by sync runs', ('direction', 'outcome'))
+SYNC_DURATION = metrics.histogram('sync_run_duration_seconds', 'Sync run duration in seconds', ('direction',),
+                                  buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+RECORD_OUTCOMES = ('fetched', 'updated', 'created', 'skipped', 'failed')
+
+
+def metered(direction):
+    """Count a sync function's runs, duration and record outcomes under a direction label"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.time()
+            try:
+                summary = func(*args, **kwargs)
+            except Exception:
+                SYNC_RUNS.inc(direction=direction, status='error')
+                raise
+            finally:
+                SYNC_DURATION.observe(time.time() - started, direction=direction)
+            SYNC_RUNS.inc(direction=direction, status=summary.get('status', 'success'))
+            for outcome in RECORD_OUTCOMES:
+                if summary.get(outcome):
+                    SYNC_RECORDS.inc(summary[outcome], direction=direction, outcome=outcome)
+            return summary
+        return wrapper
+    return decorator
+
+
+def reverse_mapping(mappings):
+    """
+    Invert stored mappings for platform -> Alchemy syncs
+
+    Args:
+        mappings (list): Mappings with alchemy_field and platform_field keys
+
+    Returns:
+        dict: {platform_field: alchemy_field}
+    """
+    return {
+        m['platform_field']: m['alchemy_field']
+        for m in mappings
+        if m.get('platform_field') and m.get('alchemy_field')
+    }
+
+
+def forward_mapping(mappings):
+    """
+    Map Alchemy fields to platform fields for Alchemy -> platform syncs
+
+    Args:
+        mappings (list): Mappings with alchemy_field and platform_field keys
+
+    Returns:
+        dict: {alchemy_field: platform_field}
+    """
+    return {
+        m['alchemy_field']: m['platform_field']
+        for m in mappings
+        if m.get('platform_field') and m.get('alchemy_field')
+    }
+
+
+def mapped_alchemy_fields(mappings):
+    """
+    List the Alchemy fields an integration syncs, in mapping order
+
+    Args:
+        mappings (list): Mappings with alchemy_field and platform_field keys
+
+    Returns:
+        list: Alchemy field identifiers, for projecting filter-records responses
+    """
+    return list(dict.fromkeys(m['alchemy_field'] for m in mappings if m.get('alchemy_field')))
+
+
+def _values_hash(fields):
+    """
+    Hash record values keyed by Alchemy field, comparing values as text
+
+    Pull and push both hash in this form, so a push can tell that Alchemy
+    still holds exactly what the last pull wrote.
+    """
+    canonical = {key: None if value is None else str(value) for key, value in fields.items()}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _to_epoch_ms(value):
+    """Convert a HubSpot timestamp (ISO string or epoch milliseconds) to epoch milliseconds"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        return int(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        return int(parsed.timestamp() * 1000)
+    except ValueError:
+        return None
+
+
+def _get_sync_state(integration_id, direction):
+    """
+    Load the sync state for an integration, creating it on first use
+
+    A new state row is committed straight away. Left pending, it would be
+    flushed by the run's first query and hold the database write lock
+    through the upstream calls of the first page.
+    """
+    state = SyncState.query.filter_by(integration_id=integration_id, direction=direction).first()
+    if state is None:
+        db.session.add(SyncState(integration_id=integration_id, direction=direction))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker created it first
+            db.session.rollback()
+        state = SyncState.query.filter_by(integration_id=integration_id, direction=direction).one()
+    return state
+
+
+def load_batch_sizer(integration_id, channel):
+    """
+    Build the adaptive sizer for an integration's upstream channel, resuming from the persisted size
+
+    Args:
+        integration_id (int): Integration the sizes belong to
+        channel (str): Key of BATCH_SIZE_LIMITS, e.g. 'alchemy_fetch'
+
+    Returns:
+        AdaptiveBatchSizer: Sizer starting at the last run's size
+    """
+    limits = current_app.config['BATCH_SIZE_LIMITS'][channel]
+    stored = BatchSize.query.filter_by(integration_id=integration_id, channel=channel).first()
+    return AdaptiveBatchSizer(
+        stored.size if stored else limits['initial'],
+        minimum=limits['minimum'],
+        maximum=limits['maximum'],
+        target_latency=current_app.config.get('BATCH_TARGET_LATENCY', 2.0)
+    )
+
+
+def save_batch_sizer(integration_id, channel, sizer):
+    """Persist a sizer's current size for the next run (committed with the caller's checkpoint)"""
+    stored = BatchSize.query.filter_by(integration_id=integration_id, channel=channel).first()
+    if stored is None:
+        db.session.add(BatchSize(integration_id=integration_id, channel=channel, size=sizer.size))
+    elif stored.size != sizer.size:
+        stored.size = sizer.size
+
+
+def apply_to_alchemy(integration_id, access_token, tenant_id, record_type, batch, field_map, failed=None):
+    """
+    Write platform changes to Alchemy, updating linked records and creating the rest
+
+    Objects whose latest modification is our own push are skipped, so a
+    bidirectional integration does not pull its pushes back.
+
+    Args:
+        integration_id (int): Integration the changes belong to
+        access_token (str): Alchemy access token
+        tenant_id (str): Alchemy tenant, used to bound write concurrency
+        record_type (str): Alchemy record template
+        batch (RecordBatch): Platform records keyed by platform field
+        field_map (dict): {platform_field: alchemy_field}
+        failed (list, optional): Collects the platform IDs that could not be written. Defaults to None.
+
+    Returns:
+        dict: Counts of updated, created, skipped and failed records
+    """
+    summary = {'updated': 0, 'created': 0, 'skipped': 0, 'failed': 0}
+    if not len(batch):
+        return summary
+
+    # One query resolves every cross-reference in the batch
+    links = {
+        link.platform_record_id: link
+        for link in RecordLink.query.filter(
+            RecordLink.integration_id == integration_id,
+            RecordLink.platform_record_id.in_(batch.ids)
+        )
+    }
+
+    writer = AlchemyRecordWriter(
+        access_token,
+        tenant_id,
+        concurrency=current_app.config.get('ALCHEMY_WRITE_CONCURRENCY')
+    )
+    modified = dict(zip(batch.ids, batch.modified))
+    # Maps the writer's record keys back to platform IDs
+    platform_for_record = {}
+    hashes = {}
+    for platform_id, fields in batch.iter_mapped(field_map):
+        link = links.get(platform_id)
+        if link and link.platform_modified_at and modified.get(platform_id) \
+                and modified[platform_id] <= link.platform_modified_at:
+            summary['skipped'] += 1
+            continue
+        hashes[platform_id] = _values_hash(fields)
+        if link:
+            writer.queue_update(record_type, link.alchemy_record_id, fields)
+            platform_for_record[link.alchemy_record_id] = platform_id
+        else:
+            writer.queue_create(record_type, fields, key=platform_id)
+
+    for result in writer.flush():
+        platform_id = platform_for_record.get(result['key'], result['key'])
+        if not result['success']:
+            summary['failed'] += 1
+            if failed is not None:
+                failed.append(platform_id)
+            logger.warning(f"Integration {integration_id}: could not apply {platform_id}: {result['message']}")
+        elif result['action'] == 'update':
+            links[platform_id].pulled_hash = hashes[platform_id]
+            summary['updated'] += 1
+        else:
+            db.session.add(RecordLink(
+                integration_id=integration_id,
+                alchemy_record_id=result['record_id'],
+                platform_record_id=platform_id,
+                pulled_hash=hashes[platform_id]
+            ))
+            summary['created'] += 1
+
+    return summary
+
+
+def _integrations():
+    """
+    Query integrations without loading the configuration JSON
+
+    get_config() and get_mappings() answer from the config cache while the
+    row's updated_at is unchanged, so the blob is only loaded on a miss.
+    """
+    return SalesforceIntegration.query.options(defer(SalesforceIntegration.field_mappings))
+
+
+def _hubspot_pull_context(integration):
+    """
+    Resolve everything a HubSpot -> Alchemy run needs for an integration
+
+    Returns:
+        dict: Run context, or a run summary with a 'status' key if the run cannot proceed
+    """
+    config = integration.get_config()
+    if config.get('platform') != 'hubspot':
+        raise ValueError(f"Integration {integration.id} is not a HubSpot integration")
+
+    hs_config = config.get('hubspot', {})
+    alchemy_config = config.get('alchemy', {})
+    object_type = hs_config.get('object_type')
+    tenant_id = alchemy_config.get('tenant_id')
+
+    field_map = reverse_mapping(integration.get_mappings())
+    if not field_map:
+        return {'status': 'skipped', 'message': 'No mappings to apply'}
+
+    access_token = get_alchemy_access_token(stored_refresh_token(config), tenant_id)
+    if not access_token:
+        return {'status': 'error', 'message': f'Unable to get Alchemy access token for tenant {tenant_id}'}
+
+    service = get_hubspot_service(
+        access_token=hs_config.get('access_token'),
+        client_secret=hs_config.get('client_secret'),
+        oauth_mode=True
+    )
+
+    # Skip mapped properties that no longer exist on the portal; the property
+    # cache makes this free for warm integrations
+    known = {f['identifier'] for f in service.get_fields_for_object(object_type)}
+    properties = [p for p in field_map if p in known] if known else list(field_map)
+
+    return {
+        'service': service,
+        'object_type': object_type,
+        'tenant_id': tenant_id,
+        'record_type': alchemy_config.get('record_type'),
+        'access_token': access_token,
+        'field_map': field_map,
+        'properties': properties,
+        'modified_property': service.modified_date_property(object_type)
+    }
+
+
+@metered('pull')
+def pull_hubspot_changes(integration):
+    """
+    Pull HubSpot objects modified since the stored watermark into Alchemy
+
+    Pages through the CRM search API oldest-first and writes each page back
+    before moving on, persisting the paging cursor so an interrupted run
+    resumes where it stopped. The watermark only advances once a run
+    completes, and never past the oldest object that failed to apply, so
+    failed objects are fetched again by the next run.
+
+    Args:
+        integration (SalesforceIntegration): A HubSpot integration
+
+    Returns:
+        dict: Run summary
+    """
+    context = _hubspot_pull_context(integration)
+    if 'status' in context:
+        return context
+
+    service = context['service']
+    object_type = context['object_type']
+    properties = context['properties']
+    field_map = context['field_map']
+    modified_property = context['modified_property']
+
+    state = _get_sync_state(integration.id, 'pull')
+    since = int(state.watermark or 0)
+    after = state.cursor
+    newest = since
+    oldest_failed = None
+    summary = {'fetched': 0, 'updated': 0, 'created': 0, 'skipped': 0, 'failed': 0, 'pages': 0}
+
+    while True:
+        objects, next_after = service.search_modified_since(object_type, since, properties, after=after)
+        summary['pages'] += 1
+        summary['fetched'] += len(objects)
+
+        batch = RecordBatch(properties)
+        for obj in objects:
+            values = obj.get('properties', {})
+            modified = _to_epoch_ms(values.get(modified_property) or obj.get('updatedAt'))
+            batch.append(obj.get('id'), values, modified)
+            if modified and modified > newest:
+                newest = modified
+
+        failed = []
+        page_summary = apply_to_alchemy(integration.id, context['access_token'], context['tenant_id'],
+                                        context['record_type'], batch, field_map, failed=failed)
+        for key, count in page_summary.items():
+            summary[key] += count
+        if failed:
+            # Objects without a timestamp hold the watermark where the run started
+            modified = dict(zip(batch.ids, batch.modified))
+            page_oldest = min(modified.get(str(object_id)) or since for object_id in failed)
+            oldest_failed = page_oldest if oldest_failed is None else min(oldest_failed, page_oldest)
+
+        # Checkpoint after every page
+        after = next_after
+        state.cursor = after
+        db.session.commit()
+
+        if not after:
+            break
+        if summary['fetched'] + SEARCH_PAGE_SIZE > SEARCH_MAX_RESULTS:
+            # The search API stops paging at 10k results; the next run
+            # continues from the newest timestamp seen
+            logger.info(f"Integration {integration.id}: search result cap reached, continuing next run")
+            break
+
+    # The search is GTE, so holding at a failed object's timestamp re-fetches it
+    state.watermark = str(newest if oldest_failed is None else oldest_failed)
+    state.cursor = None
+    state.last_run_at = datetime.utcnow()
+    state.last_result = summary
+    db.session.commit()
+
+    logger.info(f"Integration {integration.id}: pulled {summary['fetched']} HubSpot changes in {summary['pages']} pages")
+    return dict(summary, status='success')
+
+
+def run_reverse_syncs(integration_id=None):
+    """
+    Run the HubSpot -> Alchemy pull for one or all active integrations
+
+    Args:
+        integration_id (int, optional): Only sync this integration. Defaults to None.
+
+    Returns:
+        dict: {integration_id: run summary}
+    """
+    query = _integrations().filter_by(is_active=True)
+    if integration_id:
+        query = query.filter_by(id=integration_id)
+
+    results = {}
+    for integration in query:
+        try:
+            config = integration.get_config()
+            if config.get('platform') != 'hubspot':
+                continue
+            if config.get('sync_config', {}).get('direction', 'bidirectional') not in PULL_DIRECTIONS:
+                continue
+            results[integration.id] = pull_hubspot_changes(integration)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Reverse sync failed for integration {integration.id}: {str(e)}")
+            logger.error(traceback.format_exc())
+            results[integration.id] = {'status': 'error', 'message': str(e)}
+
+    return results
+
+
+def _claimable_events(now):
+    """Events a drainer may take: pending, not dead-lettered, and not leased or waiting to retry"""
+    return and_(
+        WebhookEvent.processed_at.is_(None),
+        WebhookEvent.failed_at.is_(None),
+        WebhookEvent.attempts < WEBHOOK_MAX_ATTEMPTS,
+        or_(WebhookEvent.lease_until.is_(None), WebhookEvent.lease_until <= now)
+    )
+
+
+def claim_webhook_events(limit=1000):
+    """
+    Lease up to limit pending events to this drainer
+
+    The conditional UPDATE only takes rows no other drainer holds, so
+    concurrent drainers never process the same event. A lease that is not
+    released within WEBHOOK_LEASE_SECONDS (a crashed drainer) expires and
+    the events are taken again; the attempt counter already includes it.
+
+    Args:
+        limit (int, optional): Maximum number of events to take. Defaults to 1000.
+
+    Returns:
+        tuple: (lease owner token, claimed events in arrival order)
+    """
+    now = datetime.utcnow()
+
+    # Events whose last lease expired on their final attempt go to the dead letter state
+    WebhookEvent.query.filter(
+        WebhookEvent.processed_at.is_(None),
+        WebhookEvent.failed_at.is_(None),
+        WebhookEvent.attempts >= WEBHOOK_MAX_ATTEMPTS,
+        WebhookEvent.lease_until <= now
+    ).update({'failed_at': now, 'lease_owner': None}, synchronize_session=False)
+
+    candidates = [event_id for event_id, in db.session.query(WebhookEvent.id).filter(
+        _claimable_events(now)
+    ).order_by(WebhookEvent.id).limit(limit)]
+
+    owner = uuid.uuid4().hex
+    if candidates:
+        WebhookEvent.query.filter(WebhookEvent.id.in_(candidates), _claimable_events(now)).update({
+            'lease_owner': owner,
+            'lease_until': now + timedelta(seconds=WEBHOOK_LEASE_SECONDS),
+            'attempts': WebhookEvent.attempts + 1
+        }, synchronize_session=False)
+    db.session.commit()
+
+    if not candidates:
+        return owner, []
+    events = WebhookEvent.query.filter(
+        WebhookEvent.id.in_(candidates),
+        WebhookEvent.lease_owner == owner
+    ).order_by(WebhookEvent.id).all()
+    return owner, events
+
+
+def _release_events(owner, events, error=None):
+    """
+    Mark leased events processed, or schedule their retry with backoff
+
+    Only rows this drainer still owns are touched, so an event whose lease
+    expired and was taken by another drainer is left to that drainer.
+    """
+    if not events:
+        return
+    now = datetime.utcnow()
+    ids = [event.id for event in events]
+    owned = WebhookEvent.query.filter(WebhookEvent.id.in_(ids), WebhookEvent.lease_owner == owner)
+
+    if error is None:
+        owned.update({'processed_at': now, 'lease_owner': None, 'lease_until': None},
+                     synchronize_session=False)
+        return
+
+    error = str(error)[:1000]
+    for attempts in {event.attempts for event in events}:
+        group = owned.filter(WebhookEvent.attempts == attempts)
+        if attempts >= WEBHOOK_MAX_ATTEMPTS:
+            group.update({'failed_at': now, 'lease_owner': None, 'last_error': error},
+                         synchronize_session=False)
+        else:
+            delay = min(WEBHOOK_RETRY_SECONDS * 2 ** (attempts - 1), WEBHOOK_MAX_RETRY_SECONDS)
+            group.update({'lease_owner': None, 'lease_until': now + timedelta(seconds=delay), 'last_error': error},
+                         synchronize_session=False)
+
+
+def drain_webhook_queue(limit=1000):
+    """
+    Apply queued webhook events to Alchemy
+
+    Events are leased to this drainer first, so concurrent drainers split
+    the queue instead of applying events twice. They are coalesced per
+    object, so a burst of property changes on one contact becomes a single
+    batch read and a single Alchemy write. Events of an integration that
+    fails, or of objects that could not be written, are retried with
+    exponential backoff - other integrations' events are taken meanwhile -
+    and dead-lettered (failed_at) after WEBHOOK_MAX_ATTEMPTS attempts.
+
+    Args:
+        limit (int, optional): Maximum number of events to take. Defaults to 1000.
+
+    Returns:
+        dict: {integration_id: drain summary}
+    """
+    owner, events = claim_webhook_events(limit)
+    if not events:
+        return {}
+
+    # integration_id -> object_id -> events, in arrival order
+    grouped = {}
+    for event in events:
+        grouped.setdefault(event.integration_id, {}).setdefault(event.object_id, []).append(event)
+
+    results = {}
+    for integration_id, by_object in grouped.items():
+        integration_events = [e for object_events in by_object.values() for e in object_events]
+        try:
+            failed = []
+            results[integration_id] = _apply_webhook_events(integration_id, by_object, failed=failed)
+            failed = set(failed)
+            _release_events(owner, [e for e in integration_events if e.object_id not in failed])
+            _release_events(owner, [e for e in integration_events if e.object_id in failed],
+                            error='Could not write the object to Alchemy')
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Webhook drain failed for integration {integration_id}: {str(e)}")
+            logger.error(traceback.format_exc())
+            results[integration_id] = {'status': 'error', 'message': str(e)}
+            _release_events(owner, integration_events, error=e)
+            db.session.commit()
+
+    return results
+
+
+@metered('webhook')
+def _apply_webhook_events(integration_id, by_object, failed=None):
+    """
+    Read the current state of every changed object once and write it to Alchemy
+
+    Args:
+        integration_id (int): Integration the events belong to
+        by_object (dict): {object_id: events in arrival order}
+        failed (list, optional): Collects the object IDs that could not be written. Defaults to None.
+
+    Returns:
+        dict: Drain summary
+    """
+    integration = _integrations().get(integration_id)
+    if not integration or not integration.is_active:
+        return {'status': 'skipped', 'message': 'Integration missing or inactive', 'events': sum(map(len, by_object.values()))}
+
+    config = integration.get_config()
+    if config.get('sync_config', {}).get('direction', 'bidirectional') not in PULL_DIRECTIONS:
+        return {'status': 'skipped', 'message': 'Integration does not pull from HubSpot'}
+
+    # Objects whose latest event is a deletion have nothing left to read
+    object_ids = [
+        object_id for object_id, object_events in by_object.items()
+        if not (object_events[-1].event_type or '').endswith('.deletion')
+    ]
+
+    context = _hubspot_pull_context(integration)
+    if context.get('status') == 'error':
+        # Keep the events queued until Alchemy is reachable again
+        raise RuntimeError(context['message'])
+    if 'status' in context:
+        return context
+
+    field_map = context['field_map']
+    objects = context['service'].batch_read(context['object_type'], object_ids, context['properties'])
+
+    batch = RecordBatch(context['properties'])
+    for obj in objects:
+        batch.append(obj.get('id'), obj.get('properties', {}), _to_epoch_ms(obj.get('updatedAt')))
+
+    summary = apply_to_alchemy(integration_id, context['access_token'], context['tenant_id'],
+                               context['record_type'], batch, field_map, failed=failed)
+    summary.update(status='success', objects=len(object_ids), events=sum(map(len, by_object.values())))
+    logger.info(f"Integration {integration_id}: applied {summary['events']} webhook events as {len(object_ids)} object updates")
+    return summary
+
+
+def load_to_hubspot(integration_id, service, object_type, batch, field_map, sizer=None, failed=None):
+    """
+    Write Alchemy records to HubSpot, updating linked objects and creating the rest
+
+    Records still holding exactly what our last pull wrote are skipped, so a
+    bidirectional integration does not push its pulls back. The modification
+    time HubSpot reports for each write is kept on the link, so the next pull
+    recognizes the write as ours.
+
+    Args:
+        integration_id (int): Integration the records belong to
+        service (HubSpotService): Service for the target portal
+        object_type (str): HubSpot object type
+        batch (RecordBatch): Alchemy records keyed by Alchemy field
+        field_map (dict): {alchemy_field: platform_field}
+        sizer (AdaptiveBatchSizer, optional): Sizes the HubSpot batch calls. Defaults to None.
+        failed (list, optional): Collects the Alchemy record IDs that could not be written. Defaults to None.
+
+    Returns:
+        dict: Counts of updated, created, skipped and failed records
+    """
+    summary = {'updated': 0, 'created': 0, 'skipped': 0, 'failed': 0}
+    if not len(batch):
+        return summary
+    if failed is None:
+        failed = []
+
+    links = {
+        link.alchemy_record_id: link
+        for link in RecordLink.query.filter(
+            RecordLink.integration_id == integration_id,
+            RecordLink.alchemy_record_id.in_(batch.ids)
+        )
+    }
+
+    updates = []
+    update_sources = []
+    creates = []
+    create_sources = []
+    own_fields = {field: field for field in field_map}
+    for (record_id, properties), (_, values) in zip(batch.iter_mapped(field_map), batch.iter_mapped(own_fields)):
+        if not properties:
+            continue
+        link = links.get(record_id)
+        if link is None:
+            # The record ID traces each create to its result
+            creates.append({'properties': properties, 'objectWriteTraceId': record_id})
+            create_sources.append(record_id)
+        elif link.pulled_hash and link.pulled_hash == _values_hash(values):
+            summary['skipped'] += 1
+        else:
+            updates.append({'id': link.platform_record_id, 'properties': properties})
+            update_sources.append(record_id)
+
+    updated = service.batch_write(object_type, 'update', updates, sizer=sizer) if updates else []
+    for record_id, result in zip(update_sources, updated):
+        if result['success']:
+            links[record_id].platform_modified_at = _to_epoch_ms(result.get('updated_at'))
+            summary['updated'] += 1
+        else:
+            summary['failed'] += 1
+            failed.append(record_id)
+
+    created = service.batch_write(object_type, 'create', creates, sizer=sizer) if creates else []
+    for record_id, result in zip(create_sources, created):
+        if result['success']:
+            db.session.add(RecordLink(
+                integration_id=integration_id,
+                alchemy_record_id=record_id,
+                platform_record_id=result['id'],
+                platform_modified_at=_to_epoch_ms(result.get('updated_at'))
+            ))
+            summary['created'] += 1
+        else:
+            summary['failed'] += 1
+            failed.append(record_id)
+
+    return summary
+
+
+@metered('push')
+def push_alchemy_changes(integration):
+    """
+    Push Alchemy records changed since the stored watermark to HubSpot
+
+    Records are streamed from filter-records, projected onto the mapped
+    fields and held in a RecordBatch per page. Each run covers a fixed time
+    window, paged by keyset on (lastChangedOn, position): filter-records
+    returns records in lastChangedOn order and only takes a lower bound, so
+    each page starts at the last lastChangedOn seen and drops just the
+    records already taken at that timestamp. Records changed mid-run leave
+    the window without shifting later pages. The cursor is saved after every
+    page, so an interrupted run resumes on the same window. Page size and
+    HubSpot batch size adapt to observed latency and errors, and are
+    persisted for the next run. The watermark only moves up to the oldest
+    record that failed to write, so failed records are pushed again by the
+    next run.
+
+    Args:
+        integration (SalesforceIntegration): A HubSpot integration
+
+    Returns:
+        dict: Run summary
+    """
+    config = integration.get_config()
+    if config.get('platform') != 'hubspot':
+        raise ValueError(f"Integration {integration.id} is not a HubSpot integration")
+
+    hs_config = config.get('hubspot', {})
+    alchemy_config = config.get('alchemy', {})
+    tenant_id = alchemy_config.get('tenant_id')
+    record_type = alchemy_config.get('record_type')
+    mappings = integration.get_mappings()
+    field_map = forward_mapping(mappings)
+    if not field_map:
+        return {'status': 'skipped', 'message': 'No mappings to apply'}
+
+    access_token = get_alchemy_access_token(stored_refresh_token(config), tenant_id)
+    if not access_token:
+        return {'status': 'error', 'message': f'Unable to get Alchemy access token for tenant {tenant_id}'}
+
+    service = get_hubspot_service(
+        access_token=hs_config.get('access_token'),
+        client_secret=hs_config.get('client_secret'),
+        oauth_mode=True
+    )
+
+    state = _get_sync_state(integration.id, 'push')
+    window = json.loads(state.cursor) if state.cursor else {
+        'from': state.watermark or INITIAL_PUSH_FROM,
+        'to': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'after': None,
+        'ties': 0,
+        'oldest_failed': None
+    }
+    if 'after' not in window:
+        # Saved by the offset-paged version; pushing the window again is safe
+        window = dict(window, after=None, ties=0)
+        window.pop('drop', None)
+
+    fetch_sizer = load_batch_sizer(integration.id, 'alchemy_fetch')
+    write_sizer = load_batch_sizer(integration.id, 'hubspot_write')
+    batch = RecordBatch(mapped_alchemy_fields(mappings))
+    summary = {'fetched': 0, 'updated': 0, 'created': 0, 'skipped': 0, 'failed': 0, 'pages': 0}
+
+    while True:
+        take = fetch_sizer.size
+        batch.clear()
+        started = time.time()
+        try:
+            for record in iter_alchemy_records(access_token, record_type, batch.fields,
+                                               drop=window['ties'], take=take,
+                                               changed_from=window['after'] or window['from'],
+                                               changed_to=window['to'],
+                                               query_term=alchemy_config.get('query_term'),
+                                               tenant_id=tenant_id):
+                batch.append_alchemy_record(record)
+        except Exception as e:
+            # Retry the page smaller if the failure was size or load related
+            if fetch_sizer.observe_error(e, time.time() - started):
+                logger.warning(f"Integration {integration.id}: Alchemy page of {take} failed, retrying with {fetch_sizer.size}")
+                continue
+            raise
+        fetch_sizer.observe(time.time() - started)
+
+        summary['pages'] += 1
+        summary['fetched'] += len(batch)
+
+        failed = []
+        page_summary = load_to_hubspot(integration.id, service, hs_config.get('object_type'), batch, field_map,
+                                       sizer=write_sizer, failed=failed)
+        for key, count in page_summary.items():
+            summary[key] += count
+        if failed:
+            # Records without lastChangedOn hold the watermark at the window start
+            modified = dict(zip(batch.ids, batch.modified))
+            candidates = [modified.get(record_id) or window['from'] for record_id in failed]
+            if window.get('oldest_failed'):
+                candidates.append(window['oldest_failed'])
+            window['oldest_failed'] = min(candidates)
+
+        # Advance the keyset; records without a timestamp stay at the current key
+        for changed_on in batch.modified:
+            if changed_on and (window['after'] is None or changed_on > window['after']):
+                window['after'] = changed_on
+                window['ties'] = 1
+            else:
+                window['ties'] += 1
+        state.cursor = json.dumps(window)
+        save_batch_sizer(integration.id, 'alchemy_fetch', fetch_sizer)
+        save_batch_sizer(integration.id, 'hubspot_write', write_sizer)
+        db.session.commit()
+
+        if len(batch) < take:
+            break
+
+    state.watermark = window.get('oldest_failed') or window['to']
+    state.cursor = None
+    state.last_run_at = datetime.utcnow()
+    state.last_result = summary
+    db.session.commit()
+
+    logger.info(f"Integration {integration.id}: pushed {summary['fetched']} Alchemy records in {summary['pages']} pages")
+    return dict(summary, status='success')
+
+
+def run_forward_syncs(integration_id=None):
+    """
+    Run the Alchemy -> HubSpot push for one or all active integrations
+
+    Args:
+        integration_id (int, optional): Only sync this integration. Defaults to None.
+
+    Returns:
+        dict: {integration_id: run summary}
+    """
+    query = _integrations().filter_by(is_active=True)
+    if integration_id:
+        query = query.filter_by(id=integration_id)
+
+    results = {}
+    for integration in query:
+        try:
+            config = integration.get_config()
+            if config.get('platform') != 'hubspot':
+                continue
+            if config.get('sync_config', {}).get('direction', 'bidirectional') not in PUSH_DIRECTIONS:
+                continue
+            results[integration.id] = push_alchemy_changes(integration)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Forward sync failed for integration {integration.id}: {str(e)}")
+            logger.error(traceback.format_exc())
+            results[integration.id] = {'status': 'error', 'message': str(e)}
+
+    return results
+
+
+def _run_integration(direction, integration_id):
+    """Job entry point: reload the integration in the worker's own session and sync it"""
+    integration = _integrations().get(integration_id)
+    if integration is None:
+        return {'status': 'skipped', 'message': 'Integration deleted'}
+    if direction == 'pull':
+        return pull_hubspot_changes(integration)
+    return push_alchemy_changes(integration)
+
+
+def run_scheduled_syncs(integration_id=None, workers=None):
+    """
+    Run every due pull and push through the fair job runner
+
+    Each job occupies its Alchemy tenant and HubSpot portal, so the per-tenant
+    and per-portal caps in TENANT_CONCURRENCY_LIMITS apply across
+    integrations. The portal is keyed by its ID, so integrations on one
+    portal share its cap whatever their tokens. Each job also occupies its
+    integration, capped at one job, so an integration's pull and push never
+    run at the same time and write the same links. An integration's first sync in a direction (no watermark
+    yet) is a backfill and yields to incremental syncs.
+
+    Args:
+        integration_id (int, optional): Only sync this integration. Defaults to None.
+        workers (int, optional): Worker threads. Defaults to SYNC_WORKERS.
+
+    Returns:
+        dict: {"<integration_id>:<direction>": run summary}
+    """
+    app = current_app._get_current_object()
+    runner = FairJobRunner(
+        app=app,
+        workers=workers or app.config.get('SYNC_WORKERS', 4),
+        caps=app.config.get('TENANT_CONCURRENCY_LIMITS'),
+        default_cap=app.config.get('DEFAULT_TENANT_CONCURRENCY', 2)
+    )
+
+    query = _integrations().filter_by(is_active=True)
+    if integration_id:
+        query = query.filter_by(id=integration_id)
+
+    watermarks = {
+        (state.integration_id, state.direction): state.watermark
+        for state in SyncState.query
+    }
+
+    for integration in query:
+        config = integration.get_config()
+        if config.get('platform') != 'hubspot':
+            continue
+
+        direction_setting = config.get('sync_config', {}).get('direction', 'bidirectional')
+        portal = get_hubspot_service(access_token=config.get('hubspot', {}).get('access_token')).portal_key
+        integration_resource = f"integration:{integration.id}"
+        runner.caps[integration_resource] = 1
+        resources = (f"alchemy:{config.get('alchemy', {}).get('tenant_id')}", f"hubspot:{portal}",
+                     integration_resource)
+
+        for direction, allowed in (('pull', PULL_DIRECTIONS), ('push', PUSH_DIRECTIONS)):
+            if direction_setting not in allowed:
+                continue
+            priority = PRIORITY_INCREMENTAL if watermarks.get((integration.id, direction)) else PRIORITY_BACKFILL
+            runner.submit(f"{integration.id}:{direction}", resources, _run_integration,
+                          args=(direction, integration.id), priority=priority)
+
+    logger.info(f"Scheduling {runner.pending()} sync jobs on {runner.workers} workers")
+    return runner.run()
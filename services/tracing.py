@@ -0,0 +1,117 @@
+"""
+Per-request timing spans for upstream calls and database queries
+
+A trace is started for each request. Code running in the request's
+context records spans into it, and the request hooks turn them into a
+Server-Timing header and, on request, a debug_timing block. Work on
+other threads (hedged attempts, background refreshes, writer pools) is
+covered by the span of the call that waits for it.
+"""
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+# Spans kept per request; later ones are only counted
+MAX_SPANS = 200
+
+# First table a statement reads or writes
+TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+"?(\w+)', re.IGNORECASE)
+
+_trace = ContextVar('request_trace', default=None)
+
+
+class Trace:
+    """Spans recorded during one request"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+
+    def add(self, category, name, started, duration, detail=None):
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return
+        self.spans.append({
+            'category': category,
+            'name': name,
+            'start_ms': round((started - self.started) * 1000, 2),
+            'duration_ms': round(duration * 1000, 2),
+            'detail': detail
+        })
+
+    def elapsed(self):
+        """Seconds since the trace started"""
+        return time.perf_counter() - self.started
+
+
+def start_trace():
+    """Start collecting spans for the current request; returns a token for end_trace"""
+    return _trace.set(Trace())
+
+
+def end_trace(token):
+    """Stop collecting spans and return the finished trace"""
+    trace = _trace.get()
+    _trace.reset(token)
+    return trace
+
+
+def current_trace():
+    """Get the active trace, or None outside a traced request"""
+    return _trace.get()
+
+
+@contextmanager
+def span(category, name, detail=None):
+    """
+    Time a block as a span of the active trace; does nothing outside a traced request
+
+    Args:
+        category (str): Kind of work, e.g. 'upstream' or 'db'
+        name (str): What was done, e.g. 'alchemy refresh-token'
+        detail (dict, optional): Extra fields shown in debug_timing; may be updated inside the block.
+            Defaults to None.
+
+    Yields:
+        dict: The detail dict, so the block can add e.g. a status
+    """
+    trace = _trace.get()
+    detail = {} if detail is None else detail
+    if trace is None:
+        yield detail
+        return
+    started = time.perf_counter()
+    try:
+        yield detail
+    finally:
+        trace.add(category, name, started, time.perf_counter() - started, detail or None)
+
+
+def instrument_engine(engine):
+    """Record every query on an engine as a 'db' span of the active trace"""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _trace.get() is not None:
+            conn.info.setdefault('trace_query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        trace = _trace.get()
+        starts = conn.info.get('trace_query_started')
+        if trace is None or not starts:
+            return
+        started = starts.pop()
+        # Verb and table only; parameters may hold credentials
+        table = TABLE_PATTERN.search(statement)
+        name = statement.lstrip().split(None, 1)[0].upper() + (f" {table.group(1)}" if table else '')
+        trace.add('db', name, started, time.perf_counter() - started,
+                  {'rows': cursor.rowcount} if cursor.rowcount >= 0 else None)
+
+    @event.listens_for(engine, 'handle_error')
+    def _handle_error(context):
+        starts = context.connection.info.get('trace_query_started') if context.connection is not None else None
+        if starts:
+            starts.pop()
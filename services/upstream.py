@@ -0,0 +1,535 @@
+"""
+Shared helpers for calls to upstream APIs (Alchemy, HubSpot, Salesforce, SAP)
+"""
+import logging
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeout
+from urllib.parse import urlparse
+
+import requests
+
+from services import metrics, tracing
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeout applied to every upstream call that does not set one
+DEFAULT_TIMEOUT = (5, 30)
+
+# Upstream names by host; anything else is named after its host
+UPSTREAM_HOSTS = {
+    'core-production.alchemy.cloud': 'alchemy',
+    'api.hubapi.com': 'hubspot'
+}
+
+# Breaker settings: consecutive failures (errors, 5xx or calls slower than
+# SLOW_CALL_SECONDS) that open the circuit, and how long it stays open
+# before a half-open trial call is let through
+FAILURE_THRESHOLD = 5
+SLOW_CALL_SECONDS = 10.0
+OPEN_SECONDS = 30.0
+
+# Responses that say something is wrong with one tenant's access (revoked
+# credentials, a tenant-level rate limit) rather than with the upstream. They
+# count against that tenant's own breaker; 5xx, errors and timeouts count
+# against the upstream's shared breaker.
+TENANT_FAILURE_STATUSES = (401, 403, 429)
+
+# Calls are not started with less budget than this left on their deadline
+MIN_CALL_SECONDS = 0.1
+
+# A call that times out when its deadline runs out still counts as an
+# upstream failure if its timeout was at least this long: the timeout is
+# clipped to the remaining budget, so this is how a hung upstream looks to
+# every call made under a deadline
+DEADLINE_TIMEOUT_FLOOR = 0.25
+
+# Hedging: a second attempt is sent once the first has run longer than the
+# endpoint's observed HEDGE_PERCENTILE latency. Each hedge-eligible call
+# earns HEDGE_BUDGET_RATIO of a hedge, so at most ~10% extra load, with
+# HEDGE_BUDGET_BURST hedges banked at most. At most HEDGE_POOL_SIZE
+# attempts run off their caller's thread; beyond that calls are not hedged.
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_PERCENTILE = 0.95
+HEDGE_BUDGET_RATIO = 0.1
+HEDGE_BUDGET_BURST = 5
+HEDGE_POOL_SIZE = 16
+
+
+# Path segments left out of endpoint metric labels: API prefixes and versions
+ENDPOINT_PREFIXES = {'core', 'api', 'crm'}
+VERSION_SEGMENT = re.compile(r'^v\d+$')
+
+UPSTREAM_REQUESTS = metrics.counter(
+    'upstream_requests_total', 'Upstream calls by outcome (HTTP status, timeout, error, deadline, circuit_open)',
+    ('upstream', 'endpoint', 'method', 'status'))
+UPSTREAM_LATENCY = metrics.histogram(
+    'upstream_request_duration_seconds', 'Upstream call latency in seconds, including hedged attempts',
+    ('upstream', 'endpoint', 'method'))
+
+
+class UpstreamError(RuntimeError):
+    """
+    An upstream call failed
+
+    Attributes:
+        status_code (int or None): HTTP status, None for network errors and timeouts
+    """
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(UpstreamError):
+    """The upstream's circuit is open, so the call was not attempted"""
+    def __init__(self, upstream, retry_in):
+        super().__init__(f"{upstream} circuit open, retry in {retry_in:.0f}s", 503)
+        self.upstream = upstream
+
+
+class DeadlineExceeded(UpstreamError):
+    """The request's time budget ran out before or during an upstream call"""
+    def __init__(self, message="Request deadline exceeded"):
+        super().__init__(message, 504)
+
+
+class Deadline:
+    """
+    Time budget shared by every upstream call made while handling one request
+
+    Handlers create one and pass it down the service layer; each call then
+    gets only what is left of the budget as its timeout, so a slow first
+    call leaves less time for the next instead of adding to the total.
+    """
+    def __init__(self, seconds):
+        """
+        Args:
+            seconds (float): Total budget in seconds
+        """
+        self.seconds = float(seconds)
+        self.expires_at = time.monotonic() + self.seconds
+
+    def remaining(self):
+        """Seconds left, never negative"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() < MIN_CALL_SECONDS
+
+    def timeout(self, timeout=DEFAULT_TIMEOUT):
+        """
+        Clip a requests timeout to the remaining budget
+
+        Args:
+            timeout (float or tuple, optional): (connect, read) or a single value. Defaults to DEFAULT_TIMEOUT.
+
+        Returns:
+            tuple: (connect, read) timeout no longer than the remaining budget
+
+        Raises:
+            DeadlineExceeded: If too little budget is left to start a call
+        """
+        remaining = self.remaining()
+        if remaining < MIN_CALL_SECONDS:
+            raise DeadlineExceeded(f"Request deadline of {self.seconds:g}s exceeded")
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        return min(connect, remaining), min(read, remaining)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one upstream, or for one tenant's access to it
+
+    Closed: calls go through and consecutive failures are counted.
+    Open: calls fail immediately for OPEN_SECONDS.
+    Half-open: one trial call goes through; success closes the circuit,
+    failure opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, slow_call_seconds=SLOW_CALL_SECONDS,
+                 open_seconds=OPEN_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Check whether a call may proceed
+
+        Returns:
+            bool: True if the call is the half-open trial, which must end in record() or release()
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with a trial already running
+        """
+        with self.lock:
+            if self.state == self.CLOSED:
+                return False
+            elapsed = time.monotonic() - self.opened_at
+            if self.state == self.OPEN and elapsed >= self.open_seconds:
+                self.state = self.HALF_OPEN
+                self.trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                logger.info(f"{self.name} circuit half-open, sending trial call")
+                return True
+            raise CircuitOpenError(self.name, max(0.0, self.open_seconds - elapsed))
+
+    def release(self):
+        """Give up the trial call without recording an outcome, e.g. when our own deadline cut it short"""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record(self, success, latency=0.0):
+        """Record a call outcome; slow successes count as failures"""
+        failed = not success or latency > self.slow_call_seconds
+        with self.lock:
+            if not failed:
+                if self.state != self.CLOSED:
+                    logger.info(f"{self.name} circuit closed")
+                self.state = self.CLOSED
+                self.failures = 0
+                self.trial_in_flight = False
+                return
+
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"{self.name} circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.trial_in_flight = False
+
+
+class LatencyTracker:
+    """Recent latencies of one upstream endpoint"""
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def observe(self, latency):
+        with self.lock:
+            self.samples.append(latency)
+
+    def percentile(self, fraction, min_samples=HEDGE_MIN_SAMPLES):
+        """Get a latency percentile, or None until enough calls have been seen"""
+        with self.lock:
+            if len(self.samples) < min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class HedgeBudget:
+    """Caps hedged attempts to a fraction of hedge-eligible calls"""
+    def __init__(self, ratio=HEDGE_BUDGET_RATIO, burst=HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = float(burst)
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def available(self):
+        """Whether a hedge could be spent right now"""
+        with self.lock:
+            return self.tokens >= 1
+
+    def try_spend(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_latency_trackers = {}
+_hedge_budgets = {}
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix='upstream-hedge')
+# One slot per pool worker, taken without blocking, so attempts never wait in
+# the pool's queue and its wait never counts towards the hedge delay
+_hedge_slots = threading.BoundedSemaphore(HEDGE_POOL_SIZE)
+
+
+def upstream_name(url):
+    """Name the upstream a URL belongs to"""
+    host = urlparse(url).hostname or ''
+    if host in UPSTREAM_HOSTS:
+        return UPSTREAM_HOSTS[host]
+    if host.endswith('.salesforce.com') or host.endswith('.force.com'):
+        return 'salesforce'
+    return host
+
+
+def upstream_endpoint(url):
+    """
+    Name the endpoint of a URL for metric labels, e.g. 'refresh-token' or 'properties/contacts'
+
+    API prefixes and versions are dropped and segments containing digits
+    (record IDs, custom object IDs) become ':id', so labels stay few.
+    """
+    segments = [
+        ':id' if any(char.isdigit() for char in segment) else segment
+        for segment in urlparse(url).path.split('/')
+        if segment and segment not in ENDPOINT_PREFIXES and not VERSION_SEGMENT.match(segment)
+    ]
+    return '/'.join(segments[-3:]) or '/'
+
+
+def get_breaker(name, tenant=None):
+    """
+    Get the process-wide circuit breaker for an upstream, or for one tenant's access to it
+
+    Args:
+        name (str): Upstream name
+        tenant (str, optional): Tenant or portal, for the breaker that only counts
+            TENANT_FAILURE_STATUSES. Defaults to None (the upstream's shared breaker).
+
+    Returns:
+        CircuitBreaker: The shared breaker
+    """
+    key = f"{name}:{tenant}" if tenant else name
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(key)
+            _breakers[key] = breaker
+        return breaker
+
+
+def breaker_states():
+    """Get {upstream or upstream:tenant: state} for every breaker created so far"""
+    with _breakers_lock:
+        return {name: breaker.state for name, breaker in _breakers.items()}
+
+
+def get_latency_tracker(upstream, method, path):
+    """Get the latency tracker for one upstream endpoint"""
+    key = (upstream, method, path)
+    with _breakers_lock:
+        tracker = _latency_trackers.get(key)
+        if tracker is None:
+            tracker = LatencyTracker()
+            _latency_trackers[key] = tracker
+        return tracker
+
+
+def _get_hedge_budget(upstream):
+    with _breakers_lock:
+        budget = _hedge_budgets.get(upstream)
+        if budget is None:
+            budget = HedgeBudget()
+            _hedge_budgets[upstream] = budget
+        return budget
+
+
+def _send(session, method, url, tracker, kwargs):
+    """Send one attempt and record its latency"""
+    started = time.monotonic()
+    response = (session or requests).request(method, url, **kwargs)
+    tracker.observe(time.monotonic() - started)
+    return response
+
+
+def _close_response(future):
+    """Release the connection of an attempt that lost the hedge race"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _try_submit(send):
+    """
+    Start an attempt on the hedge pool if a worker is free right now
+
+    Returns:
+        Future or None: The attempt, or None if the pool is saturated
+    """
+    if not _hedge_slots.acquire(blocking=False):
+        return None
+
+    def attempt():
+        try:
+            return send()
+        finally:
+            _hedge_slots.release()
+    return _hedge_pool.submit(attempt)
+
+
+def _hedged_send(upstream, tracker, send):
+    """
+    Send an attempt, and a second one if the first outlasts the endpoint's p95
+
+    Returns whichever attempt first gets a non-5xx response. Results of the
+    first attempt before the hedge point are returned as-is; once hedged, a
+    5xx response or error only stands if the other attempt does no better,
+    and an error is only raised if neither attempt got a response.
+
+    Calls that cannot be hedged (too few latency samples, no hedge budget
+    left, or a saturated pool) are sent on the caller's thread.
+    """
+    budget = _get_hedge_budget(upstream)
+    budget.deposit()
+    delay = tracker.percentile(HEDGE_PERCENTILE)
+    if delay is None or not budget.available():
+        return send()
+
+    first = _try_submit(send)
+    if first is None:
+        return send()
+    try:
+        return first.result(timeout=delay)
+    except FutureTimeout:
+        pass
+
+    if not budget.try_spend():
+        return first.result()
+    second = _try_submit(send)
+    if second is None:
+        # Saturated since the first attempt started: skip the hedge rather
+        # than queue it, and keep its budget spent so hedging backs off
+        return first.result()
+
+    logger.debug(f"Hedging {upstream} request after {delay:.2f}s")
+    pending = {first, second}
+    error = None
+    fallback = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = future.exception()
+                continue
+            response = future.result()
+            if response.status_code < 500:
+                for other in pending | (done - {future}):
+                    other.add_done_callback(_close_response)
+                if fallback is not None:
+                    fallback.close()
+                return response
+            # Keep the first server error in case the other attempt fails too
+            if fallback is None:
+                fallback = response
+            else:
+                response.close()
+    if fallback is not None:
+        return fallback
+    raise error
+
+
+def upstream_request(method, url, upstream=None, session=None, deadline=None, hedge=False, tenant=None, **kwargs):
+    """
+    Make an upstream HTTP call with a timeout and the upstream's circuit breaker
+
+    Args:
+        method (str): HTTP method
+        url (str): Full request URL
+        upstream (str, optional): Breaker name. Defaults to the name derived from the URL host.
+        tenant (str, optional): Alchemy tenant or HubSpot portal the call is made for. Outages
+            (5xx, errors, timeouts) open the upstream's shared breaker; TENANT_FAILURE_STATUSES
+            only open this tenant's own breaker. Defaults to None (shared breaker only).
+        session (requests.Session, optional): Session to send through. Defaults to None.
+        deadline (Deadline, optional): Request budget the timeout is clipped to. Defaults to None.
+        hedge (bool, optional): For idempotent GETs, send a second attempt when the first
+            outlasts the endpoint's p95 latency, within the upstream's hedge budget. Defaults to False.
+        **kwargs: Passed to requests; timeout defaults to DEFAULT_TIMEOUT
+
+    Returns:
+        requests.Response: The response, whatever its status
+
+    Raises:
+        CircuitOpenError: If the upstream's or the tenant's circuit is open
+        DeadlineExceeded: If the deadline runs out before or during the call
+        requests.exceptions.RequestException: On network errors and timeouts
+    """
+    timeout = kwargs.pop('timeout', DEFAULT_TIMEOUT)
+    if deadline is not None:
+        timeout = deadline.timeout(timeout)
+
+    name = upstream or upstream_name(url)
+    endpoint = upstream_endpoint(url)
+    breaker = get_breaker(name)
+    tenant_breaker = get_breaker(name, tenant) if tenant else None
+    trial = tenant_trial = False
+    try:
+        trial = breaker.before_call()
+        if tenant_breaker is not None:
+            tenant_trial = tenant_breaker.before_call()
+    except CircuitOpenError:
+        if trial:
+            breaker.release()
+        UPSTREAM_REQUESTS.inc(upstream=name, endpoint=endpoint, method=method, status='circuit_open')
+        raise
+
+    tracker = get_latency_tracker(name, method, urlparse(url).path)
+    kwargs['timeout'] = timeout
+    send = lambda: _send(session, method, url, tracker, kwargs)
+
+    labels = {'upstream': name, 'endpoint': endpoint, 'method': method}
+    started = time.monotonic()
+    recorded = False
+    try:
+        with tracing.span('upstream', f"{name} {endpoint}", {'method': method}) as detail:
+            try:
+                if hedge and method == 'GET' and not kwargs.get('stream'):
+                    response = _hedged_send(name, tracker, send)
+                else:
+                    response = send()
+                detail['status'] = response.status_code
+            except requests.exceptions.Timeout:
+                elapsed = time.monotonic() - started
+                UPSTREAM_LATENCY.observe(elapsed, **labels)
+                if deadline is not None and deadline.expired():
+                    # Only a call the deadline left almost no time for says
+                    # nothing about the upstream's health
+                    if elapsed >= breaker.slow_call_seconds or min(timeout) >= DEADLINE_TIMEOUT_FLOOR:
+                        recorded = True
+                        breaker.record(False)
+                    UPSTREAM_REQUESTS.inc(status='deadline', **labels)
+                    detail['status'] = 'deadline'
+                    raise DeadlineExceeded(f"Request deadline of {deadline.seconds:g}s exceeded")
+                recorded = True
+                breaker.record(False)
+                UPSTREAM_REQUESTS.inc(status='timeout', **labels)
+                detail['status'] = 'timeout'
+                raise
+            except requests.exceptions.RequestException:
+                recorded = True
+                breaker.record(False)
+                UPSTREAM_REQUESTS.inc(status='error', **labels)
+                detail['status'] = 'error'
+                raise
+
+        latency = time.monotonic() - started
+        recorded = True
+        breaker.record(response.status_code < 500, latency)
+        if tenant_breaker is not None:
+            tenant_breaker.record(response.status_code not in TENANT_FAILURE_STATUSES)
+            tenant_trial = False
+    finally:
+        # Any other way out (our deadline, a bug, an unexpected exception)
+        # must not leave the half-open circuit waiting for its trial forever;
+        # errors and timeouts say nothing about the tenant's access either
+        if trial and not recorded:
+            breaker.release()
+        if tenant_trial:
+            tenant_breaker.release()
+    UPSTREAM_LATENCY.observe(latency, **labels)
+    UPSTREAM_REQUESTS.inc(status=response.status_code, **labels)
+    return response
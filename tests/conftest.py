@@ -0,0 +1,69 @@
+"""
+Shared fixtures: an application on a throwaway SQLite database
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The configuration reads the environment at import time
+_db_dir = tempfile.mkdtemp(prefix='integration-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """The database, emptied after each test"""
+    from app import db
+    with app.app_context():
+        yield db
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+def hubspot_config(tenant_id='acme', access_token='hs-token', direction=None, **hubspot):
+    """A stored HubSpot integration configuration"""
+    config = {
+        'platform': 'hubspot',
+        'alchemy': {'tenant_id': tenant_id, 'record_type': 'Result', 'refresh_token': 'alchemy-refresh'},
+        'hubspot': dict({'access_token': access_token, 'client_secret': 'hs-secret', 'object_type': 'contact'},
+                        **hubspot),
+        'sync_config': {'frequency': 'daily', 'is_active': True}
+    }
+    if direction:
+        config['sync_config']['direction'] = direction
+    return config
+
+
+@pytest.fixture
+def make_integration(db):
+    """Create and commit an integration from a configuration"""
+    from app.models import SalesforceIntegration
+
+    def make(config=None, mappings=None, is_active=True):
+        integration = SalesforceIntegration(alchemy_base_url='', alchemy_api_key='', is_active=is_active)
+        integration.set_config(config or hubspot_config(),
+                               mappings or [{'alchemy_field': 'Name', 'platform_field': 'firstname'}])
+        db.session.add(integration)
+        db.session.commit()
+        return integration
+    return make
@@ -0,0 +1,61 @@
+"""
+filter-records paging: optional query term and field projection
+"""
+import json
+
+from services import alchemy_service
+from services.alchemy_service import fetch_alchemy_records
+
+
+class FakeResponse:
+    status_code = 200
+    text = ''
+
+    def __init__(self, records):
+        self.body = json.dumps(records).encode('utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def iter_content(self, chunk_size=None):
+        # Small chunks exercise the incremental decoder
+        for start in range(0, len(self.body), 7):
+            yield self.body[start:start + 7]
+
+
+def _record(record_id):
+    return {'id': record_id, 'fields': [
+        {'identifier': 'Name', 'rows': [{'values': [{'value': f'name-{record_id}'}]}]},
+        {'identifier': 'Unmapped', 'rows': [{'values': [{'value': 'x'}]}]}
+    ]}
+
+
+def test_no_query_term_by_default(monkeypatch):
+    sent = []
+
+    def request(method, url, json=None, **kwargs):
+        sent.append(json)
+        return FakeResponse([_record(1), _record(2)])
+    monkeypatch.setattr(alchemy_service, 'upstream_request', request)
+
+    records = fetch_alchemy_records('token', 'Result', ['Name'])
+
+    assert 'queryTerm' not in sent[0]
+    assert [r['id'] for r in records] == [1, 2]
+    assert [f['identifier'] for f in records[0]['fields']] == ['Name']
+
+
+def test_query_term_is_passed_through(monkeypatch):
+    sent = []
+
+    def request(method, url, json=None, **kwargs):
+        sent.append(json)
+        return FakeResponse([])
+    monkeypatch.setattr(alchemy_service, 'upstream_request', request)
+
+    fetch_alchemy_records('token', 'Result', query_term="Result.Status == 'Valid'")
+
+    assert sent[0]['queryTerm'] == "Result.Status == 'Valid'"
@@ -0,0 +1,86 @@
+"""
+POST /integrations/bulk: results per id, filters and their validation
+"""
+import pytest
+
+from app.models import RecordLink, SalesforceIntegration, SyncState
+from conftest import hubspot_config
+
+
+def _bulk(client, **body):
+    response = client.post('/integrations/bulk', json=body)
+    return response, response.get_json()
+
+
+def test_deactivate_by_ids_reports_each_id(client, make_integration):
+    active = make_integration()
+    inactive = make_integration(is_active=False)
+    unchanged_stamp = SalesforceIntegration.query.get(inactive.id).updated_at
+
+    response, payload = _bulk(client, action='deactivate', ids=[active.id, inactive.id, 9999])
+
+    assert response.status_code == 200
+    assert payload['results'] == [
+        {'id': active.id, 'result': 'deactivated'},
+        {'id': inactive.id, 'result': 'unchanged'},
+        {'id': 9999, 'result': 'not_found'}
+    ]
+    assert SalesforceIntegration.query.get(active.id).is_active is False
+    assert SalesforceIntegration.query.get(inactive.id).updated_at == unchanged_stamp
+
+
+def test_filters_select_by_tenant_and_state(client, make_integration):
+    acme = make_integration(is_active=False)
+    make_integration(hubspot_config(tenant_id='globex'), is_active=False)
+    make_integration()
+
+    response, payload = _bulk(client, action='activate', filters={'tenant_id': 'acme', 'active': False})
+
+    assert response.status_code == 200
+    assert payload['results'] == [{'id': acme.id, 'result': 'activated'}]
+
+
+def test_delete_by_filter_removes_dependent_rows(client, db, make_integration):
+    doomed = make_integration(hubspot_config(tenant_id='globex')).id
+    kept = make_integration().id
+    db.session.add(SyncState(integration_id=doomed, direction='pull'))
+    db.session.add(RecordLink(integration_id=doomed, alchemy_record_id='r1', platform_record_id='p1'))
+    db.session.commit()
+
+    response, payload = _bulk(client, action='delete', filters={'tenant_id': 'globex'})
+
+    assert response.status_code == 200
+    assert payload['results'] == [{'id': doomed, 'result': 'deleted'}]
+    assert [i.id for i in SalesforceIntegration.query] == [kept]
+    assert SyncState.query.count() == 0 and RecordLink.query.count() == 0
+
+
+@pytest.mark.parametrize('filters', [
+    {'tenant_id': ['acme', 'globex']},
+    {'active': 'no'},
+    {'active': 0},
+    {'platform': None},
+    {'record_type': {'name': 'Result'}}
+])
+def test_invalid_filter_values_are_rejected(client, make_integration, filters):
+    make_integration()
+
+    response, payload = _bulk(client, action='deactivate', filters=filters)
+
+    assert response.status_code == 400
+    assert 'SELECT' not in payload['message']
+    assert SalesforceIntegration.query.filter_by(is_active=True).count() == 1
+
+
+@pytest.mark.parametrize('body', [
+    {'action': 'archive', 'ids': [1]},
+    {'action': 'delete'},
+    {'action': 'delete', 'ids': [1], 'filters': {'platform': 'hubspot'}},
+    {'action': 'delete', 'ids': ['1']},
+    {'action': 'delete', 'filters': {}},
+    {'action': 'delete', 'filters': {'owner': 'me'}}
+])
+def test_malformed_requests_are_rejected(client, body):
+    response, _ = _bulk(client, **body)
+
+    assert response.status_code == 400
@@ -0,0 +1,78 @@
+"""
+ETags and 304 Not Modified on integration and metadata endpoints
+"""
+from datetime import datetime
+
+from app import hubspot_routes
+from app.models import SalesforceIntegration
+
+
+def test_integration_revalidates_until_it_changes(client, db, make_integration):
+    integration = make_integration()
+
+    first = client.get(f"/integration/{integration.id}")
+    etag = first.headers['ETag']
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    cached = client.get(f"/integration/{integration.id}", headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.get_data() == b''
+    assert cached.headers['ETag'] == etag
+
+    db.session.execute(
+        SalesforceIntegration.__table__.update()
+        .where(SalesforceIntegration.id == integration.id)
+        .values(updated_at=datetime(2030, 1, 1))
+    )
+    db.session.commit()
+
+    changed = client.get(f"/integration/{integration.id}", headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_weak_and_listed_validators_match(client, make_integration):
+    integration = make_integration()
+    etag = client.get(f"/integration/{integration.id}").headers['ETag'].strip('"')
+
+    weak = client.get(f"/integration/{integration.id}", headers={'If-None-Match': f'W/"{etag}"'})
+    listed = client.get(f"/integration/{integration.id}", headers={'If-None-Match': f'"other", "{etag}"'})
+
+    assert weak.status_code == 304
+    assert listed.status_code == 304
+
+
+def test_listing_etag_follows_the_page_body(client, make_integration):
+    make_integration()
+
+    first = client.get('/integrations')
+    etag = first.headers['ETag']
+    assert client.get('/integrations', headers={'If-None-Match': etag}).status_code == 304
+
+    # A different projection is a different representation
+    projected = client.get('/integrations', query_string={'fields': 'id'}, headers={'If-None-Match': etag})
+    assert projected.status_code == 200
+
+    make_integration()
+    assert client.get('/integrations', headers={'If-None-Match': etag}).status_code == 200
+
+
+class FakeFieldsService:
+    """Serves the same fields with a growing cache age"""
+    age = 0
+
+    def get_fields_with_age(self, object_type, use_cache=True, deadline=None):
+        FakeFieldsService.age += 30
+        return [{'identifier': 'firstname', 'name': 'First Name'}], FakeFieldsService.age
+
+
+def test_metadata_etag_ignores_cache_age(client, monkeypatch):
+    monkeypatch.setattr(hubspot_routes, 'get_hubspot_service', lambda **kwargs: FakeFieldsService())
+    body = {'object_type': 'contact', 'api_key': 'hs-key'}
+
+    first = client.post('/hubspot/fields', json=body)
+    assert first.status_code == 200
+
+    again = client.post('/hubspot/fields', json=body, headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
@@ -0,0 +1,48 @@
+"""
+Stored refresh tokens are encrypted and never returned by the API
+"""
+import json
+
+from app.credentials import decrypt_secret, encrypt_secret, is_encrypted, stored_refresh_token
+
+
+def test_encrypt_round_trip(app):
+    with app.app_context():
+        encrypted = encrypt_secret('refresh-me')
+        assert is_encrypted(encrypted)
+        assert 'refresh-me' not in encrypted
+        assert encrypt_secret(encrypted) == encrypted
+        assert decrypt_secret(encrypted) == 'refresh-me'
+        # Tokens saved before encryption are still readable
+        assert decrypt_secret('legacy-plain') == 'legacy-plain'
+
+
+def test_saved_token_is_encrypted_and_hidden(client, db, make_integration):
+    integration = make_integration()
+
+    stored = json.loads(integration.field_mappings)['config']['alchemy']['refresh_token']
+    assert is_encrypted(stored)
+    assert stored_refresh_token(integration.get_config()) == 'alchemy-refresh'
+
+    response = client.get(f'/integration/{integration.id}')
+    alchemy_config = response.get_json()['integration']['alchemy_config']
+    assert 'refresh_token' not in alchemy_config
+    assert alchemy_config['has_refresh_token'] is True
+    assert b'alchemy-refresh' not in response.data
+
+
+def test_legacy_tokens_are_encrypted_by_migration(db, make_integration):
+    from app.migrations import encrypt_refresh_tokens
+
+    integration = make_integration()
+    data = json.loads(integration.field_mappings)
+    data['config']['alchemy']['refresh_token'] = 'legacy-plain'
+    integration.field_mappings = json.dumps(data)
+    db.session.commit()
+    updated_at = integration.updated_at
+
+    assert encrypt_refresh_tokens() == 1
+    db.session.refresh(integration)
+    assert is_encrypted(json.loads(integration.field_mappings)['config']['alchemy']['refresh_token'])
+    assert integration.updated_at == updated_at
+    assert stored_refresh_token(integration.get_config()) == 'legacy-plain'
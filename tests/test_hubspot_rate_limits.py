@@ -0,0 +1,134 @@
+"""
+HubSpot rate limits: batch writes back off on 429 before giving objects up
+"""
+import pytest
+
+from services import hubspot_service
+from services.batch_sizing import AdaptiveBatchSizer
+from services.hubspot_service import HubSpotService
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+        self.headers = headers or {}
+        self.text = str(self.payload)
+
+    def json(self):
+        return self.payload
+
+
+class FakeBucket:
+    def __init__(self):
+        self.pauses = []
+
+    def pause(self, seconds):
+        self.pauses.append(seconds)
+
+
+def _service(monkeypatch, responses):
+    service = HubSpotService(access_token='hs-token')
+    bucket = FakeBucket()
+    sent = []
+
+    def request(method, url, **kwargs):
+        sent.append(len(kwargs['json']['inputs']))
+        return responses.pop(0)
+    monkeypatch.setattr(service, 'request', request)
+    monkeypatch.setattr(service, '_bucket', lambda url: bucket)
+    return service, bucket, sent
+
+
+def _updated(*ids):
+    return FakeResponse(200, {'results': [{'id': object_id} for object_id in ids]})
+
+
+def test_batch_write_honors_retry_after_without_sizer(monkeypatch):
+    service, bucket, sent = _service(monkeypatch, [
+        FakeResponse(429, headers={'Retry-After': '7'}),
+        FakeResponse(429),
+        _updated('1', '2')
+    ])
+
+    results = service.batch_write('contact', 'update', [{'id': '1', 'properties': {}}, {'id': '2', 'properties': {}}])
+
+    assert all(result['success'] for result in results)
+    assert bucket.pauses == [7.0, hubspot_service.BATCH_RETRY_BACKOFF * 2]
+    assert sent == [2, 2, 2]
+
+
+def test_batch_write_retries_at_minimum_size(monkeypatch):
+    service, bucket, sent = _service(monkeypatch, [FakeResponse(429), _updated('1')])
+    sizer = AdaptiveBatchSizer(1, minimum=1, maximum=10)
+
+    results = service.batch_write('contact', 'update', [{'id': '1', 'properties': {}}], sizer=sizer)
+
+    assert results[0]['success']
+    assert sent == [1, 1]
+    assert len(bucket.pauses) == 1
+
+
+def test_batch_write_fails_chunk_after_retries(monkeypatch):
+    retries = hubspot_service.BATCH_RATE_LIMIT_RETRIES
+    service, bucket, sent = _service(monkeypatch, [FakeResponse(429) for _ in range(retries + 1)] + [_updated('2')])
+
+    results = service.batch_write('contact', 'update', [{'id': '1', 'properties': {}}, {'id': '2', 'properties': {}}],
+                                  batch_size=1)
+
+    assert [result['success'] for result in results] == [False, True]
+    assert len(bucket.pauses) == retries
+    assert max(bucket.pauses) <= hubspot_service.BATCH_MAX_BACKOFF
+
+
+def test_tokens_of_one_portal_share_a_bucket(monkeypatch):
+    portals = {'portal-a-token-1': '101', 'portal-a-token-2': '101', 'portal-b-token': '202'}
+    lookups = []
+
+    def fetch(self):
+        lookups.append(self.access_token)
+        return portals[self.access_token]
+    monkeypatch.setattr(HubSpotService, '_fetch_portal_id', fetch)
+
+    first = HubSpotService(access_token='portal-a-token-1')
+    rotated = HubSpotService(access_token='portal-a-token-2')
+    other = HubSpotService(access_token='portal-b-token')
+    url = 'https://api.hubapi.com/crm/v3/objects/contacts/batch/update'
+
+    assert first._bucket(url) is rotated._bucket(url)
+    assert first._bucket(url) is not other._bucket(url)
+    assert first._bucket(url) is not first._bucket(url + '/search')
+    assert HubSpotService(access_token='portal-a-token-1').portal_key == 'portal-101'
+    assert sorted(lookups) == sorted(portals)
+
+
+def test_portal_lookup_failure_falls_back_to_token(monkeypatch):
+    monkeypatch.setattr(HubSpotService, '_fetch_portal_id', lambda self: None)
+    service = HubSpotService(access_token='unknown-portal-token')
+
+    assert service.portal_key == service._token_hash()
+
+
+def test_bucket_registry_drops_least_recently_used(monkeypatch):
+    from services import rate_limit
+    monkeypatch.setattr(rate_limit, '_buckets', rate_limit.OrderedDict())
+    monkeypatch.setattr(rate_limit, 'MAX_BUCKETS', 2)
+
+    first = rate_limit.get_bucket('first', 10, 1.0)
+    rate_limit.get_bucket('second', 10, 1.0)
+    assert rate_limit.get_bucket('first', 10, 1.0) is first
+    rate_limit.get_bucket('third', 10, 1.0)
+
+    assert list(rate_limit._buckets) == ['first', 'third']
+
+
+def test_paused_bucket_makes_callers_wait():
+    from services.rate_limit import TokenBucket
+    from services.upstream import UpstreamError
+    bucket = TokenBucket(2, 1.0)
+    assert bucket.acquire() < 0.1
+    bucket.pause(30)
+
+    with pytest.raises(UpstreamError) as raised:
+        bucket.acquire(max_wait=0.1)
+    assert raised.value.status_code == 429
@@ -0,0 +1,152 @@
+"""
+HubSpot webhook receiver and the queued drain worker
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime, timedelta
+
+from app.models import WebhookEvent
+from services import sync_service
+from services.hubspot_service import HubSpotService
+from services.sync_service import WEBHOOK_MAX_ATTEMPTS, claim_webhook_events, drain_webhook_queue
+
+
+def _sign(url, body, secret='hs-secret', method='POST', timestamp=None):
+    timestamp = str(timestamp or int(time.time() * 1000))
+    source = f"{method}{url}{body}{timestamp}".encode('utf-8')
+    signature = base64.b64encode(hmac.new(secret.encode('utf-8'), source, hashlib.sha256).digest()).decode('ascii')
+    return {'X-HubSpot-Signature-v3': signature, 'X-HubSpot-Request-Timestamp': timestamp,
+            'Content-Type': 'application/json'}
+
+
+def test_v3_signature():
+    service = HubSpotService(client_secret='hs-secret')
+    url = 'https://example.com/hubspot/webhook/1'
+    headers = _sign(url, '[]')
+
+    assert service.verify_webhook_signature('POST', url, b'[]', headers)
+    assert not service.verify_webhook_signature('POST', url, b'[{}]', headers)
+    assert not service.verify_webhook_signature('POST', 'http://example.com/hubspot/webhook/1', b'[]', headers)
+    stale = _sign(url, '[]', timestamp=int(time.time() * 1000) - 10 * 60 * 1000)
+    assert not service.verify_webhook_signature('POST', url, b'[]', stale)
+
+
+def test_webhook_behind_proxy_is_verified_against_public_url(client, make_integration):
+    integration = make_integration()
+    body = json.dumps([{'objectId': 42, 'subscriptionType': 'contact.propertyChange', 'occurredAt': 1000}])
+    url = f'https://integrations.example.com/hubspot/webhook/{integration.id}'
+    headers = dict(_sign(url, body), **{'X-Forwarded-Proto': 'https', 'X-Forwarded-Host': 'integrations.example.com'})
+
+    response = client.post(f'/hubspot/webhook/{integration.id}', data=body, headers=headers)
+
+    assert response.status_code == 200
+    assert response.get_json()['queued'] == 1
+    assert WebhookEvent.query.one().attempts == 0
+
+
+def test_webhook_rejects_bad_signature(client, make_integration):
+    integration = make_integration()
+    body = json.dumps([{'objectId': 42}])
+    headers = _sign(f'http://localhost/hubspot/webhook/{integration.id}', body, secret='other')
+
+    response = client.post(f'/hubspot/webhook/{integration.id}', data=body, headers=headers)
+
+    assert response.status_code == 401
+
+
+def test_webhook_rejects_malformed_payload(client, make_integration):
+    integration = make_integration()
+    url = f'http://localhost/hubspot/webhook/{integration.id}'
+    for body in ('"text"', '[1, 2]', '[{"objectId": {"nested": 1}}]', '[{"objectId": 1, "occurredAt": "x"}]'):
+        response = client.post(f'/hubspot/webhook/{integration.id}', data=body, headers=_sign(url, body))
+        assert response.status_code == 400, body
+    assert WebhookEvent.query.count() == 0
+
+
+def _queue(db, integration_id, object_id):
+    event = WebhookEvent(integration_id=integration_id, object_id=str(object_id), event_type='contact.propertyChange')
+    db.session.add(event)
+    db.session.commit()
+    return event
+
+
+def test_claimed_events_are_not_claimed_twice(db, make_integration):
+    integration = make_integration()
+    for object_id in range(3):
+        _queue(db, integration.id, object_id)
+
+    _, first = claim_webhook_events()
+    _, second = claim_webhook_events()
+
+    assert len(first) == 3
+    assert second == []
+
+
+def test_deleting_an_integration_drops_its_queued_events(client, db, make_integration):
+    doomed = make_integration().id
+    kept = make_integration().id
+    for integration_id in (doomed, kept):
+        _queue(db, integration_id, 'obj-1')
+
+    response = client.delete(f"/integration/{doomed}")
+
+    assert response.status_code == 200
+    assert [event.integration_id for event in WebhookEvent.query] == [kept]
+    _, claimed = claim_webhook_events()
+    assert [event.integration_id for event in claimed] == [kept]
+
+
+def test_failed_objects_are_retried_then_dead_lettered(db, make_integration, monkeypatch):
+    integration = make_integration()
+    _queue(db, integration.id, 'ok')
+    _queue(db, integration.id, 'bad')
+
+    def apply(integration_id, by_object, failed=None):
+        failed.append('bad')
+        return {'status': 'success'}
+    monkeypatch.setattr(sync_service, '_apply_webhook_events', apply)
+
+    drain_webhook_queue()
+
+    ok = WebhookEvent.query.filter_by(object_id='ok').one()
+    bad = WebhookEvent.query.filter_by(object_id='bad').one()
+    assert ok.processed_at is not None
+    assert bad.processed_at is None and bad.failed_at is None
+    assert bad.attempts == 1 and bad.lease_until > datetime.utcnow()
+
+    # Not due yet
+    assert drain_webhook_queue() == {}
+
+    for _ in range(WEBHOOK_MAX_ATTEMPTS - 1):
+        WebhookEvent.query.filter_by(id=bad.id).update({'lease_until': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+        drain_webhook_queue()
+
+    db.session.refresh(bad)
+    assert bad.attempts == WEBHOOK_MAX_ATTEMPTS
+    assert bad.failed_at is not None
+    assert bad.last_error
+
+
+def test_failing_integration_does_not_block_others(db, make_integration, monkeypatch):
+    broken = make_integration()
+    healthy = make_integration()
+    for object_id in range(5):
+        _queue(db, broken.id, object_id)
+    _queue(db, healthy.id, 'h1')
+
+    def apply(integration_id, by_object, failed=None):
+        if integration_id == broken.id:
+            raise RuntimeError('Alchemy unreachable')
+        return {'status': 'success'}
+    monkeypatch.setattr(sync_service, '_apply_webhook_events', apply)
+
+    # A drain small enough to only take the broken integration's events
+    results = drain_webhook_queue(limit=5)
+    assert results[broken.id]['status'] == 'error'
+
+    results = drain_webhook_queue(limit=5)
+    assert results == {healthy.id: {'status': 'success'}}
@@ -0,0 +1,132 @@
+"""
+GET /integrations keyset pagination and filters
+"""
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+
+from app.migrations import backfill_integrations, count_unmigrated_integrations, upgrade_schema
+from app.models import SalesforceIntegration
+
+
+def _all_pages(client, **params):
+    """Follow next_cursor to the end; returns the listed ids and the number of pages"""
+    ids = []
+    pages = 0
+    cursor = None
+    while True:
+        query = dict(params, cursor=cursor) if cursor else params
+        response = client.get('/integrations', query_string=query)
+        assert response.status_code == 200
+        payload = response.get_json()
+        ids.extend(item['id'] for item in payload['integrations'])
+        pages += 1
+        cursor = payload['next_cursor']
+        if not cursor:
+            return ids, pages
+
+
+def _set_updated_at(db, integration_id, value):
+    db.session.execute(
+        SalesforceIntegration.__table__.update()
+        .where(SalesforceIntegration.id == integration_id)
+        .values(updated_at=value)
+    )
+    db.session.commit()
+
+
+def test_pages_by_id_cover_every_row_once(client, make_integration):
+    created = [make_integration().id for _ in range(5)]
+
+    ids, pages = _all_pages(client, limit=2)
+    assert ids == created
+    assert pages == 3
+
+    ids, _ = _all_pages(client, limit=2, order='desc')
+    assert ids == list(reversed(created))
+
+
+def test_pages_by_updated_at_break_ties_on_id(client, db, make_integration):
+    created = [make_integration().id for _ in range(5)]
+    stamps = [datetime(2024, 1, 2), datetime(2024, 1, 1), datetime(2024, 1, 2), datetime(2024, 1, 2),
+              datetime(2024, 1, 3)]
+    for integration_id, stamp in zip(created, stamps):
+        _set_updated_at(db, integration_id, stamp)
+
+    ids, _ = _all_pages(client, limit=2, sort='updated_at', order='desc')
+
+    expected = [i for _, i in sorted(zip(stamps, created), reverse=True)]
+    assert ids == expected
+
+
+def test_cursor_keeps_filters(client, make_integration):
+    active = [make_integration().id for _ in range(3)]
+    make_integration(is_active=False)
+
+    ids, pages = _all_pages(client, limit=1, active='true', platform='hubspot')
+
+    assert ids == active
+    assert pages == 3
+
+
+def test_invalid_cursor_is_rejected(client, make_integration):
+    make_integration()
+
+    response = client.get('/integrations', query_string={'cursor': 'not-a-cursor'})
+
+    assert response.status_code == 400
+
+
+def test_unmigrated_rows_are_backfilled_for_filters(client, db, make_integration):
+    integration_id = make_integration().id
+    db.session.execute(
+        SalesforceIntegration.__table__.update()
+        .where(SalesforceIntegration.id == integration_id)
+        .values(platform=None, tenant_id=None)
+    )
+    db.session.commit()
+    assert _all_pages(client, platform='hubspot')[0] == []
+    assert count_unmigrated_integrations() == 1
+
+    assert backfill_integrations()['migrated'] == 1
+    assert count_unmigrated_integrations() == 0
+
+    assert _all_pages(client, platform='hubspot')[0] == [integration_id]
+
+
+def test_upgrade_fills_null_updated_at(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE salesforce_integrations (id INTEGER PRIMARY KEY, alchemy_base_url VARCHAR(255), "
+            "alchemy_api_key VARCHAR(255), salesforce_username VARCHAR(255), field_mappings JSON, "
+            "sync_frequency VARCHAR(50), is_active BOOLEAN, created_at DATETIME, updated_at DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO salesforce_integrations (id, created_at, updated_at) VALUES "
+            "(1, '2024-01-01 00:00:00', NULL), (2, NULL, NULL), (3, '2024-01-01 00:00:00', '2024-02-01 00:00:00')"
+        ))
+
+    upgrade_schema(engine)
+
+    with engine.connect() as conn:
+        rows = dict(conn.execute(text("SELECT id, updated_at FROM salesforce_integrations")).fetchall())
+    # Stored like the values SQLAlchemy writes, microseconds included
+    assert rows[1] == '2024-01-01 00:00:00.000000'
+    assert datetime.strptime(rows[2], '%Y-%m-%d %H:%M:%S.%f')
+    assert rows[3] == '2024-02-01 00:00:00.000000'
+
+
+def test_pages_through_many_rows_with_a_backfilled_updated_at(client, db, make_integration):
+    created = [make_integration().id for _ in range(7)]
+    # As left by an older backfill: SQLite's CURRENT_TIMESTAMP has whole seconds only
+    db.session.execute(text("UPDATE salesforce_integrations SET updated_at = '2024-01-01 00:00:00'"))
+    db.session.commit()
+
+    upgrade_schema(db.engine)
+
+    ids, pages = _all_pages(client, limit=2, sort='updated_at')
+    assert ids == created
+    assert pages == 4
+    ids, _ = _all_pages(client, limit=3, sort='updated_at', order='desc')
+    assert ids == list(reversed(created))
@@ -0,0 +1,82 @@
+"""
+Fair job runner caps, and the resources scheduled syncs occupy
+"""
+import threading
+import time
+
+from conftest import hubspot_config
+from services import sync_service
+from services.job_runner import FairJobRunner, PRIORITY_BACKFILL
+
+
+class ConcurrencyProbe:
+    """Job function that records how many jobs of each key ran at once"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+        self.order = []
+
+    def __call__(self, key, name):
+        with self.lock:
+            self.running[key] = self.running.get(key, 0) + 1
+            self.peak[key] = max(self.peak.get(key, 0), self.running[key])
+            self.order.append(name)
+        time.sleep(0.05)
+        with self.lock:
+            self.running[key] -= 1
+        return name
+
+
+def test_resource_with_cap_one_runs_jobs_one_at_a_time():
+    probe = ConcurrencyProbe()
+    runner = FairJobRunner(workers=4, caps={'integration:1': 1}, default_cap=4)
+    for direction in ('pull', 'push'):
+        runner.submit(f"1:{direction}", ('alchemy:acme', 'hubspot:portal-1', 'integration:1'), probe,
+                      args=('integration:1', direction))
+        runner.submit(f"2:{direction}", ('alchemy:acme', 'hubspot:portal-1', 'integration:2'), probe,
+                      args=('integration:2', direction))
+
+    results = runner.run()
+
+    assert len(results) == 4
+    assert probe.peak['integration:1'] == 1
+    assert probe.peak['integration:2'] == 2
+
+
+def test_tenants_share_workers_and_incremental_goes_first():
+    probe = ConcurrencyProbe()
+    runner = FairJobRunner(workers=1, default_cap=1)
+    runner.submit('big:backfill', ('alchemy:big',), probe, args=('big', 'big:backfill'), priority=PRIORITY_BACKFILL)
+    for index in range(2):
+        runner.submit(f"big:{index}", ('alchemy:big',), probe, args=('big', f"big:{index}"))
+    runner.submit('small:0', ('alchemy:small',), probe, args=('small', 'small:0'))
+
+    runner.run()
+
+    assert probe.order == ['big:0', 'small:0', 'big:1', 'big:backfill']
+
+
+def test_scheduled_syncs_occupy_portal_and_integration(app, db, make_integration, monkeypatch):
+    first = make_integration(hubspot_config(access_token='token-1'))
+    second = make_integration(hubspot_config(access_token='token-2'))
+    submitted = {}
+
+    class RecordingRunner(FairJobRunner):
+        def submit(self, name, resources, func, args=(), priority=0):
+            submitted[name] = (tuple(resources), self.caps.get(resources[-1]))
+            return super().submit(name, resources, func, args, priority)
+
+    class PortalService:
+        # Both tokens belong to one portal
+        portal_key = 'portal-42'
+
+    monkeypatch.setattr(sync_service, 'FairJobRunner', RecordingRunner)
+    monkeypatch.setattr(sync_service, 'get_hubspot_service', lambda **kwargs: PortalService())
+    monkeypatch.setattr(sync_service, '_run_integration', lambda direction, integration_id: {'status': 'success'})
+
+    results = sync_service.run_scheduled_syncs()
+
+    assert len(results) == 4
+    assert submitted[f"{first.id}:pull"] == (('alchemy:acme', 'hubspot:portal-42', f"integration:{first.id}"), 1)
+    assert submitted[f"{second.id}:push"] == (('alchemy:acme', 'hubspot:portal-42', f"integration:{second.id}"), 1)
@@ -0,0 +1,50 @@
+"""
+Sampled payload logging through the non-formatting queue handler
+"""
+import logging
+import queue
+
+from app.logging_utils import NonFormattingQueueHandler, log_payload
+
+
+def _queued_logger(name):
+    records = queue.Queue()
+    logger = logging.getLogger(name)
+    logger.handlers = [NonFormattingQueueHandler(records)]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger, records
+
+
+def test_payload_is_logged_as_it_was_at_the_call(app):
+    logger, records = _queued_logger('tests.payload_snapshot')
+    payload = {'config': {'alchemy': {'tenant_id': 'acme', 'refresh_token': 'secret'}}, 'mappings': [1]}
+
+    with app.app_context():
+        log_payload(logger, 'snapshot-test', "Received", payload)
+    # The request keeps working on its payload before the listener formats the record
+    payload['config']['alchemy']['tenant_id'] = 'changed'
+    payload['mappings'].append(2)
+
+    message = records.get_nowait().getMessage()
+    assert '"tenant_id": "acme"' in message
+    assert '"mappings": [1]' in message
+    assert 'secret' not in message
+
+
+def test_payloads_are_sampled_per_endpoint(app):
+    logger, records = _queued_logger('tests.payload_sampling')
+    app.config['LOG_PAYLOAD_SAMPLE_RATE'] = 3
+    try:
+        with app.app_context():
+            for index in range(7):
+                log_payload(logger, 'sampling-test', "Call", {'index': index})
+    finally:
+        app.config['LOG_PAYLOAD_SAMPLE_RATE'] = 100
+
+    logged = []
+    while not records.empty():
+        logged.append(records.get_nowait().getMessage())
+    assert len(logged) == 3
+    for message, index in zip(logged, (0, 3, 6)):
+        assert message.endswith(f'{{"index": {index}}}')
@@ -0,0 +1,85 @@
+"""
+Metric snapshots: merging across processes and the Prometheus text format
+"""
+import json
+import os
+
+from services import metrics
+
+
+def _counter(samples, labelnames=('route',)):
+    return {'type': 'counter', 'help': 'Requests', 'labelnames': list(labelnames), 'buckets': [], 'samples': samples}
+
+
+def _histogram(samples, buckets=(0.1, 1.0)):
+    return {'type': 'histogram', 'help': 'Latency', 'labelnames': ['route'], 'buckets': list(buckets),
+            'samples': samples}
+
+
+def test_merge_sums_counters_and_histograms():
+    target = {
+        'requests_total': _counter([[['/a'], 2]]),
+        'latency_seconds': _histogram([[['/a'], [[1, 0], 0.05, 1]]])
+    }
+    source = {
+        'requests_total': _counter([[['/a'], 3], [['/b'], 1]]),
+        'latency_seconds': _histogram([[['/a'], [[0, 2], 1.5, 2]]]),
+        'new_total': _counter([[[], 7]], labelnames=())
+    }
+
+    merged = metrics.merge(target, source)
+
+    assert dict((tuple(k), v) for k, v in merged['requests_total']['samples']) == {('/a',): 5, ('/b',): 1}
+    assert merged['latency_seconds']['samples'] == [[['/a'], [[1, 2], 1.55, 3]]]
+    assert merged['new_total']['samples'] == [[[], 7]]
+    # The source snapshot is left as it was
+    assert source['requests_total']['samples'] == [[['/a'], 3], [['/b'], 1]]
+
+
+def test_snapshot_round_trips_through_merge():
+    counter = metrics.Counter('test_round_trip_total', 'Round trip', ('kind',))
+    counter.inc(kind='x')
+    counter.inc(2, kind='x')
+    histogram = metrics.Histogram('test_round_trip_seconds', 'Round trip', ('kind',), buckets=(1.0, 5.0))
+    histogram.observe(0.5, kind='x')
+    histogram.observe(10.0, kind='x')
+
+    assert counter.samples() == [[['x'], 3]]
+    # Values above the last bucket only count towards +Inf
+    assert histogram.samples() == [[['x'], [[1, 0], 10.5, 2]]]
+
+
+def test_render_writes_cumulative_buckets_and_escapes_labels(monkeypatch):
+    monkeypatch.setattr(metrics, 'collect', lambda: {
+        'requests_total': _counter([[['/a "quoted"\n'], 4]]),
+        'latency_seconds': _histogram([[['/a'], [[1, 2], 1.25, 4]]])
+    })
+
+    lines = metrics.render().splitlines()
+
+    assert '# TYPE requests_total counter' in lines
+    assert 'requests_total{route="/a \\"quoted\\"\\n"} 4' in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{route="/a"} 1.25' in lines
+    assert 'latency_seconds_count{route="/a"} 4' in lines
+
+
+def test_collect_folds_exited_processes_into_the_archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, '_multiproc_dir', str(tmp_path))
+    monkeypatch.setattr(metrics, '_snapshot_file', str(tmp_path / 'metrics-1-0.json'))
+    monkeypatch.setattr(metrics, 'snapshot', lambda: {'jobs_total': _counter([[['live'], 1]])})
+    monkeypatch.setattr(metrics, '_pid_alive', lambda pid: pid == 1)
+    for pid, count in ((2, 5), (3, 7)):
+        with open(tmp_path / f"metrics-{pid}-0.json", 'w') as handle:
+            json.dump({'jobs_total': _counter([[['done'], count]])}, handle)
+
+    first = metrics.collect()
+    second = metrics.collect()
+
+    expected = {('live',): 1, ('done',): 12}
+    assert dict((tuple(k), v) for k, v in first['jobs_total']['samples']) == expected
+    # Exited snapshots are archived once, so totals stay the same
+    assert dict((tuple(k), v) for k, v in second['jobs_total']['samples']) == expected
+    assert set(os.listdir(tmp_path)) == {metrics.ARCHIVE_FILE, metrics.LOCK_FILE, 'metrics-1-0.json'}
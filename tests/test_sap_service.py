@@ -0,0 +1,126 @@
+"""
+SAP OData client against the stand-in OData server
+"""
+import pytest
+
+from services import sap_service
+from services.sap_odata_stub import start_stub_server
+from services.sap_service import format_key_literal, get_sap_service
+
+CREDENTIALS = ('LIMS_USER', 'secret')
+
+
+@pytest.fixture
+def stub():
+    server, base_url = start_stub_server(credentials=CREDENTIALS)
+    yield server, base_url
+    server.shutdown()
+    server.server_close()
+
+
+def _service(base_url, secret='secret', batch_size=None):
+    return get_sap_service(base_url=base_url, client_id='LIMS_USER', client_secret=secret, batch_size=batch_size)
+
+
+@pytest.mark.parametrize('value, edm_type, expected', [
+    ("O'Brien", 'Edm.String', "'O''Brien'"),
+    (42, 'Edm.Int32', '42'),
+    ('42', 'Edm.Int32', '42'),
+    (7, 'Edm.Int64', '7L'),
+    ('1.50', 'Edm.Decimal', '1.50M'),
+    ('0c2a6f0e-0000-4000-8000-000000000000', 'Edm.Guid', "guid'0c2a6f0e-0000-4000-8000-000000000000'"),
+    (True, 'Edm.Boolean', 'true'),
+])
+def test_format_key_literal(value, edm_type, expected):
+    assert format_key_literal(value, edm_type) == expected
+
+
+@pytest.mark.parametrize('value, edm_type', [
+    ("1) or (1", 'Edm.Int32'),
+    ('nan', 'Edm.Decimal'),
+    (True, 'Edm.Int32'),
+])
+def test_format_key_literal_rejects_non_numbers(value, edm_type):
+    with pytest.raises(ValueError):
+        format_key_literal(value, edm_type)
+
+
+def test_format_key_predicate_uses_metadata_types():
+    entity_type = {
+        'keys': ['Order', 'Item'],
+        'properties': [{'name': 'Order', 'type': 'Edm.String'}, {'name': 'Item', 'type': 'Edm.Int32'}]
+    }
+    predicate = sap_service.format_key_predicate(entity_type, {'Order': 'A 1', 'Item': 10})
+    assert predicate == "(Order='A%201',Item=10)"
+
+
+def test_write_records_creates_then_merges(stub):
+    server, base_url = stub
+    service = _service(base_url, batch_size=2)
+    records = [
+        {'ResultId': "O'Brien-1", 'Value': '1.5'},
+        {'ResultId': 'R-2', 'Value': '2'},
+        {'ResultId': 'R-3', 'Value': '3'}
+    ]
+
+    results = service.write_records('Results', records)
+
+    assert [r['status'] for r in results] == [201, 201, 201]
+    assert server.state.entities["O'Brien-1"]['Value'] == '1.5'
+
+    results = service.write_records('Results', [{'ResultId': "O'Brien-1", 'Value': '9'},
+                                                {'ResultId': 'R-4', 'Value': '4'}])
+
+    assert [r['status'] for r in results] == [204, 201]
+    assert server.state.entities["O'Brien-1"]['Value'] == '9'
+    assert set(server.state.entities) == {"O'Brien-1", 'R-2', 'R-3', 'R-4'}
+
+
+def test_failed_changeset_fails_every_record(stub):
+    server, base_url = stub
+    results = _service(base_url).write_records('Results', [{'ResultId': 'R-1'}, {'Value': 'no key'}])
+
+    assert [r['status'] for r in results] == [400, 400]
+    assert not server.state.entities
+
+
+def test_metadata_is_cached_per_credentials(stub):
+    server, base_url = stub
+    _service(base_url).get_entity_sets()
+    _service(base_url).get_fields_for_entity_set('Results')
+    assert server.state.request_counts['metadata'] == 1
+
+    is_valid, _ = _service(base_url, secret='WRONG').validate_credentials()
+    assert not is_valid
+    with pytest.raises(RuntimeError):
+        _service(base_url, secret='WRONG').get_entity_sets()
+
+
+def test_wrong_secret_does_not_evict_the_valid_session(stub):
+    server, base_url = stub
+    good = _service(base_url)
+    good.get_entity_sets()
+
+    is_valid, _ = _service(base_url, secret='WRONG').validate_credentials()
+
+    assert not is_valid
+    assert good.cache_key in sap_service._sessions
+    assert sap_service._session_key(base_url, 'LIMS_USER', 'WRONG') not in sap_service._sessions
+    assert _service(base_url).session is good.session
+    _service(base_url).get_entity_sets()
+    assert server.state.request_counts['metadata'] == 1
+
+
+def test_write_route(client, stub):
+    server, base_url = stub
+    response = client.post('/sap/records', json={
+        'base_url': base_url, 'client_id': 'LIMS_USER', 'client_secret': 'secret',
+        'entity_set': 'Results', 'records': [{'ResultId': 'R-1', 'Unit': 'mg'}]
+    })
+
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'success'
+    assert server.state.entities['R-1']['Unit'] == 'mg'
+
+    response = client.post('/sap/records', json={'base_url': base_url, 'entity_set': 'Results', 'records': 'x'})
+    assert response.status_code == 400
@@ -0,0 +1,90 @@
+"""
+Database-backed sessions: the cookie carries a signed ID, the data lives in server_sessions
+"""
+from datetime import datetime, timedelta
+
+from app.models import ServerSession
+from app.sessions import cleanup_expired_sessions
+
+
+def _cookie(client, app):
+    name = app.config['SESSION_COOKIE_NAME']
+    return next((cookie.value for cookie in client.cookie_jar if cookie.name == name), None)
+
+
+def _row(db):
+    db.session.expire_all()
+    return ServerSession.query.one()
+
+
+def test_data_is_stored_server_side(app, client, db):
+    with client.session_transaction() as session:
+        session['tokens'] = {'acme': 'refresh-secret'}
+
+    row = _row(db)
+    cookie = _cookie(client, app)
+    assert cookie.startswith(row.id + '.')
+    assert 'refresh-secret' not in cookie
+    assert 'refresh-secret' in row.data
+
+    with client.session_transaction() as session:
+        assert session['tokens'] == {'acme': 'refresh-secret'}
+
+
+def test_unchanged_session_is_not_rewritten(client, db):
+    with client.session_transaction() as session:
+        session['tenant'] = 'acme'
+    expires_at = _row(db).expires_at
+
+    with client.session_transaction() as session:
+        assert session['tenant'] == 'acme'
+
+    assert _row(db).expires_at == expires_at
+
+
+def test_expiry_is_extended_after_half_the_lifetime(app, client, db):
+    with client.session_transaction() as session:
+        session['tenant'] = 'acme'
+    row = _row(db)
+    row.expires_at = datetime.utcnow() + app.permanent_session_lifetime / 4
+    db.session.commit()
+
+    with client.session_transaction() as session:
+        assert session['tenant'] == 'acme'
+
+    assert _row(db).expires_at > datetime.utcnow() + app.permanent_session_lifetime * 3 / 4
+
+
+def test_tampered_cookie_starts_a_new_session(app, client, db):
+    with client.session_transaction() as session:
+        session['tenant'] = 'acme'
+    sid = _row(db).id
+    client.set_cookie('localhost', app.config['SESSION_COOKIE_NAME'], sid + '.forged-signature')
+
+    with client.session_transaction() as session:
+        assert 'tenant' not in session
+
+
+def test_expired_sessions_are_ignored_and_cleaned_up(client, db):
+    with client.session_transaction() as session:
+        session['tenant'] = 'acme'
+    row = _row(db)
+    row.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    with client.session_transaction() as session:
+        assert 'tenant' not in session
+
+    assert cleanup_expired_sessions() == 1
+    assert ServerSession.query.count() == 0
+
+
+def test_emptied_session_is_deleted(app, client, db):
+    with client.session_transaction() as session:
+        session['tenant'] = 'acme'
+
+    with client.session_transaction() as session:
+        session.clear()
+
+    assert ServerSession.query.count() == 0
+    assert _cookie(client, app) is None
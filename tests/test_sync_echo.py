@@ -0,0 +1,184 @@
+"""
+HubSpot batch results are matched by trace ID, sync echoes are skipped, and pushes page by keyset
+"""
+from app.models import RecordLink, BatchSize
+from services import sync_service
+from services.hubspot_service import HubSpotService
+from services.record_batch import RecordBatch
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.payload = payload
+        self.text = str(payload)
+
+    def json(self):
+        return self.payload
+
+
+def test_batch_create_matches_results_by_trace_id(monkeypatch):
+    service = HubSpotService(access_token='hs-token')
+
+    def request(method, url, **kwargs):
+        inputs = kwargs['json']['inputs']
+        # HubSpot does not promise input order
+        return FakeResponse(201, {'results': [
+            {'id': f"hs-{item['properties']['firstname']}", 'objectWriteTraceId': item['objectWriteTraceId'],
+             'updatedAt': '2024-01-01T00:00:00Z'}
+            for item in reversed(inputs)
+        ]})
+    monkeypatch.setattr(service, 'request', request)
+
+    results = service.batch_write('contact', 'create', [
+        {'properties': {'firstname': 'a'}},
+        {'properties': {'firstname': 'b'}, 'objectWriteTraceId': 'rec-b'},
+        {'properties': {'firstname': 'c'}}
+    ])
+
+    assert [r['id'] for r in results] == ['hs-a', 'hs-b', 'hs-c']
+    assert all(r['updated_at'] == '2024-01-01T00:00:00Z' for r in results)
+
+
+def test_batch_create_reports_missing_results(monkeypatch):
+    service = HubSpotService(access_token='hs-token')
+    monkeypatch.setattr(service, 'request', lambda method, url, **kwargs: FakeResponse(207, {'results': [
+        {'id': '9', 'objectWriteTraceId': '1'}
+    ]}))
+
+    results = service.batch_write('contact', 'create', [{'properties': {}}, {'properties': {}}])
+
+    assert [r['success'] for r in results] == [False, True]
+    assert results[1]['id'] == '9'
+
+
+class FakeHubSpot:
+    def __init__(self):
+        self.writes = []
+
+    def batch_write(self, object_type, action, inputs, sizer=None):
+        self.writes.append((action, inputs))
+        return [{'id': item.get('id', 'new'), 'success': True, 'message': action, 'updated_at': '1700000000000'}
+                for item in inputs]
+
+
+def test_push_skips_records_unchanged_since_pull(db, make_integration):
+    integration = make_integration()
+    db.session.add(RecordLink(integration_id=integration.id, alchemy_record_id='r1', platform_record_id='p1',
+                              pulled_hash=sync_service._values_hash({'Name': 'Ada'})))
+    db.session.add(RecordLink(integration_id=integration.id, alchemy_record_id='r2', platform_record_id='p2',
+                              pulled_hash=sync_service._values_hash({'Name': 'Bob'})))
+    db.session.commit()
+    batch = RecordBatch(['Name'])
+    batch.append('r1', {'Name': 'Ada'})
+    batch.append('r2', {'Name': 'Robert'})
+    service = FakeHubSpot()
+
+    summary = sync_service.load_to_hubspot(integration.id, service, 'contact', batch, {'Name': 'firstname'})
+
+    assert summary == {'updated': 1, 'created': 0, 'skipped': 1, 'failed': 0}
+    assert service.writes == [('update', [{'id': 'p2', 'properties': {'firstname': 'Robert'}}])]
+    link = RecordLink.query.filter_by(alchemy_record_id='r2').one()
+    assert link.platform_modified_at == 1700000000000
+
+
+class FakeWriter:
+    queued = []
+
+    def __init__(self, *args, **kwargs):
+        FakeWriter.queued = []
+
+    def queue_update(self, record_type, record_id, fields):
+        FakeWriter.queued.append(record_id)
+
+    def queue_create(self, record_type, fields, key=None):
+        FakeWriter.queued.append(key)
+
+    def flush(self):
+        return [{'key': key, 'success': True, 'action': 'update', 'record_id': key, 'message': ''}
+                for key in FakeWriter.queued]
+
+
+def test_pull_skips_objects_last_modified_by_push(db, make_integration, monkeypatch):
+    integration = make_integration()
+    db.session.add(RecordLink(integration_id=integration.id, alchemy_record_id='r1', platform_record_id='p1',
+                              platform_modified_at=5000))
+    db.session.add(RecordLink(integration_id=integration.id, alchemy_record_id='r2', platform_record_id='p2',
+                              platform_modified_at=5000))
+    db.session.commit()
+    monkeypatch.setattr(sync_service, 'AlchemyRecordWriter', FakeWriter)
+    batch = RecordBatch(['firstname'])
+    batch.append('p1', {'firstname': 'Ada'}, 5000)
+    batch.append('p2', {'firstname': 'Bob'}, 6000)
+
+    summary = sync_service.apply_to_alchemy(integration.id, 'token', 'acme', 'Result', batch,
+                                            {'firstname': 'Name'})
+
+    assert summary == {'updated': 1, 'created': 0, 'skipped': 1, 'failed': 0}
+    assert FakeWriter.queued == ['r2']
+
+
+def _record(record_id, changed_on):
+    return {'id': record_id, 'lastChangedOn': changed_on, 'fields': [{'identifier': 'Name', 'value': record_id}]}
+
+
+def test_push_pages_by_keyset_when_records_change_mid_run(db, make_integration, monkeypatch):
+    integration = make_integration()
+    db.session.add(BatchSize(integration_id=integration.id, channel='alchemy_fetch', size=10))
+    db.session.commit()
+    # Many records share a timestamp, so pages start inside a run of ties
+    store = [_record(f"r{i:02d}", f"2024-01-0{1 + i // 8}T00:00:00Z") for i in range(30)]
+    requests_made = []
+
+    def iter_records(access_token, record_type, fields, drop=0, take=100, changed_from=None, changed_to=None,
+                     query_term=None, tenant_id=None):
+        requests_made.append((changed_from, drop))
+        matching = sorted((r for r in store if changed_from <= r['lastChangedOn'] <= changed_to),
+                          key=lambda r: r['lastChangedOn'])
+        page = [dict(r) for r in matching[drop:drop + take]]
+        if len(requests_made) == 1:
+            # A record already pushed is edited again and leaves the run's window
+            store[0]['lastChangedOn'] = '2999-01-01T00:00:00Z'
+        return iter(page)
+
+    pushed = []
+
+    def load(integration_id, service, object_type, batch, field_map, sizer=None, failed=None):
+        pushed.extend(batch.ids)
+        return {'updated': len(batch), 'created': 0, 'skipped': 0, 'failed': 0}
+
+    monkeypatch.setattr(sync_service, 'get_alchemy_access_token', lambda *args: 'token')
+    monkeypatch.setattr(sync_service, 'get_hubspot_service', lambda **kwargs: FakeHubSpot())
+    monkeypatch.setattr(sync_service, 'iter_alchemy_records', iter_records)
+    monkeypatch.setattr(sync_service, 'load_to_hubspot', load)
+
+    summary = sync_service.push_alchemy_changes(integration)
+
+    assert sorted(pushed) == [f"r{i:02d}" for i in range(30)]
+    assert len(pushed) == 30
+    assert summary['pages'] > 1
+    assert requests_made[1][0] > requests_made[0][0]
+    state = sync_service._get_sync_state(integration.id, 'push')
+    assert state.cursor is None
+
+
+def test_push_restarts_window_of_offset_cursor(db, make_integration, monkeypatch):
+    integration = make_integration()
+    state = sync_service._get_sync_state(integration.id, 'push')
+    state.cursor = '{"from": "2024-01-01T00:00:00Z", "to": "2024-02-01T00:00:00Z", "drop": 40, "oldest_failed": null}'
+    db.session.commit()
+    calls = []
+
+    def iter_records(access_token, record_type, fields, drop=0, take=100, changed_from=None, changed_to=None,
+                     query_term=None, tenant_id=None):
+        calls.append((changed_from, changed_to, drop))
+        return iter([])
+
+    monkeypatch.setattr(sync_service, 'get_alchemy_access_token', lambda *args: 'token')
+    monkeypatch.setattr(sync_service, 'get_hubspot_service', lambda **kwargs: FakeHubSpot())
+    monkeypatch.setattr(sync_service, 'iter_alchemy_records', iter_records)
+
+    sync_service.push_alchemy_changes(integration)
+
+    assert calls == [('2024-01-01T00:00:00Z', '2024-02-01T00:00:00Z', 0)]
+    assert sync_service._get_sync_state(integration.id, 'push').watermark == '2024-02-01T00:00:00Z'
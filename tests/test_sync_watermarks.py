@@ -0,0 +1,61 @@
+"""
+Sync watermarks never move past records that failed to write
+"""
+from services import sync_service
+from services.sync_service import pull_hubspot_changes
+
+
+class FakeSearchService:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def search_modified_since(self, object_type, since, properties, after=None):
+        index = int(after or 0)
+        next_after = str(index + 1) if index + 1 < len(self.pages) else None
+        return self.pages[index], next_after
+
+
+def _contact(object_id, modified):
+    return {'id': object_id, 'properties': {'firstname': object_id, 'lastmodifieddate': str(modified)}}
+
+
+def test_pull_watermark_holds_at_oldest_failure(db, make_integration, monkeypatch):
+    integration = make_integration()
+    service = FakeSearchService([
+        [_contact('1', 1000), _contact('2', 2000)],
+        [_contact('3', 3000), _contact('4', 4000)]
+    ])
+    monkeypatch.setattr(sync_service, '_hubspot_pull_context', lambda integration: {
+        'service': service, 'object_type': 'contact', 'tenant_id': 'acme', 'record_type': 'Result',
+        'access_token': 'token', 'field_map': {'firstname': 'Name'}, 'properties': ['firstname'],
+        'modified_property': 'lastmodifieddate'
+    })
+
+    def apply(integration_id, access_token, tenant_id, record_type, batch, field_map, failed=None):
+        # Object 2 and 4 fail
+        for object_id in batch.ids:
+            if object_id in ('2', '4'):
+                failed.append(object_id)
+        return {'updated': 0, 'created': len(batch) - 1, 'failed': 1}
+    monkeypatch.setattr(sync_service, 'apply_to_alchemy', apply)
+
+    summary = pull_hubspot_changes(integration)
+
+    assert summary['failed'] == 2
+    assert sync_service._get_sync_state(integration.id, 'pull').watermark == '2000'
+
+
+def test_pull_watermark_advances_without_failures(db, make_integration, monkeypatch):
+    integration = make_integration()
+    service = FakeSearchService([[_contact('1', 1000), _contact('2', 2000)]])
+    monkeypatch.setattr(sync_service, '_hubspot_pull_context', lambda integration: {
+        'service': service, 'object_type': 'contact', 'tenant_id': 'acme', 'record_type': 'Result',
+        'access_token': 'token', 'field_map': {'firstname': 'Name'}, 'properties': ['firstname'],
+        'modified_property': 'lastmodifieddate'
+    })
+    monkeypatch.setattr(sync_service, 'apply_to_alchemy',
+                        lambda *args, **kwargs: {'updated': 2, 'created': 0, 'failed': 0})
+
+    pull_hubspot_changes(integration)
+
+    assert sync_service._get_sync_state(integration.id, 'pull').watermark == '2000'
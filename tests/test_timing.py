@@ -0,0 +1,57 @@
+"""
+Server-Timing header and debug_timing block
+"""
+import pytest
+
+from app.timing import server_timing_header
+
+
+@pytest.fixture
+def admin_token(app):
+    app.config['ADMIN_API_TOKEN'] = 'operator-token'
+    yield 'operator-token'
+    app.config['ADMIN_API_TOKEN'] = ''
+
+
+TIMING = {
+    'total_ms': 120.0, 'upstream_ms': 80.0, 'db_ms': 10.0, 'app_ms': 30.0, 'db_queries': 2,
+    'upstream': {'hubspot crm/objects/contacts': {'duration_ms': 80.0, 'count': 2}},
+    'spans': [], 'dropped_spans': 0
+}
+
+
+def test_detailed_header_names_upstream_endpoints():
+    header = server_timing_header(TIMING)
+
+    assert header.startswith('hubspot-crm-objects-contacts;dur=80.0;desc="hubspot crm/objects/contacts x2"')
+    assert 'db;dur=10.0;desc="2 queries"' in header
+    assert header.endswith('total;dur=120.0')
+
+
+def test_aggregate_header_hides_endpoint_names():
+    header = server_timing_header(TIMING, detailed=False)
+
+    assert header.split(', ')[0] == 'upstream;dur=80.0'
+    assert 'hubspot' not in header
+
+
+def test_anonymous_callers_get_aggregates_only(client, make_integration):
+    make_integration()
+
+    response = client.get('/integrations', query_string={'debug_timing': '1'})
+
+    header = response.headers['Server-Timing']
+    assert 'total;dur=' in header and 'app;dur=' in header
+    assert 'salesforce_integrations' not in header
+    assert 'debug_timing' not in response.get_json()
+
+
+def test_operators_get_debug_timing(client, make_integration, admin_token):
+    make_integration()
+
+    response = client.get('/integrations', headers={'Authorization': f"Bearer {admin_token}",
+                                                    'X-Debug-Timing': '1'})
+
+    timing = response.get_json()['debug_timing']
+    assert timing['db_queries'] >= 1
+    assert any(span['name'] == 'SELECT salesforce_integrations' for span in timing['spans'])
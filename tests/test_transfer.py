@@ -0,0 +1,121 @@
+"""
+NDJSON export and import of integrations
+"""
+import json
+
+import pytest
+
+from app.credentials import stored_refresh_token
+from app.models import SalesforceIntegration
+
+
+@pytest.fixture
+def admin_token(app):
+    app.config['ADMIN_API_TOKEN'] = 'operator-token'
+    yield 'operator-token'
+    app.config['ADMIN_API_TOKEN'] = ''
+
+
+def _export(client, headers=None, **params):
+    response = client.get('/integrations/export', query_string=params, headers=headers or {})
+    return response, [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+
+def test_export_leaves_credentials_out_by_default(client, make_integration):
+    make_integration()
+
+    response, documents = _export(client)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    config = documents[0]['config']
+    assert 'refresh_token' not in config['alchemy']
+    assert 'access_token' not in config['hubspot'] and 'client_secret' not in config['hubspot']
+    assert config['alchemy']['tenant_id'] == 'acme'
+
+
+def test_secrets_need_the_operator_token(client, make_integration, admin_token):
+    make_integration()
+
+    assert _export(client, include_secrets='true')[0].status_code == 401
+    wrong = {'Authorization': 'Bearer guess'}
+    assert _export(client, headers=wrong, include_secrets='true')[0].status_code == 401
+
+    response, documents = _export(client, headers={'Authorization': f"Bearer {admin_token}"},
+                                  include_secrets='true')
+    assert response.status_code == 200
+    assert documents[0]['config']['alchemy']['refresh_token'] == 'alchemy-refresh'
+    assert documents[0]['config']['hubspot']['access_token'] == 'hs-token'
+
+
+def test_secrets_are_refused_without_a_configured_token(client, make_integration):
+    make_integration()
+
+    response, _ = _export(client, headers={'Authorization': 'Bearer '}, include_secrets='true')
+
+    assert response.status_code == 401
+
+
+def test_export_import_round_trip(client, db, make_integration, admin_token):
+    original = make_integration(mappings=[{'alchemy_field': 'Name', 'platform_field': 'firstname'},
+                                          {'alchemy_field': 'Email', 'platform_field': 'email'}])
+    make_integration(is_active=False)
+    _, documents = _export(client, headers={'Authorization': f"Bearer {admin_token}"}, include_secrets='true')
+    body = ''.join(json.dumps(document) + '\n' for document in documents)
+
+    response = client.post('/integrations/import', data=body, query_string={'chunk_size': 1},
+                           content_type='application/x-ndjson')
+
+    assert response.status_code == 200
+    assert response.get_json()['imported'] == 2
+    imported = SalesforceIntegration.query.filter(SalesforceIntegration.id > max(d['id'] for d in documents)) \
+        .order_by(SalesforceIntegration.id).all()
+    assert [i.is_active for i in imported] == [True, False]
+    assert imported[0].get_mappings() == original.get_mappings()
+    # Stored encrypted again, and readable with this environment's key
+    stored = imported[0].get_config()
+    assert stored['alchemy']['refresh_token'].startswith('enc:')
+    assert stored_refresh_token(stored) == 'alchemy-refresh'
+
+    # The copy exports like the original
+    _, inactive = _export(client, active='false')
+    assert len(inactive) == 2
+    assert inactive[0]['config'] == inactive[1]['config']
+
+
+def test_import_reports_bad_lines(client):
+    body = 'not json\n{"config": {}}\n\n{"config": {"platform": "hubspot"}, "mappings": []}\n'
+
+    response = client.post('/integrations/import', data=body, content_type='application/x-ndjson')
+
+    payload = response.get_json()
+    assert response.status_code == 200
+    assert payload['status'] == 'partial'
+    assert payload['imported'] == 1
+    assert [error['line'] for error in payload['errors']] == [1, 2]
+
+
+@pytest.mark.parametrize('document, message', [
+    ({'is_active': 'yes'}, 'is_active'),
+    ({'sync_frequency': 7}, 'sync_frequency'),
+    ({'created_at': 'yesterday'}, 'created_at'),
+    ({'mappings': [{'alchemy_field': 'Name', 'platform_field': 5}]}, 'mappings[0].platform_field'),
+    ({'mappings': [{'alchemy_field': 'Name', 'required': 'yes'}]}, 'mappings[0].required'),
+    ({'config': {'platform': 'hubspot', 'alchemy': {'tenant_id': 42}}}, 'config.alchemy.tenant_id')
+])
+def test_bad_values_fail_their_line_only(client, document, message):
+    valid = {'config': {'platform': 'hubspot', 'alchemy': {'tenant_id': 'acme'}},
+             'mappings': [{'alchemy_field': 'Name', 'platform_field': 'firstname'}]}
+    lines = [valid, dict(valid, **document), valid]
+    body = ''.join(json.dumps(line) + '\n' for line in lines)
+
+    response = client.post('/integrations/import', data=body, query_string={'chunk_size': 10},
+                           content_type='application/x-ndjson')
+
+    payload = response.get_json()
+    assert payload['imported'] == 2
+    assert [error['line'] for error in payload['errors']] == [2]
+    assert message in payload['errors'][0]['message']
+    imported = SalesforceIntegration.query.order_by(SalesforceIntegration.id).all()
+    assert [i.tenant_id for i in imported] == ['acme', 'acme']
+    assert all(i.get_mappings() == valid['mappings'] for i in imported)
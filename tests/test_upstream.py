@@ -0,0 +1,220 @@
+"""
+Circuit breakers per upstream and per tenant, and the half-open trial call
+"""
+import socket
+import threading
+import time
+
+import pytest
+import requests
+
+from services import upstream
+from services.upstream import FAILURE_THRESHOLD, CircuitOpenError, Deadline, DeadlineExceeded, get_breaker, \
+    upstream_request
+
+
+class FakeResponse:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """Session whose request() runs a function instead of calling out"""
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        return self.handler()
+
+
+def _open(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record(False)
+    assert breaker.state == breaker.OPEN
+
+
+def _call(name, tenant, handler):
+    return upstream_request('GET', f"https://{name}.example/x", upstream=name, tenant=tenant,
+                            session=FakeSession(handler))
+
+
+def test_outages_open_the_shared_breaker_across_tenants():
+    for index in range(FAILURE_THRESHOLD):
+        assert _call('outage-test', f"portal-{index}", lambda: FakeResponse(503)).status_code == 503
+
+    session = FakeSession(FakeResponse)
+    with pytest.raises(CircuitOpenError):
+        upstream_request('GET', 'https://outage-test.example/x', upstream='outage-test', tenant='portal-new',
+                         session=session)
+    assert session.calls == 0
+    assert upstream.breaker_states()['outage-test'] == 'open'
+
+
+def test_access_failures_only_open_the_tenants_breaker():
+    for _ in range(FAILURE_THRESHOLD):
+        assert _call('access-test', 'portal-1', lambda: FakeResponse(401)).status_code == 401
+
+    with pytest.raises(CircuitOpenError):
+        _call('access-test', 'portal-1', FakeResponse)
+    assert _call('access-test', 'portal-2', FakeResponse).status_code == 200
+    states = upstream.breaker_states()
+    assert states['access-test'] == 'closed'
+    assert states['access-test:portal-1'] == 'open'
+    assert states['access-test:portal-2'] == 'closed'
+
+
+@pytest.fixture
+def hung_upstream():
+    """Address of a socket that accepts connections and never answers"""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(16)
+    yield f"http://127.0.0.1:{server.getsockname()[1]}/x"
+    server.close()
+
+
+def test_hung_upstream_opens_the_breaker_under_a_deadline(hung_upstream):
+    for _ in range(FAILURE_THRESHOLD):
+        with pytest.raises(DeadlineExceeded):
+            upstream_request('GET', hung_upstream, upstream='hung-test', deadline=Deadline(0.4))
+
+    assert upstream.breaker_states()['hung-test'] == 'open'
+    with pytest.raises(CircuitOpenError):
+        upstream_request('GET', hung_upstream, upstream='hung-test', deadline=Deadline(0.4))
+
+
+def test_deadline_with_almost_no_time_left_is_not_an_upstream_failure(hung_upstream):
+    for _ in range(FAILURE_THRESHOLD):
+        with pytest.raises(DeadlineExceeded):
+            upstream_request('GET', hung_upstream, upstream='short-deadline-test', deadline=Deadline(0.15))
+
+    breaker = get_breaker('short-deadline-test')
+    assert breaker.state == breaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_trial_is_released_when_the_call_raises_unexpectedly():
+    breaker = get_breaker('trial-test')
+    _open(breaker)
+    breaker.opened_at -= breaker.open_seconds
+
+    def fail():
+        raise ValueError('bad response body')
+
+    with pytest.raises(ValueError):
+        upstream_request('GET', 'https://trial-test.example/x', upstream='trial-test', session=FakeSession(fail))
+
+    assert breaker.state == breaker.HALF_OPEN
+    assert not breaker.trial_in_flight
+    response = upstream_request('GET', 'https://trial-test.example/x', upstream='trial-test',
+                                session=FakeSession(FakeResponse))
+    assert response.status_code == 200
+    assert breaker.state == breaker.CLOSED
+
+
+def test_half_open_admits_one_trial_at_a_time():
+    breaker = get_breaker('single-trial-test')
+    _open(breaker)
+    breaker.opened_at -= breaker.open_seconds
+
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(False)
+    assert breaker.state == breaker.OPEN
+
+
+def _hedging_send(*attempts):
+    """Send function whose n-th call sleeps, then returns a status or raises"""
+    calls = []
+    lock = threading.Lock()
+
+    def send():
+        with lock:
+            index = len(calls)
+            calls.append(index)
+        delay, outcome = attempts[index]
+        time.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+    return send, calls
+
+
+def _fast_tracker():
+    tracker = upstream.LatencyTracker()
+    for _ in range(upstream.HEDGE_MIN_SAMPLES):
+        tracker.observe(0.01)
+    return tracker
+
+
+def test_hedge_waits_for_a_non_5xx_response():
+    send, calls = _hedging_send((0.1, 503), (0.2, 200))
+
+    response = upstream._hedged_send('hedge-5xx-test', _fast_tracker(), send)
+
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+def test_hedge_returns_a_server_error_if_both_attempts_fail():
+    send, calls = _hedging_send((0.1, 502), (0.05, 503))
+
+    response = upstream._hedged_send('hedge-both-test', _fast_tracker(), send)
+
+    assert response.status_code in (502, 503)
+
+
+def test_hedge_prefers_a_response_to_an_error():
+    send, calls = _hedging_send((0.1, requests.exceptions.ConnectionError('reset')), (0.2, 500))
+
+    response = upstream._hedged_send('hedge-error-test', _fast_tracker(), send)
+
+    assert response.status_code == 500
+
+
+def test_hedge_raises_when_neither_attempt_gets_a_response():
+    send, calls = _hedging_send((0.1, requests.exceptions.ConnectionError('reset')),
+                                (0.05, requests.exceptions.ConnectionError('refused')))
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        upstream._hedged_send('hedge-raise-test', _fast_tracker(), send)
+
+
+def test_unhedgeable_calls_run_on_the_callers_thread():
+    threads = []
+
+    def send():
+        threads.append(threading.current_thread())
+        return FakeResponse(200)
+
+    upstream._hedged_send('hedge-cold-test', upstream.LatencyTracker(), send)
+
+    assert threads == [threading.current_thread()]
+
+
+def test_saturated_pool_skips_the_hedge_instead_of_queueing(monkeypatch):
+    monkeypatch.setattr(upstream, '_hedge_slots', threading.BoundedSemaphore(1))
+    send, calls = _hedging_send((0.1, 200), (0.0, 200))
+
+    response = upstream._hedged_send('hedge-saturated-test', _fast_tracker(), send)
+
+    assert response.status_code == 200
+    assert len(calls) == 1
+
+    monkeypatch.setattr(upstream, '_hedge_slots', threading.BoundedSemaphore(1))
+    upstream._hedge_slots.acquire()
+    threads = []
+
+    def record_thread():
+        threads.append(threading.current_thread())
+        return FakeResponse(200)
+
+    upstream._hedged_send('hedge-saturated-test', _fast_tracker(), record_thread)
+
+    assert threads == [threading.current_thread()]